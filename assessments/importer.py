@@ -0,0 +1,191 @@
+"""
+Import de notes depuis un tableur (CSV ou XLSX), lu en flux.
+
+Colonnes (en-tête sur la première ligne, casse indifférente):
+  - "matricule"                     obligatoire
+  - "subject"                       code matière (Subject.code); facultatif si
+                                    l'import cible une seule matière (class_subject)
+  - format large:  une colonne par code d'épreuve ("CA1", "CA2", ...)
+  - format long:   colonnes "atype" et "value"
+
+Les matricules sont résolus via un dictionnaire construit une fois
+(matricule, matière) -> EnrollmentSubject pour les inscriptions actives de
+l'année du trimestre, et les épreuves via (class_subject, code) -> Assessment.
+Les lignes sont validées et écrites par paquets de taille fixe
+(assessments.services.upsert_scores): la mémoire ne dépend pas de la taille
+du fichier, et une ligne invalide n'empêche pas l'import des autres.
+"""
+import csv
+import io
+
+from enrollments.models import EnrollmentSubject
+from grading import results
+from .models import Assessment
+from .services import upsert_scores
+
+try:
+    import openpyxl
+except ImportError:  # dépendance facultative (XLSX)
+    openpyxl = None
+
+CHUNK_SIZE = 500
+KEY_COLUMNS = {"matricule", "subject", "atype", "value", "name", "student", "class", "classroom"}
+
+
+class ImportFormatError(ValueError):
+    """Fichier illisible ou en-tête incomplet (rien n'est importé)."""
+
+
+def _cells_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="") if _is_binary(fileobj) else fileobj
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _cells_xlsx(fileobj):
+    if openpyxl is None:
+        raise ImportFormatError("XLSX import requires openpyxl (pip install openpyxl); upload a CSV file instead.")
+    try:
+        wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFormatError(f"Unreadable XLSX file: {exc}")
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield ["" if v is None else v for v in row]
+    finally:
+        wb.close()
+
+
+def _is_binary(fileobj):
+    return not isinstance(fileobj, io.TextIOBase)
+
+
+def _text(v) -> str:
+    """Cellule -> texte: les cellules XLSX sont typées (12345 ou 12345.0 pour un matricule numérique)."""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def read_rows(fileobj, filename: str):
+    """Itère sur (numéro de ligne, {colonne: valeur}) sans charger tout le fichier."""
+    cells = _cells_xlsx(fileobj) if filename.lower().endswith((".xlsx", ".xlsm")) else _cells_csv(fileobj)
+    header = None
+    for line_no, row in enumerate(cells, start=1):
+        if header is None:
+            header = [_text(h) for h in row]
+            lowered = {h.lower() for h in header}
+            if "matricule" not in lowered:
+                raise ImportFormatError("Header must contain a 'matricule' column.")
+            continue
+        if not any(str(v).strip() for v in row):
+            continue  # ligne vide
+        # colonnes sans en-tête (cellules vides) ignorées
+        yield line_no, {h: v for h, v in zip(header, row) if h}
+
+
+def _lookups(term, class_subject=None):
+    """(matricule -> {code matière: (es_id, cs_id)}, (cs_id, CODE) -> Assessment): 2 requêtes."""
+    es_qs = EnrollmentSubject.objects.filter(
+        enrollment__classroom__year_id=term.year_id, enrollment__active=True,
+    )
+    a_qs = Assessment.objects.select_related("atype").filter(term=term)
+    if class_subject is not None:
+        es_qs = es_qs.filter(class_subject=class_subject)
+        a_qs = a_qs.filter(class_subject=class_subject)
+
+    by_matricule = {}
+    for es_id, cs_id, matricule, code in es_qs.values_list(
+            "id", "class_subject_id", "enrollment__student__matricule", "class_subject__subject__code"):
+        by_matricule.setdefault(matricule.strip().upper(), {})[code.upper()] = (es_id, cs_id)
+    assessments = {(a.class_subject_id, a.atype.code.upper()): a for a in a_qs}
+    return by_matricule, assessments
+
+
+def _value(raw):
+    # tableurs en français: virgule décimale
+    return raw.strip().replace(",", ".") if isinstance(raw, str) else raw
+
+
+def _cells(record):
+    """(code épreuve, valeur) d'une ligne, format large ou long."""
+    lowered = {k.lower(): v for k, v in record.items()}
+    if "atype" in lowered:
+        yield _text(lowered["atype"]).upper(), lowered.get("value")
+        return
+    for column, value in record.items():
+        if column.lower() not in KEY_COLUMNS:
+            yield column.upper(), value
+
+
+def import_scores(fileobj, filename: str, term, class_subject=None, chunk_size=CHUNK_SIZE):
+    """
+    Importe les notes du fichier pour le trimestre `term` (toutes matières, ou
+    seulement `class_subject`).
+    Retourne {"rows", "created", "updated", "errors": [{"row", "matricule", "subject", "atype", "reason"}]}.
+    """
+    by_matricule, assessments = _lookups(term, class_subject)
+    single_cs = class_subject.id if class_subject is not None else None
+    summary = {"rows": 0, "created": 0, "updated": 0, "errors": []}
+    touched = set()
+
+    def flush(entries):
+        if not entries:
+            return
+        out = upsert_scores(entries, refresh=False)
+        summary["created"] += len(out["created"])
+        summary["updated"] += len(out["updated"])
+        summary["errors"] += out["skipped"]
+        if out["created"] or out["updated"]:
+            touched.update(e["assessment"].id for e in entries)
+
+    entries = []
+    for line_no, record in read_rows(fileobj, filename):
+        summary["rows"] += 1
+        lowered = {k.lower(): v for k, v in record.items()}
+        matricule = _text(lowered.get("matricule") or "").upper()
+        subject = _text(lowered.get("subject") or "").upper()
+        base = {"row": line_no, "matricule": matricule, "subject": subject}
+
+        subjects = by_matricule.get(matricule)
+        if subjects is None:
+            summary["errors"].append({**base, "atype": None, "reason": "Unknown matricule (no active enrollment this year)"})
+            continue
+        if subject:
+            target = subjects.get(subject)
+        elif single_cs is not None:
+            target = next(iter(subjects.values()), None)
+        else:
+            summary["errors"].append({**base, "atype": None, "reason": "Missing 'subject' column"})
+            continue
+        if target is None:
+            summary["errors"].append({**base, "atype": None, "reason": "Student not enrolled in this subject"})
+            continue
+        es_id, cs_id = target
+
+        for code, raw in _cells(record):
+            raw = _value(raw)
+            if raw is None or raw == "":
+                continue  # case vide
+            ref = {**base, "atype": code}
+            assessment = assessments.get((cs_id, code))
+            if assessment is None:
+                summary["errors"].append({**ref, "reason": "Assessment not found for this term/subject"})
+                continue
+            entries.append({"assessment": assessment, "enrollment_subject": es_id, "value": raw, "ref": ref})
+
+        if len(entries) >= chunk_size:
+            flush(entries)
+            entries = []
+    flush(entries)
+
+    # un seul recalcul par classe/trimestre pour tout le fichier
+    if touched:
+        results.schedule_refresh(assessments=touched)
+    summary["errors"].sort(key=lambda e: e["row"])
+    return summary
@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from assessments.importer import CHUNK_SIZE, ImportFormatError, import_scores
+from core.models import Term
+from subjects.models import ClassSubject
+
+
+class Command(BaseCommand):
+    help = "Importe des notes depuis un fichier CSV ou XLSX (matricule, subject, CA1, CA2...) pour un trimestre."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier .csv ou .xlsx")
+        parser.add_argument("--term", type=int, required=True, help="Term id")
+        parser.add_argument("--class-subject", type=int, help="Limiter à une matière d'une classe (colonne 'subject' facultative)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Lignes de notes par paquet (défaut: {CHUNK_SIZE})")
+        parser.add_argument("--errors", help="Écrit le rapport d'erreurs ligne par ligne (.json)")
+
+    def handle(self, *args, **opts):
+        term = Term.objects.filter(id=opts["term"]).first()
+        if term is None:
+            raise CommandError(f"Term {opts['term']} does not exist.")
+        class_subject = None
+        if opts.get("class_subject"):
+            class_subject = ClassSubject.objects.filter(id=opts["class_subject"]).first()
+            if class_subject is None:
+                raise CommandError(f"ClassSubject {opts['class_subject']} does not exist.")
+
+        started = time.monotonic()
+        try:
+            with open(opts["path"], "rb") as fp:
+                summary = import_scores(fp, opts["path"], term, class_subject, chunk_size=max(1, opts["chunk_size"]))
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for err in summary["errors"][:20]:
+            self.stdout.write(self.style.WARNING(
+                f"row {err['row']}: {err['matricule']} {err.get('subject') or ''} {err.get('atype') or ''} -> {err['reason']}"
+            ))
+        if len(summary["errors"]) > 20:
+            self.stdout.write(self.style.WARNING(f"... {len(summary['errors']) - 20} more error(s)"))
+        if opts.get("errors"):
+            with open(opts["errors"], "w", encoding="utf-8") as fp:
+                json.dump(summary["errors"], fp, ensure_ascii=False, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['rows']} rows: {summary['created']} created, {summary['updated']} updated, "
+            f"{len(summary['errors'])} error(s) in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from assessments.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Purge les traces de notes supprimées (synchro différentielle) plus anciennes que la rétention."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Rétention en jours (défaut: SCORE_TOMBSTONE_RETENTION_DAYS)")
+
+    def handle(self, *args, **opts):
+        stats = prune_tombstones(opts.get("days"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['removed']} tombstone(s) removed in {stats['class_subjects']} class subject(s); "
+            f"clients with an older cursor for them get a full snapshot."
+        ))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessments', '0002_seed_assessment_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScoreTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score_id', models.BigIntegerField()),
+                ('enrollment_subject_id', models.BigIntegerField()),
+                ('assessment_id', models.BigIntegerField(db_index=True)),
+                ('class_subject_id', models.BigIntegerField(db_index=True)),
+                ('classroom_id', models.BigIntegerField(db_index=True)),
+                ('version', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['version'],
+            },
+        ),
+        migrations.AddField(
+            model_name='score',
+            name='version',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
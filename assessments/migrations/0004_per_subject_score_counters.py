@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def split_counters(apps, schema_editor):
+    """
+    Compteur global "scores" -> un compteur par matière ("scores.<class_subject>"),
+    initialisé à la valeur globale: aucune version existante ne le dépasse.
+    Idem pour la version purgée ("scores.pruned" -> "scores.pruned.<class_subject>").
+    """
+    ChangeCounter = apps.get_model("assessments", "ChangeCounter")
+    Score = apps.get_model("assessments", "Score")
+    ScoreTombstone = apps.get_model("assessments", "ScoreTombstone")
+
+    values = dict(ChangeCounter.objects.filter(name__in=["scores", "scores.pruned"]).values_list("name", "value"))
+    current = values.get("scores", 0)
+    pruned = values.get("scores.pruned", 0)
+    cs_ids = set(Score.objects.values_list("assessment__class_subject_id", flat=True).distinct())
+    cs_ids |= set(ScoreTombstone.objects.order_by().values_list("class_subject_id", flat=True).distinct())
+    if cs_ids:
+        # versions écrites avant le compteur (0) ou au-delà (ne devrait pas arriver)
+        top = max(
+            Score.objects.aggregate(v=Max("version"))["v"] or 0,
+            ScoreTombstone.objects.aggregate(v=Max("version"))["v"] or 0,
+            current,
+        )
+        ChangeCounter.objects.bulk_create([ChangeCounter(name=f"scores.{cs_id}", value=top) for cs_id in cs_ids])
+        if pruned:
+            ChangeCounter.objects.bulk_create(
+                [ChangeCounter(name=f"scores.pruned.{cs_id}", value=pruned) for cs_id in cs_ids])
+    ChangeCounter.objects.filter(name__in=["scores", "scores.pruned"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assessments', '0003_score_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_counters, migrations.RunPython.noop),
+    ]
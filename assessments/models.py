@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from core.transactions import transaction_state
 from django.core.validators import MinValueValidator, MaxValueValidator
 from core.models import Term
 from subjects.models import ClassSubject
@@ -36,10 +37,92 @@ class Score(models.Model):
     assessment = models.ForeignKey(Assessment, on_delete=models.CASCADE, related_name="scores")
     value = models.DecimalField(max_digits=5, decimal_places=2,
                                 validators=[MinValueValidator(0), MaxValueValidator(100)])
+    # version de modification (ChangeCounter de la matière, voir scores_counter), pour la synchro différentielle
+    version = models.BigIntegerField(default=0, db_index=True, editable=False)
 
     class Meta:
         unique_together = (("enrollment_subject", "assessment"),)
         ordering = ["assessment", "enrollment_subject"]
 
     def __str__(self):
-        return f"{self.enrollment_subject} → {self.assessment}: {self.value}"
\ No newline at end of file
+        return f"{self.enrollment_subject} → {self.assessment}: {self.value}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            self.version = transaction_version(scores_counter(self.assessment.class_subject_id), using=kwargs.get("using"))
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+            super().save(*args, **kwargs)
+
+
+class ChangeCounter(models.Model):
+    """
+    Compteur de versions monotone (une ligne par flux, ex. "scores.<class_subject>").
+    Une transaction qui écrit des notes d'une matière incrémente le compteur de
+    cette matière une seule fois (transaction_version) et toutes ses écritures
+    dans la matière partagent cette version.
+    L'incrément verrouille la ligne jusqu'au commit: une version visible
+    implique que toutes les versions inférieures du même compteur sont
+    validées. Le verrou ne concerne que les écritures d'une même feuille
+    (class_subject): les saisies et imports d'autres matières ne l'attendent pas.
+    """
+    name = models.CharField(max_length=32, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class ScoreTombstone(models.Model):
+    """
+    Trace d'une note supprimée, pour la synchro différentielle (?since=).
+    Identifiants copiés sans clé étrangère: la trace survit à la suppression
+    de l'épreuve ou de la classe.
+    """
+    score_id = models.BigIntegerField()
+    enrollment_subject_id = models.BigIntegerField()
+    assessment_id = models.BigIntegerField(db_index=True)
+    class_subject_id = models.BigIntegerField(db_index=True)
+    classroom_id = models.BigIntegerField(db_index=True)
+    version = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["version"]
+
+    def __str__(self):
+        return f"Score {self.score_id} deleted (v{self.version})"
+
+
+SCORES = "scores"
+
+
+def scores_counter(class_subject_id) -> str:
+    """Nom du compteur de versions des notes d'une matière (ClassSubject)."""
+    return f"{SCORES}.{class_subject_id}"
+
+
+def counter_values(names, using=None) -> dict:
+    """{nom: valeur} des compteurs `names` (0 pour un compteur jamais incrémenté), en une requête."""
+    names = list(names)
+    values = dict(ChangeCounter.objects.using(using).filter(name__in=names).values_list("name", "value"))
+    return {name: values.get(name, 0) for name in names}
+
+
+def _reserve(name: str, using=None) -> int:
+    counters = ChangeCounter.objects.using(using).filter(name=name)
+    if not counters.update(value=models.F("value") + 1):
+        ChangeCounter.objects.using(using).get_or_create(name=name)
+        counters.update(value=models.F("value") + 1)
+    return counters.values_list("value", flat=True).get()
+
+
+def transaction_version(name: str, using=None) -> int:
+    """
+    Version du compteur `name` pour la transaction en cours: réservée à la
+    première écriture (un seul UPDATE du compteur par transaction, y compris
+    pour un lot ou une suppression en cascade), puis partagée.
+    À appeler dans un bloc atomic, juste avant d'écrire. Plusieurs compteurs
+    dans une même transaction: les réserver dans un ordre fixe (ids croissants).
+    """
+    return transaction_state(f"assessments.version.{name}", lambda: _reserve(name, using), using=using)
@@ -3,9 +3,10 @@ from django.db import transaction
 from decimal import Decimal, InvalidOperation
 
 from .models import AssessmentType, Assessment, Score
-from enrollments.models import EnrollmentSubject
+from .services import upsert_scores
 from subjects.models import ClassSubject
-from core.models import Term
+from core.models import AcademicYear, Level, Term
+from grading import results
 
 
 # -------------------------
@@ -31,7 +32,7 @@ class AssessmentSerializer(serializers.ModelSerializer):
 class ScoreSerializer(serializers.ModelSerializer):
     class Meta:
         model = Score
-        fields = ["id", "enrollment_subject", "assessment", "value"]
+        fields = ["id", "enrollment_subject", "assessment", "value", "version"]
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -72,20 +73,42 @@ class BulkAssessmentCreateSerializer(serializers.Serializer):
     """
     Création en lot d'Assessments pour un trimestre.
     - term: PK du Term
-    - EITHER classroom: id  -> crée pour toutes les ClassSubject de cette classe
-      OR     class_subjects: [ids]  -> crée uniquement pour ces ClassSubject
+    - une cible, au choix (par ordre de priorité):
+        classroom: id             -> toutes les ClassSubject de cette classe
+        class_subjects: [ids]     -> uniquement ces ClassSubject
+        level: id                 -> toutes les classes de ce niveau (année du trimestre)
+        year: id                  -> toutes les classes de l'année (= celle du trimestre)
     - atypes: liste de codes (["CA1","CA2"]). Par défaut: CA1+CA2 actifs.
+    Les triplets (term, class_subject, atype) manquants sont calculés en une
+    requête et insérés en un seul bulk_create: le coût ne dépend pas du nombre
+    de classes ciblées.
     """
     term = serializers.PrimaryKeyRelatedField(queryset=Term.objects.all())
     classroom = serializers.IntegerField(required=False)
     class_subjects = serializers.ListField(child=serializers.IntegerField(), required=False)
+    level = serializers.PrimaryKeyRelatedField(queryset=Level.objects.all(), required=False)
+    year = serializers.PrimaryKeyRelatedField(queryset=AcademicYear.objects.all(), required=False)
     atypes = serializers.ListField(child=serializers.CharField(), required=False)
 
     def validate(self, attrs):
-        if not attrs.get("classroom") and not attrs.get("class_subjects"):
-            raise serializers.ValidationError("Provide either 'classroom' or 'class_subjects'.")
+        if not any(attrs.get(k) for k in ("classroom", "class_subjects", "level", "year")):
+            raise serializers.ValidationError("Provide one of 'classroom', 'class_subjects', 'level' or 'year'.")
+        if attrs.get("year") and attrs["year"].id != attrs["term"].year_id:
+            raise serializers.ValidationError("'year' must be the term's academic year.")
         return attrs
 
+    def class_subject_queryset(self):
+        """ClassSubject ciblées (utilisé aussi par la vue pour les droits TEACHER)."""
+        validated = self.validated_data
+        if validated.get("classroom"):
+            return ClassSubject.objects.filter(classroom_id=validated["classroom"])
+        if validated.get("class_subjects"):
+            return ClassSubject.objects.filter(id__in=validated["class_subjects"])
+        qs = ClassSubject.objects.filter(classroom__year_id=validated["term"].year_id)
+        if validated.get("level"):
+            qs = qs.filter(classroom__level=validated["level"])
+        return qs
+
     @transaction.atomic
     def create(self, validated):
         term = validated["term"]
@@ -96,22 +119,29 @@ class BulkAssessmentCreateSerializer(serializers.Serializer):
         # Check robustesse: tous les codes demandés doivent exister/être actifs
         if {a.code for a in atypes} != set(atype_codes):
             raise serializers.ValidationError("Some assessment types not found or inactive.")
+        atype_ids = [a.id for a in atypes]
+
+        # ClassSubject ciblées (1 requête) et triplets déjà présents (1 requête)
+        classroom_of = dict(self.class_subject_queryset().values_list("id", "classroom_id"))
+        existing_qs = Assessment.objects.filter(term=term, class_subject_id__in=classroom_of, atype_id__in=atype_ids)
+        existing = set(existing_qs.values_list("class_subject_id", "atype_id"))
+        missing = [(cs_id, at_id) for cs_id in classroom_of for at_id in atype_ids if (cs_id, at_id) not in existing]
+
+        created, existing_ids = [], []
+        if missing:
+            # ignore_conflicts: une création concurrente du même triplet n'est pas une erreur
+            Assessment.objects.bulk_create(
+                [Assessment(term=term, class_subject_id=cs_id, atype_id=at_id) for cs_id, at_id in missing],
+                batch_size=500, ignore_conflicts=True,
+            )
+        # les ids ne sont pas renvoyés avec ignore_conflicts: relecture (1 requête)
+        for a_id, cs_id, at_id in existing_qs.order_by("id").values_list("id", "class_subject_id", "atype_id"):
+            (existing_ids if (cs_id, at_id) in existing else created).append(a_id)
 
-        # Récupération des ClassSubject
-        if "classroom" in validated:
-            cs_qs = ClassSubject.objects.filter(classroom_id=validated["classroom"])
-        else:
-            cs_qs = ClassSubject.objects.filter(id__in=validated["class_subjects"])
-
-        created, existing = [], []
-        for cs in cs_qs:
-            for at in atypes:
-                obj, was_created = Assessment.objects.get_or_create(
-                    term=term, class_subject=cs, atype=at
-                )
-                (created if was_created else existing).append(obj.id)
-
-        return {"created": created, "existing": existing}
+        # bulk_create ne déclenche pas post_save (grading.signals): recalcul planifié ici
+        if created:
+            results.schedule_refresh({(classroom_of[cs_id], term.id) for cs_id, _ in missing})
+        return {"created": created, "existing": existing_ids}
 
 
 class BulkScoresUpsertSerializer(serializers.Serializer):
@@ -174,51 +204,68 @@ class BulkScoresUpsertSerializer(serializers.Serializer):
             # On laissera le cast Decimal/Range au moment du create() pour différencier les raisons de skip
         return attrs
 
-    @transaction.atomic
     def create(self, validated):
+        # Validation + écriture en lot: nombre de requêtes indépendant du nombre de lignes
         assessment = validated["assessment_obj"]
-        cs_id = assessment.class_subject_id
-
-        # Index des scores existants pour cette épreuve
-        existing = {
-            s.enrollment_subject_id: s for s in Score.objects.filter(assessment=assessment)
-        }
+        return upsert_scores([
+            {
+                "assessment": assessment,
+                "enrollment_subject": e.get("enrollment_subject"),
+                "value": e.get("value"),
+                "ref": {"enrollment_subject": e.get("enrollment_subject")},
+            }
+            for e in validated.get("entries", [])
+        ])
+
+
+class GradebookGridSerializer(serializers.Serializer):
+    """
+    Upsert d'une feuille complète: une matière (class_subject) x un trimestre,
+    toutes les épreuves (CA1, CA2, ...) et tous les élèves en une requête.
 
-        results = {"created": [], "updated": [], "skipped": []}
+    Body:
+    {
+      "class_subject": 5,
+      "term": 1,
+      "rows": [
+        { "enrollment_subject": 101, "scores": {"CA1": 14.5, "CA2": 12} },
+        { "enrollment_subject": 102, "scores": {"CA1": 9, "CA2": null} }   // null/"" = case vide, ignorée
+      ]
+    }
+    """
+    class_subject = serializers.PrimaryKeyRelatedField(queryset=ClassSubject.objects.all())
+    term = serializers.PrimaryKeyRelatedField(queryset=Term.objects.all())
+    rows = serializers.ListField(child=serializers.DictField(), allow_empty=True)
 
-        for e in validated.get("entries", []):
-            es_id = e.get("enrollment_subject")
-            raw_val = e.get("value")
+    def validate(self, attrs):
+        # Toutes les épreuves de la feuille en une requête: {code atype: Assessment}
+        attrs["assessments_by_code"] = {
+            a.atype.code.upper(): a
+            for a in Assessment.objects.select_related("atype").filter(
+                term=attrs["term"], class_subject=attrs["class_subject"]
+            )
+        }
+        for row in attrs.get("rows", []):
+            if "enrollment_subject" not in row:
+                raise serializers.ValidationError("Each row must have 'enrollment_subject'.")
+            if not isinstance(row.get("scores"), dict):
+                raise serializers.ValidationError("Each row must have a 'scores' object ({atype_code: value}).")
+        return attrs
 
-            # 1) Cast propre en Decimal
-            try:
-                val = Decimal(str(raw_val))
-            except (InvalidOperation, TypeError):
-                results["skipped"].append({"enrollment_subject": es_id, "reason": "Invalid value"})
-                continue
-            if not (Decimal("0") <= val <= Decimal("100")):
-                results["skipped"].append({"enrollment_subject": es_id, "reason": "Out of range"})
-                continue
-
-            # 2) ES doit exister et correspondre au même ClassSubject que l'Assessment
-            try:
-                es = EnrollmentSubject.objects.select_related("class_subject").get(id=es_id)
-            except EnrollmentSubject.DoesNotExist:
-                results["skipped"].append({"enrollment_subject": es_id, "reason": "EnrollmentSubject not found"})
-                continue
-            if es.class_subject_id != cs_id:
-                results["skipped"].append({"enrollment_subject": es_id, "reason": "Subject mismatch"})
-                continue
-
-            # 3) Upsert
-            if es_id in existing:
-                s = existing[es_id]
-                if s.value != val:
-                    s.value = val
-                    s.save(update_fields=["value"])
-                results["updated"].append(s.id)
-            else:
-                s = Score.objects.create(enrollment_subject=es, assessment=assessment, value=val)
-                results["created"].append(s.id)
-
-        return results
+    def create(self, validated):
+        by_code = validated["assessments_by_code"]
+        entries, skipped = [], []
+        for row in validated.get("rows", []):
+            es_id = row["enrollment_subject"]
+            for code, value in row["scores"].items():
+                if value is None or value == "":
+                    continue
+                ref = {"enrollment_subject": es_id, "atype": code}
+                assessment = by_code.get(str(code).upper())
+                if assessment is None:
+                    skipped.append({**ref, "reason": "Assessment not found for this term/subject"})
+                    continue
+                entries.append({"assessment": assessment, "enrollment_subject": es_id, "value": value, "ref": ref})
+        result = upsert_scores(entries)
+        result["skipped"] = skipped + result["skipped"]
+        return result
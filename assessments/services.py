@@ -0,0 +1,141 @@
+"""
+Écriture des notes en lot (set-based).
+
+upsert_scores() valide toutes les lignes avec un nombre fixe de requêtes
+(EnrollmentSubject en un `id__in`, notes existantes en un `id__in`), puis
+écrit les notes modifiées en un bulk_update et les nouvelles en un
+bulk_create (upsert natif ON CONFLICT quand la base le permet: deux
+enseignants qui saisissent la même note en même temps ne provoquent pas
+d'IntegrityError).
+bulk_update/bulk_create ne déclenchent pas les signaux ni Score.save(): le
+recalcul des résultats (grading.results) est planifié explicitement et
+la version de modification (synchro différentielle) est réservée une fois
+par matière pour tout le lot.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from enrollments.models import EnrollmentSubject
+from grading import results
+from .models import Score, scores_counter, transaction_version
+
+MIN_VALUE = Decimal("0")
+MAX_VALUE = Decimal("100")
+BATCH_SIZE = 500
+
+
+def parse_value(raw):
+    """Retourne (Decimal à 2 décimales, None) ou (None, raison du rejet)."""
+    try:
+        val = Decimal(str(raw).strip())
+    except (InvalidOperation, TypeError):
+        return None, "Invalid value"
+    if not val.is_finite():
+        return None, "Invalid value"
+    if not (MIN_VALUE <= val <= MAX_VALUE):
+        return None, "Out of range"
+    return val.quantize(Decimal("0.01")), None
+
+
+@transaction.atomic
+def upsert_scores(rows, refresh=True):
+    """
+    rows: [{"assessment": Assessment, "enrollment_subject": id, "value": brut, "ref": dict}]
+      ref: identifiant de la ligne renvoyé tel quel dans "skipped".
+    refresh=False: l'appelant planifie lui-même le recalcul (import par paquets).
+    Une même (note, épreuve) présente plusieurs fois: la dernière valeur l'emporte.
+    Retourne {"created": [score ids], "updated": [score ids], "skipped": [{**ref, "reason"}]}.
+    """
+    out = {"created": [], "updated": [], "skipped": []}
+
+    # 1) valeurs
+    valid = {}
+    for row in rows:
+        val, reason = parse_value(row["value"])
+        try:
+            es_id = int(row["enrollment_subject"])
+        except (TypeError, ValueError):
+            reason = "EnrollmentSubject not found"
+        if reason:
+            out["skipped"].append({**row["ref"], "reason": reason})
+            continue
+        valid[(es_id, row["assessment"].id)] = (row, val)
+    if not valid:
+        return out
+
+    # 2) EnrollmentSubject: existence + même matière que l'épreuve (1 requête)
+    es_ids = {es_id for es_id, _ in valid}
+    es_cs = dict(EnrollmentSubject.objects.filter(id__in=es_ids).values_list("id", "class_subject_id"))
+    for key, (row, _) in list(valid.items()):
+        cs_id = es_cs.get(key[0])
+        if cs_id is None:
+            reason = "EnrollmentSubject not found"
+        elif cs_id != row["assessment"].class_subject_id:
+            reason = "Subject mismatch"
+        else:
+            continue
+        out["skipped"].append({**row["ref"], "reason": reason})
+        del valid[key]
+    if not valid:
+        return out
+
+    # 3) notes existantes (1 requête)
+    assessments = {row["assessment"].id: row["assessment"] for row, _ in valid.values()}
+    existing = {
+        (s.enrollment_subject_id, s.assessment_id): s
+        for s in Score.objects.filter(assessment_id__in=assessments.keys(), enrollment_subject_id__in=es_ids)
+    }
+
+    # 4) écritures: 1 UPDATE + 1 INSERT (par paquets de BATCH_SIZE), une version par matière pour le lot
+    changed, new = [], {}
+    for key, (_, val) in valid.items():
+        s = existing.get(key)
+        if s is None:
+            new[key] = val
+            continue
+        if s.value != val:
+            s.value = val
+            changed.append(s)
+        out["updated"].append(s.id)
+    if changed or new:
+        # compteurs des matières écrites réservés par id croissant (pas d'interblocage
+        # entre deux lots qui touchent les mêmes matières)
+        cs_of = {a_id: a.class_subject_id for a_id, a in assessments.items()}
+        versions = {
+            cs_id: transaction_version(scores_counter(cs_id))
+            for cs_id in sorted({cs_of[s.assessment_id] for s in changed} | {cs_of[a_id] for _, a_id in new})
+        }
+    if new:
+        # verrous des compteurs pris (jusqu'au commit): les notes enregistrées entre
+        # l'étape 3 et maintenant par une autre transaction sont visibles; ce
+        # sont des mises à jour, pas des créations
+        for s in Score.objects.filter(assessment_id__in={a for _, a in new},
+                                      enrollment_subject_id__in={e for e, _ in new}):
+            key = (s.enrollment_subject_id, s.assessment_id)
+            if key in new:
+                val = new.pop(key)
+                if s.value != val:
+                    s.value = val
+                    changed.append(s)
+                out["updated"].append(s.id)
+    for s in changed:
+        s.version = versions[cs_of[s.assessment_id]]
+    if changed:
+        Score.objects.bulk_update(changed, ["value", "version"], batch_size=BATCH_SIZE)
+    if new:
+        new = [Score(enrollment_subject_id=es_id, assessment_id=a_id, value=val, version=versions[cs_of[a_id]])
+               for (es_id, a_id), val in new.items()]
+        if connection.features.supports_update_conflicts_with_target:
+            # filet de sécurité (écriture hors du verrou des compteurs): pas d'IntegrityError
+            Score.objects.bulk_create(
+                new, batch_size=BATCH_SIZE, update_conflicts=True,
+                unique_fields=["enrollment_subject", "assessment"], update_fields=["value", "version"],
+            )
+        else:
+            Score.objects.bulk_create(new, batch_size=BATCH_SIZE)
+        out["created"] += [s.id for s in new]
+
+    if refresh and (changed or new):
+        results.schedule_refresh(assessments=assessments.keys())
+    return out
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Assessment, Score, ScoreTombstone, scores_counter, transaction_version
+
+
+@receiver(post_delete, sender=Score)
+def score_deleted(sender, instance, **kwargs):
+    # envoyé dans la transaction de suppression (cascade comprise): l'épreuve existe encore
+    cs_id, classroom_id = (
+        Assessment.objects.filter(id=instance.assessment_id)
+        .values_list("class_subject_id", "class_subject__classroom_id").first()
+        or (0, 0)
+    )
+    ScoreTombstone.objects.create(
+        score_id=instance.pk,
+        enrollment_subject_id=instance.enrollment_subject_id,
+        assessment_id=instance.assessment_id,
+        class_subject_id=cs_id,
+        classroom_id=classroom_id,
+        version=transaction_version(scores_counter(cs_id)),
+    )
@@ -0,0 +1,123 @@
+"""
+Synchro différentielle des feuilles de notes (GET /api/scores/changes/).
+
+Les versions sont comptées par matière (ClassSubject, voir
+assessments.models.scores_counter): le curseur renvoyé au client est la
+liste des versions des matières du périmètre, "12:40,13:7" (matière:version).
+Les compteurs sont lus avant les notes: toute version inférieure ou égale
+est validée, donc visible par les lectures qui suivent.
+
+Les traces de suppression (ScoreTombstone) sont gardées
+SCORE_TOMBSTONE_RETENTION_DAYS jours. La plus grande version supprimée d'une
+matière est notée dans son compteur "scores.pruned.<class_subject>": un
+client dont le curseur est plus ancien pour une matière du périmètre a pu
+manquer des suppressions et reçoit un instantané complet.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ChangeCounter, ScoreTombstone, counter_values, scores_counter
+
+PRUNED = "scores.pruned"
+PRUNE_INTERVAL = 3600  # s, entre deux purges opportunistes (par processus)
+
+_last_prune = 0.0
+
+
+def pruned_counter(class_subject_id) -> str:
+    return f"{PRUNED}.{class_subject_id}"
+
+
+def parse_cursor(text):
+    """
+    "12:40,13:7" -> {12: 40, 13: 7}; vide -> None (instantané complet).
+    Un entier seul (curseur global d'avant les compteurs par matière) -> None.
+    ValueError si le curseur est mal formé.
+    """
+    text = (text or "").strip()
+    if not text or text.isdigit():
+        return None
+    cursor = {}
+    for part in text.split(","):
+        cs_id, sep, version = part.partition(":")
+        if not sep or int(version) < 0:
+            raise ValueError(f"Invalid cursor part {part!r}")
+        cursor[int(cs_id)] = int(version)
+    return cursor
+
+
+def format_cursor(versions: dict) -> str:
+    return ",".join(f"{cs_id}:{version}" for cs_id, version in sorted(versions.items()))
+
+
+def pruned_versions(class_subject_ids) -> dict:
+    """{class_subject: version} jusqu'à laquelle les traces de suppression ont pu être purgées."""
+    floors = counter_values(pruned_counter(cs_id) for cs_id in class_subject_ids)
+    return {cs_id: floors[pruned_counter(cs_id)] for cs_id in class_subject_ids}
+
+
+def score_changes(scores, tombstones, class_subject_ids, since):
+    """
+    (notes, suppressions, versions) du périmètre: `scores`/`tombstones` sont les
+    querysets du périmètre, `class_subject_ids` ses matières, `since` le curseur
+    du client ({class_subject: version}, None: instantané complet).
+    versions: {class_subject: version} à renvoyer comme prochain curseur.
+    """
+    if not class_subject_ids:
+        return [], [], {}
+    # compteurs lus avant les notes (voir l'en-tête du module)
+    current = counter_values(scores_counter(cs_id) for cs_id in class_subject_ids)
+    versions = {cs_id: current[scores_counter(cs_id)] for cs_id in class_subject_ids}
+
+    if since is not None:
+        score_q, tomb_q = Q(), Q()
+        for cs_id in class_subject_ids:
+            after = since.get(cs_id, 0)
+            score_q |= Q(assessment__class_subject_id=cs_id, version__gt=after)
+            tomb_q |= Q(class_subject_id=cs_id, version__gt=after)
+        scores = scores.filter(score_q)
+        tombstones = tombstones.filter(tomb_q)
+
+    rows = list(scores.order_by("version", "id").values("id", "enrollment_subject", "assessment", "value", "version"))
+    for row in rows:
+        row["value"] = float(row["value"])
+    deleted = []
+    if since is not None:
+        deleted = [
+            {"id": score_id, "enrollment_subject": es_id, "assessment": a_id, "version": version}
+            for score_id, es_id, a_id, version in tombstones.values_list(
+                "score_id", "enrollment_subject_id", "assessment_id", "version")
+        ]
+    return rows, deleted, versions
+
+
+@transaction.atomic
+def prune_tombstones(days=None) -> dict:
+    """Supprime les traces plus anciennes que `days` jours (défaut: SCORE_TOMBSTONE_RETENTION_DAYS)."""
+    days = days if days is not None else getattr(settings, "SCORE_TOMBSTONE_RETENTION_DAYS", 30)
+    limit = timezone.now() - timedelta(days=days)
+    floors = dict(
+        ScoreTombstone.objects.filter(deleted_at__lt=limit).order_by()
+        .values("class_subject_id").annotate(v=Max("version")).values_list("class_subject_id", "v")
+    )
+    removed = 0
+    for cs_id, floor in floors.items():
+        removed += ScoreTombstone.objects.filter(class_subject_id=cs_id, version__lte=floor).delete()[0]
+        counter, _ = ChangeCounter.objects.select_for_update().get_or_create(name=pruned_counter(cs_id))
+        if floor > counter.value:
+            counter.value = floor
+            counter.save(update_fields=["value"])
+    return {"removed": removed, "class_subjects": len(floors)}
+
+
+def maybe_prune():
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune >= PRUNE_INTERVAL:
+        _last_prune = now
+        prune_tombstones()
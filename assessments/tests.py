@@ -1,3 +1,319 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from core.tests import make_classroom, set_score
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+from . import services
+from .models import Score, ScoreTombstone, counter_values, scores_counter
+from .importer import ImportFormatError, import_scores
+from .services import upsert_scores
+from .sync import parse_cursor, prune_tombstones
+
+
+def versions(school):
+    names = {code: scores_counter(cs.id) for code, cs in school.class_subjects.items()}
+    values = counter_values(names.values())
+    return {code: values[name] for code, name in names.items()}
+
+
+class ScoreVersionTests(TransactionTestCase):
+    # versions réservées par transaction: chaque écriture doit être validée (pas de TestCase)
+    serialized_rollback = True
+
+    def setUp(self):
+        self.school = make_classroom(students=2)
+
+    def test_counter_per_class_subject(self):
+        set_score(self.school, 0, "MATH", "CA1", 12)
+        set_score(self.school, 1, "MATH", "CA1", 14)
+        self.assertEqual(versions(self.school), {"MATH": 2, "ENG": 0})
+        set_score(self.school, 0, "ENG", "CA1", 9)
+        self.assertEqual(versions(self.school), {"MATH": 2, "ENG": 1})
+
+    def test_one_version_per_transaction(self):
+        with transaction.atomic():
+            a = set_score(self.school, 0, "MATH", "CA1", 12)
+            b = set_score(self.school, 1, "MATH", "CA2", 14)
+            c = set_score(self.school, 1, "ENG", "CA2", 10)
+        self.assertEqual((a.version, b.version, c.version), (1, 1, 1))
+        self.assertEqual(versions(self.school), {"MATH": 1, "ENG": 1})
+
+    def test_delete_leaves_tombstone_with_new_version(self):
+        score = set_score(self.school, 0, "MATH", "CA1", 12)
+        score_id = score.id
+        score.delete()
+        tomb = ScoreTombstone.objects.get(score_id=score_id)
+        self.assertEqual(tomb.version, 2)
+        self.assertEqual(tomb.class_subject_id, self.school.class_subjects["MATH"].id)
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite verrouille toute la base pour chaque écriture")
+class ConcurrentWritersTests(TransactionTestCase):
+    """Deux enseignants qui saisissent des matières différentes ne s'attendent pas."""
+    serialized_rollback = True
+
+    def test_writers_on_different_subjects_do_not_wait(self):
+        school = make_classroom(students=1)
+        holding, release = threading.Event(), threading.Event()
+        errors = []
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    set_score(school, 0, "MATH", "CA1", 12)
+                    holding.set()
+                    release.wait(10)
+            except Exception as exc:  # pragma: no cover - remonté par l'assertion
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        def other_writer():
+            try:
+                with transaction.atomic():
+                    set_score(school, 0, "ENG", "CA1", 15)
+            except Exception as exc:  # pragma: no cover
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        first = threading.Thread(target=slow_writer)
+        first.start()
+        self.assertTrue(holding.wait(10))
+        second = threading.Thread(target=other_writer)
+        second.start()
+        second.join(5)
+        finished = not second.is_alive()
+        release.set()
+        first.join(10)
+        second.join(10)
+
+        self.assertTrue(finished, "the ENG write waited for the open MATH transaction")
+        self.assertEqual(errors, [])
+        self.assertEqual(versions(school), {"MATH": 1, "ENG": 1})
+
+    def test_writers_on_same_subject_commit_in_version_order(self):
+        school = make_classroom(students=2)
+        holding, release = threading.Event(), threading.Event()
+        seen = {}
+
+        def writer(student, hold):
+            try:
+                with transaction.atomic():
+                    seen[student] = set_score(school, student, "MATH", "CA1", 10 + student).version
+                    if hold:
+                        holding.set()
+                        release.wait(10)
+            finally:
+                connections.close_all()
+
+        first = threading.Thread(target=writer, args=(0, True))
+        first.start()
+        self.assertTrue(holding.wait(10))
+        second = threading.Thread(target=writer, args=(1, False))
+        second.start()
+        second.join(1)
+        self.assertTrue(second.is_alive(), "same subject: the second writer waits for the first commit")
+        release.set()
+        first.join(10)
+        second.join(10)
+        self.assertEqual(seen, {0: 1, 1: 2})
+
+
+class ScoreChangesTests(TransactionTestCase):
+    serialized_rollback = True
+    url = "/api/scores/changes/"
+
+    def setUp(self):
+        self.school = make_classroom(students=2)
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("admin", role="ADMIN"))
+        self.a = set_score(self.school, 0, "MATH", "CA1", 12)
+        self.b = set_score(self.school, 1, "ENG", "CA1", 8)
+
+    def get(self, since=None, **headers):
+        params = {"classroom": self.school.classroom.id}
+        if since is not None:
+            params["since"] = since
+        return self.client.get(self.url, params, **headers)
+
+    def test_full_then_delta(self):
+        first = self.get().json()
+        self.assertTrue(first["full"])
+        self.assertEqual({r["id"] for r in first["scores"]}, {self.a.id, self.b.id})
+        self.assertEqual(parse_cursor(first["version"]),
+                         {self.school.class_subjects["MATH"].id: 1, self.school.class_subjects["ENG"].id: 1})
+
+        self.a.value = 13
+        self.a.save()
+        b_id = self.b.id
+        self.b.delete()
+        delta = self.get(first["version"]).json()
+        self.assertFalse(delta["full"])
+        self.assertEqual([(r["id"], r["value"]) for r in delta["scores"]], [(self.a.id, 13.0)])
+        self.assertEqual([d["id"] for d in delta["deleted"]], [b_id])
+
+        again = self.get(delta["version"]).json()
+        self.assertEqual((again["scores"], again["deleted"]), ([], []))
+
+    def test_etag_not_modified(self):
+        first = self.get()
+        resp = self.get(first.json()["version"], HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 304)
+        set_score(self.school, 1, "MATH", "CA2", 11)
+        resp = self.get(first.json()["version"], HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["scores"]), 1)
+
+    def test_pruned_tombstones_force_full_snapshot(self):
+        cursor = self.get().json()["version"]
+        self.b.delete()
+        ScoreTombstone.objects.update(deleted_at=ScoreTombstone.objects.get().deleted_at - timedelta(days=40))
+        self.assertEqual(prune_tombstones(days=30)["removed"], 1)
+        resp = self.get(cursor).json()
+        self.assertTrue(resp["full"])
+        self.assertEqual([r["id"] for r in resp["scores"]], [self.a.id])
+        # curseur à jour: plus besoin d'instantané complet
+        self.assertFalse(self.get(resp["version"]).json()["full"])
+
+    def test_invalid_and_legacy_cursors(self):
+        self.assertEqual(self.get("nope").status_code, 400)
+        self.assertTrue(self.get("7").json()["full"])  # ancien curseur global
+
+    def test_scope_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+
+class UpsertScoresTests(TestCase):
+    def setUp(self):
+        self.school = make_classroom(students=3)
+        self.ca1 = self.school.assessments[(1, "MATH", "CA1")]
+
+    def row(self, student, value, subject="MATH", ref=None, es_id=None):
+        es_id = es_id or self.school.es[(student, subject)].id
+        return {"assessment": self.ca1, "enrollment_subject": es_id, "value": value, "ref": ref or {"row": student}}
+
+    def test_created_updated_and_skipped(self):
+        kept = set_score(self.school, 0, "MATH", "CA1", 12)
+        same = set_score(self.school, 1, "MATH", "CA1", 9)
+        out = upsert_scores([
+            self.row(0, "13.5"),
+            self.row(1, 9),                       # inchangée: rapportée, pas réécrite
+            self.row(2, 11), self.row(2, 14),     # doublon: la dernière valeur l'emporte
+            self.row(0, "abc", ref={"row": "bad"}),
+            self.row(0, 101, ref={"row": "big"}),
+            self.row(None, 10, es_id=999999, ref={"row": "missing"}),
+            self.row(0, 10, subject="ENG", ref={"row": "eng"}),
+        ])
+        created = Score.objects.get(enrollment_subject=self.school.es[(2, "MATH")], assessment=self.ca1)
+        self.assertEqual(out["created"], [created.id])
+        self.assertEqual(sorted(out["updated"]), sorted([kept.id, same.id]))
+        self.assertEqual(out["skipped"], [
+            {"row": "bad", "reason": "Invalid value"},
+            {"row": "big", "reason": "Out of range"},
+            {"row": "missing", "reason": "EnrollmentSubject not found"},
+            {"row": "eng", "reason": "Subject mismatch"},
+        ])
+        self.assertEqual(created.value, 14)
+        kept.refresh_from_db()
+        same.refresh_from_db()
+        self.assertEqual((kept.value, same.value), (Decimal("13.50"), 9))
+
+    def test_concurrent_insert_is_reported_as_update(self):
+        real = services.transaction_version
+
+        def other_writer_first(name, *args, **kwargs):
+            # une autre transaction enregistre la même note entre la lecture et l'écriture
+            if not Score.objects.filter(assessment=self.ca1, enrollment_subject=self.school.es[(0, "MATH")]).exists():
+                set_score(self.school, 0, "MATH", "CA1", 5)
+            return real(name, *args, **kwargs)
+
+        with mock.patch.object(services, "transaction_version", side_effect=other_writer_first):
+            out = upsert_scores([self.row(0, 15), self.row(1, 16)])
+        raced = Score.objects.get(assessment=self.ca1, enrollment_subject=self.school.es[(0, "MATH")])
+        self.assertEqual(out["updated"], [raced.id])
+        self.assertEqual(len(out["created"]), 1)
+        self.assertEqual(raced.value, 15)
+        self.assertEqual(Score.objects.filter(assessment=self.ca1).count(), 2)
+
+
+class ImportScoresTests(TestCase):
+    def setUp(self):
+        self.school = make_classroom(students=3)
+        self.term = self.school.terms[0]
+
+    def csv(self, *lines):
+        return io.BytesIO("\n".join(lines).encode("utf-8"))
+
+    def value(self, student, subject, atype):
+        return Score.objects.get(enrollment_subject=self.school.es[(student, subject)],
+                                 assessment=self.school.assessments[(1, subject, atype)]).value
+
+    def test_row_errors_do_not_block_valid_rows(self):
+        set_score(self.school, 1, "ENG", "CA1", 10)
+        upload = self.csv(
+            "Matricule;Subject;CA1;CA2;CA3",
+            "F5A-000;MATH;12,5;14;",
+            "F5A-001;ENG;11;;",
+            "NOPE-1;MATH;10;10;",
+            "F5A-002;PHYS;10;10;",
+            "F5A-002;MATH;120;9;7",
+            ";;;;",
+        )
+        summary = import_scores(upload, "notes.csv", self.term)
+        self.assertEqual((summary["rows"], summary["created"], summary["updated"]), (5, 3, 1))
+        self.assertEqual([(e["row"], e["atype"], e["reason"]) for e in summary["errors"]], [
+            (4, None, "Unknown matricule (no active enrollment this year)"),
+            (5, None, "Student not enrolled in this subject"),
+            (6, "CA3", "Assessment not found for this term/subject"),
+            (6, "CA1", "Out of range"),
+        ])
+        self.assertEqual((self.value(0, "MATH", "CA1"), self.value(0, "MATH", "CA2")), (Decimal("12.50"), 14))
+        self.assertEqual((self.value(1, "ENG", "CA1"), self.value(2, "MATH", "CA2")), (11, 9))
+
+    def test_chunks(self):
+        lines = ["matricule,subject,atype,value"]
+        lines += [f"F5A-{i:03d},{code},{atype},{10 + i}" for i in range(3) for code in ("MATH", "ENG")
+                  for atype in ("CA1", "CA2")]
+        calls = []
+
+        def counting(entries, **kwargs):
+            calls.append(len(entries))
+            return upsert_scores(entries, **kwargs)
+
+        with mock.patch("assessments.importer.upsert_scores", side_effect=counting):
+            summary = import_scores(self.csv(*lines), "long.csv", self.term, chunk_size=5)
+        self.assertEqual(calls, [5, 5, 2])
+        self.assertEqual((summary["rows"], summary["created"], summary["errors"]), (12, 12, []))
+
+    def test_missing_matricule_header(self):
+        with self.assertRaises(ImportFormatError):
+            import_scores(self.csv("name,CA1", "x,10"), "bad.csv", self.term)
+
+    @skipIf(openpyxl is None, "openpyxl n'est pas installé")
+    def test_xlsx_single_subject(self):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(["Matricule", "CA1", "CA2", None])
+        ws.append(["F5A-000", 15, 16.5, "ignored"])
+        ws.append(["F5A-001", None, 8, None])
+        upload = io.BytesIO()
+        wb.save(upload)
+        upload.seek(0)
+        summary = import_scores(upload, "math.xlsx", self.term, class_subject=self.school.class_subjects["MATH"])
+        self.assertEqual((summary["created"], summary["errors"]), (3, []))
+        self.assertEqual(self.value(0, "MATH", "CA2"), Decimal("16.50"))
+        self.assertFalse(Score.objects.filter(enrollment_subject=self.school.es[(1, "MATH")],
+                                              assessment=self.school.assessments[(1, "MATH", "CA1")]).exists())
@@ -29,3 +29,25 @@ def teacher_can_edit(user, class_subject_id: int) -> bool:
         class_subject_id=class_subject_id,
         can_edit=True,
     ).exists()
+
+
+def teacher_can_edit_all(user, class_subject_ids) -> bool:
+    """teacher_can_edit() pour un ensemble de class_subject, en une requête."""
+    ids = set(class_subject_ids)
+    if not getattr(user, "is_authenticated", False):
+        return False
+
+    role = getattr(user, "role", None)
+    if role in ALLOWED_WRITE_ROLES:
+        return True
+
+    teacher = getattr(user, "teacher", None)
+    if role != "TEACHER" or not teacher:
+        return False
+
+    allowed = set(TeacherAssignment.objects.filter(
+        teacher=teacher,
+        class_subject_id__in=ids,
+        can_edit=True,
+    ).values_list("class_subject_id", flat=True))
+    return ids <= allowed
@@ -1,17 +1,24 @@
 # assessments/views.py
+import hashlib
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action    # <-- IMPORT INDISPENSABLE
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import FormParser, MultiPartParser
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils.http import parse_etags, quote_etag
 
-from .models import AssessmentType, Assessment, Score
+from .models import AssessmentType, Assessment, Score, ScoreTombstone
 from .serializers import (
     AssessmentTypeSerializer, AssessmentSerializer, ScoreSerializer,
-    BulkAssessmentCreateSerializer, BulkScoresUpsertSerializer
+    BulkAssessmentCreateSerializer, BulkScoresUpsertSerializer, GradebookGridSerializer
 )
 from .permissions import IsTeacherOrAdminWrite
-from .utils import teacher_can_edit
+from .utils import teacher_can_edit, teacher_can_edit_all
+from .importer import ImportFormatError, import_scores
+from .sync import format_cursor, maybe_prune, parse_cursor, pruned_versions, score_changes
+from core.models import Term
 from subjects.models import ClassSubject
 from portals.models import TeacherAssignment
 
@@ -31,22 +38,13 @@ class AssessmentViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["post"], url_path="bulk")
     def bulk_create_assessments(self, request):
-        # Si TEACHER: vérifier l’assignation pour chaque class_subject
-        if getattr(request.user, "role", None) == "TEACHER":
-            body = request.data or {}
-            if "class_subjects" in body:
-                cs_ids = list(body["class_subjects"])
-            elif "classroom" in body:
-                cs_ids = list(ClassSubject.objects.filter(
-                    classroom_id=body["classroom"]
-                ).values_list("id", flat=True))
-            else:
-                cs_ids = []
-            for cs_id in cs_ids:
-                if not teacher_can_edit(request.user, cs_id):
-                    raise PermissionDenied("Not allowed to create assessments for this subject/class.")
         ser = BulkAssessmentCreateSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
+        # Si TEACHER: vérifier l’assignation pour chaque class_subject ciblée (1 requête)
+        if getattr(request.user, "role", None) == "TEACHER":
+            cs_ids = ser.class_subject_queryset().values_list("id", flat=True)
+            if not teacher_can_edit_all(request.user, cs_ids):
+                raise PermissionDenied("Not allowed to create assessments for this subject/class.")
         result = ser.save()
         return Response(result, status=status.HTTP_201_CREATED)
 
@@ -65,6 +63,7 @@ class AssessmentViewSet(viewsets.ModelViewSet):
                     "name": f"{s.enrollment_subject.enrollment.student.last_name} {s.enrollment_subject.enrollment.student.first_name}",
                 },
                 "value": float(s.value),
+                "version": s.version,
             }
             for s in qs
         ]
@@ -94,4 +93,100 @@ class ScoreViewSet(viewsets.ModelViewSet):
         result = ser.save()
         return Response(result, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"], url_path="grid")
+    def grid(self, request, *args, **kwargs):
+        """Upsert d'une feuille class_subject x trimestre (toutes les épreuves, tous les élèves)."""
+        ser = GradebookGridSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+
+        if getattr(request.user, "role", None) == "TEACHER":
+            if not teacher_can_edit(request.user, ser.validated_data["class_subject"].id):
+                raise PermissionDenied("Not allowed to edit scores for this subject/class.")
+
+        result = ser.save()
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser, FormParser])
+    def import_file(self, request, *args, **kwargs):
+        """
+        Import d'un tableur (multipart): file=<.csv|.xlsx>, term=<id>[, class_subject=<id>].
+        Colonnes: matricule, subject, CA1, CA2... (voir assessments.importer).
+        Rapport ligne par ligne; les lignes valides sont importées même si d'autres sont rejetées.
+        """
+        upload = request.FILES.get("file")
+        term = Term.objects.filter(id=request.data.get("term") or 0).first()
+        if upload is None or term is None:
+            return Response({"detail": "file and a valid term are required"}, status=status.HTTP_400_BAD_REQUEST)
+        class_subject = None
+        if request.data.get("class_subject"):
+            class_subject = ClassSubject.objects.filter(id=request.data["class_subject"]).first()
+            if class_subject is None:
+                return Response({"detail": "class_subject not found"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if getattr(request.user, "role", None) == "TEACHER":
+            # un enseignant importe matière par matière
+            if class_subject is None or not teacher_can_edit(request.user, class_subject.id):
+                raise PermissionDenied("Teachers must import one class_subject they are allowed to edit.")
+
+        try:
+            summary = import_scores(upload, upload.name, term, class_subject)
+        except ImportFormatError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="changes")
+    def changes(self, request, *args, **kwargs):
+        """
+        Synchro différentielle d'une feuille de notes.
+        GET /api/scores/changes/?assessment=<id> | class_subject=<id> | classroom=<id> [&since=<curseur>]
+        - sans since: toutes les notes du périmètre;
+        - since=curseur: notes créées/modifiées et notes supprimées ("deleted") depuis;
+          curseur plus ancien que la rétention des suppressions: instantané complet.
+        Réponse: {"version", "full", "scores", "deleted"}; version: curseur opaque
+        (versions par matière, voir assessments.sync); full=true: remplacer la
+        feuille au lieu d'appliquer le delta. Rappeler avec since=<version>.
+        ETag = empreinte de version: If-None-Match -> 304 si rien n'a changé dans le périmètre.
+        """
+        scope = {}
+        for param, score_field, tomb_field, cs_field in (
+            ("assessment", "assessment_id", "assessment_id", "assessments__id"),
+            ("class_subject", "assessment__class_subject_id", "class_subject_id", "id"),
+            ("classroom", "assessment__class_subject__classroom_id", "classroom_id", "classroom_id"),
+        ):
+            if request.query_params.get(param):
+                scope[param] = (score_field, tomb_field, cs_field, request.query_params[param])
+        if not scope:
+            return Response({"detail": "assessment, class_subject or classroom is required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            for *_, value in scope.values():
+                int(value)
+        except ValueError:
+            return Response({"detail": "scope ids must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            since = parse_cursor(request.query_params.get("since"))
+        except ValueError:
+            return Response({"detail": "since must be a version returned by this endpoint"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        scores = Score.objects.filter(**{f: v for f, _, _, v in scope.values()})
+        tombstones = ScoreTombstone.objects.filter(**{f: v for _, f, _, v in scope.values()})
+        # matières du périmètre, y compris celles supprimées depuis (leurs traces restent)
+        cs_ids = set(ClassSubject.objects.filter(**{f: v for _, _, f, v in scope.values()}).values_list("id", flat=True))
+        cs_ids |= set(tombstones.order_by().values_list("class_subject_id", flat=True).distinct())
+
+        rows, deleted, versions = score_changes(scores, tombstones, cs_ids, since)
+        # lu après les traces: une purge concurrente est forcément vue
+        if since is not None:
+            floors = pruned_versions(cs_ids)
+            if any(since.get(cs_id, 0) < floor for cs_id, floor in floors.items()):
+                since = None  # suppressions plus anciennes que la rétention: instantané complet
+                rows, deleted, versions = score_changes(scores, tombstones, cs_ids, since)
+        maybe_prune()
 
+        version = format_cursor(versions)
+        etag = quote_etag(hashlib.sha1(version.encode()).hexdigest())  # le curseur contient des virgules
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response({"version": version, "full": since is None, "scores": rows, "deleted": deleted},
+                        headers={"ETag": etag})
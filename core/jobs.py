@@ -0,0 +1,10 @@
+"""
+Outils communs aux files de jobs en base (reports.jobs, grading.jobs).
+"""
+import os
+import socket
+
+
+def worker_name() -> str:
+    """Identifiant du worker qui prend un job: hôte:pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"[:64]
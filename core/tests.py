@@ -1,3 +1,77 @@
+from types import SimpleNamespace
+
 from django.test import TestCase
 
-# Create your tests here.
+from assessments.models import Assessment, AssessmentType, Score
+from core.models import AcademicYear, Classroom, Level, Term
+from enrollments.models import Enrollment, EnrollmentSubject, Student
+from subjects.models import ClassSubject, Subject
+
+# Jeux de données partagés par les tests des applications (grading, assessments, reports).
+
+YEAR = "2025/2026"  # année de l'échelle de notes installée par grading/0002
+
+
+def make_year(name=YEAR):
+    year, _ = AcademicYear.objects.get_or_create(name=name)
+    terms = [Term.objects.get_or_create(year=year, index=i)[0] for i in (1, 2, 3)]
+    return year, terms
+
+
+def make_classroom(name="F5A", level="F5", students=3, subjects=(("MATH", "4.00"), ("ENG", "3.00")),
+                   atypes=("CA1", "CA2"), year=None):
+    """
+    Classe avec `students` élèves inscrits à toutes les matières `subjects`
+    ((code, coefficient)) et une épreuve par (trimestre, matière, atype).
+    Les notes sont posées ensuite avec set_score().
+    """
+    year = year or YEAR
+    year, terms = make_year(year)
+    classroom = Classroom.objects.create(year=year, level=Level.objects.get(code=level), name=name)
+    class_subjects = {}
+    for code, coef in subjects:
+        subject, _ = Subject.objects.get_or_create(code=code, defaults={"name": code.title()})
+        class_subjects[code] = ClassSubject.objects.create(classroom=classroom, subject=subject, coefficient=coef)
+    types = {code: AssessmentType.objects.get_or_create(code=code, defaults={"weight": 50})[0] for code in atypes}
+    assessments = {
+        (t.index, code, at_code): Assessment.objects.create(term=t, class_subject=cs, atype=at)
+        for t in terms for code, cs in class_subjects.items() for at_code, at in types.items()
+    }
+    enrollments, es = [], {}
+    for i in range(students):
+        student = Student.objects.create(matricule=f"{name}-{i:03d}", last_name=f"{name}{i:03d}",
+                                         first_name="Test", sex="F")
+        e = Enrollment.objects.create(student=student, classroom=classroom)
+        enrollments.append(e)
+        for code, cs in class_subjects.items():
+            es[(i, code)] = EnrollmentSubject.objects.create(enrollment=e, class_subject=cs)
+    return SimpleNamespace(year=year, terms=terms, classroom=classroom, class_subjects=class_subjects,
+                           assessments=assessments, enrollments=enrollments, es=es)
+
+
+def set_score(school, student, subject, atype, value, term=1):
+    """Note de l'élève n° `student` (Score.save: signaux et version compris)."""
+    score, _ = Score.objects.update_or_create(
+        enrollment_subject=school.es[(student, subject)],
+        assessment=school.assessments[(term, subject, atype)],
+        defaults={"value": value},
+    )
+    return score
+
+
+def fill_scores(school, term=1, base=40):
+    """Toutes les notes du trimestre, distinctes par élève/matière/épreuve."""
+    n = 0
+    for (i, code), es in school.es.items():
+        for (t, s_code, at_code), a in school.assessments.items():
+            if t == term and s_code == code:
+                Score.objects.create(enrollment_subject=es, assessment=a, value=(base + 7 * i + 3 * n) % 100)
+                n += 1
+
+
+class MakeClassroomTests(TestCase):
+    def test_builds_full_enrollment(self):
+        school = make_classroom(students=2)
+        self.assertEqual(len(school.enrollments), 2)
+        self.assertEqual(len(school.es), 4)
+        self.assertEqual(len(school.assessments), 3 * 2 * 2)
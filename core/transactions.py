@@ -0,0 +1,34 @@
+"""
+État propre à la transaction en cours, traité une seule fois au commit.
+
+transaction_state() rattache l'état au callback on_commit de la transaction:
+il disparaît avec lui si la transaction (ou le savepoint qui l'a créé) est
+annulée, et n'est jamais réutilisé par la transaction suivante.
+"""
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
+
+
+def transaction_state(key: str, factory, on_commit=None, using=None):
+    """
+    État `key` de la transaction en cours, créé par factory() à la première demande.
+    on_commit(state) est appelé une fois, après le commit.
+    À appeler dans un bloc atomic.
+    """
+    conn = transaction.get_connection(using)
+    if not conn.in_atomic_block:
+        raise TransactionManagementError(f"transaction_state({key!r}) requires an atomic block.")
+    for _, func, _ in conn.run_on_commit:
+        if getattr(func, "state_key", None) == key:
+            return func.state
+
+    state = factory()
+
+    def hook():
+        if on_commit is not None:
+            on_commit(state)
+
+    hook.state_key = key
+    hook.state = state
+    transaction.on_commit(hook, using=using)
+    return state
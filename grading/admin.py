@@ -1,6 +1,18 @@
 from django.contrib import admin
-from .models import GradeScale, GradeBand
+from .models import GradeScale, GradeBand, TermResult, TermComputeJob
 # Register your models here.
 
 admin.site.register(GradeScale)
 admin.site.register(GradeBand)
+
+@admin.register(TermResult)
+class TermResultAdmin(admin.ModelAdmin):
+    list_display = ("enrollment", "term", "average", "rank", "updated_at")
+    list_filter = ("term__year", "term__index", "classroom__level")
+    search_fields = ("enrollment__student__matricule", "enrollment__student__last_name")
+
+@admin.register(TermComputeJob)
+class TermComputeJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "term", "status", "done", "total", "students", "created_by", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("error",)
@@ -0,0 +1,426 @@
+"""
+Moteur de calcul des résultats partagé par grading, reports et analytics.
+
+Les données d'une ou plusieurs classes sont chargées en un nombre fixe de
+requêtes (load_snapshot), puis les notes matières, moyennes et rangs sont
+calculés entièrement en mémoire.
+
+Règles:
+  - Note matière (term) = moyenne pondérée des CA (weights = AssessmentType.weight)
+  - F1–F4: CA manquant = 0 (dénominateur = somme des poids des épreuves prévues);
+           une matière sans note compte pour 0 dans la moyenne
+  - F5/L6/U6: pondération renormalisée sur les CA présents;
+              une matière sans aucune note est exclue de la moyenne
+  - Moyenne élève = somme(note × coef) / somme(coef), arrondie à 2 décimales (ROUND_HALF_UP)
+  - Rang 'standard competition' (1,1,3) sur les moyennes arrondies
+  - Annuel: note matière = moyenne des notes trimestrielles (arrondies) pondérée
+            par ANNUAL_TERM_WEIGHTS; en F5+ un trimestre sans note est ignoré
+
+Arithmétique: notes, poids et coefficients sont convertis une fois pour toutes
+en entiers (centièmes) au chargement; les boucles de calcul ne manipulent que
+des entiers (sommes exactes, fractions num/den) et l'arrondi ROUND_HALF_UP
+n'est appliqué qu'en sortie (div_half_up), où les valeurs redeviennent des
+Decimal à 2 décimales.
+
+Calculs de masse (plusieurs classes, niveau entier): bulk_backend() renvoie
+ce module ou son équivalent NumPy (grading.vectorized), mêmes fonctions et
+mêmes résultats (GRADING_BACKEND).
+"""
+import sys
+from decimal import Decimal, ROUND_HALF_UP
+from collections import defaultdict
+from functools import lru_cache
+from math import lcm
+
+from django.conf import settings
+
+from core.models import Classroom, Term
+from subjects.models import ClassSubject
+from enrollments.models import Enrollment, EnrollmentSubject
+from assessments.models import Assessment, Score
+
+D0 = Decimal("0")
+RENORMALISED_LEVELS = ("F5", "L6", "U6")
+# Pondération des trimestres (adapter si besoin)
+ANNUAL_TERM_WEIGHTS = {
+    1: 1,  # Term index 1
+    2: 1,  # Term index 2
+    3: 1,  # Term index 3
+}
+ANNUAL_PASS_MARK = 50  # pour la décision de promotion
+SCALE = 100  # centièmes
+
+
+def q2(x) -> Decimal:
+    """Arrondi à 2 décimales (ROUND_HALF_UP)."""
+    return Decimal(x).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def to_cents(x) -> int:
+    """Decimal/int/str -> entier en centièmes (ROUND_HALF_UP au-delà de 2 décimales)."""
+    return int(Decimal(x).scaleb(2).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+@lru_cache(maxsize=65536)
+def from_cents(n: int) -> Decimal:
+    """Entier en centièmes -> Decimal à 2 décimales."""
+    return Decimal(n).scaleb(-2)
+
+
+def div_half_up(num: int, den: int) -> int:
+    """Quotient entier num/den arrondi ROUND_HALF_UP (demi -> loin de zéro), den > 0."""
+    if num < 0:
+        return -((-2 * num + den) // (2 * den))
+    return (2 * num + den) // (2 * den)
+
+
+def is_renormalised(level_code: str) -> bool:
+    return (level_code or "").upper() in RENORMALISED_LEVELS
+
+
+def load_snapshot(classroom_ids, term_ids, enrollment_ids=None):
+    """
+    Charge en bloc tout ce qu'il faut pour calculer les résultats des classes
+    `classroom_ids` sur les trimestres `term_ids` (7 requêtes, quel que soit
+    le nombre d'élèves).
+    enrollment_ids=None -> toutes les inscriptions actives des classes;
+    sinon uniquement ces inscriptions (actives ou non).
+    """
+    classroom_ids = list(classroom_ids)
+    term_ids = list(term_ids)
+
+    classrooms = {
+        c.id: c for c in Classroom.objects.select_related("level", "year", "stream").filter(id__in=classroom_ids)
+    }
+    terms = {t.id: t for t in Term.objects.select_related("year").filter(id__in=term_ids)}
+
+    enr_qs = (Enrollment.objects
+              .select_related("student")
+              .filter(classroom_id__in=classroom_ids)
+              .order_by("student__last_name", "student__first_name", "id"))
+    if enrollment_ids is None:
+        enr_qs = enr_qs.filter(active=True)
+    else:
+        enr_qs = enr_qs.filter(id__in=list(enrollment_ids))
+    enrollments = list(enr_qs)
+
+    class_subjects = list(
+        ClassSubject.objects.select_related("subject")
+        .filter(classroom_id__in=classroom_ids)
+        .order_by("subject__name", "id")
+    )
+    cs_by_id = {cs.id: cs for cs in class_subjects}
+
+    # Panier (selected) de chaque élève, trié comme les matières;
+    # coef = coefficient effectif (Decimal), coef_c = le même en centièmes
+    coef_c_by_cs = {cs.id: to_cents(cs.coefficient) for cs in class_subjects}
+    es_by_enrollment = defaultdict(list)
+    for r in (EnrollmentSubject.objects
+              .filter(enrollment_id__in=[e.id for e in enrollments],
+                      class_subject_id__in=cs_by_id.keys(), selected=True)
+              .order_by("class_subject__subject__name", "id")
+              .values("id", "enrollment_id", "class_subject_id", "coef_override")):
+        if r["coef_override"]:
+            r["coef"] = r["coef_override"]
+            r["coef_c"] = to_cents(r["coef_override"])
+        else:
+            r["coef"] = cs_by_id[r["class_subject_id"]].coefficient
+            r["coef_c"] = coef_c_by_cs[r["class_subject_id"]]
+        es_by_enrollment[r["enrollment_id"]].append(r)
+
+    # Épreuves par (term, class_subject), triées par code d'atype
+    assessments_by_tc = defaultdict(list)
+    for a in (Assessment.objects
+              .filter(term_id__in=term_ids, class_subject_id__in=cs_by_id.keys())
+              .order_by("atype__code", "id")
+              .values("id", "term_id", "class_subject_id", "atype_id", "atype__code", "atype__weight")):
+        assessments_by_tc[(a["term_id"], a["class_subject_id"])].append({
+            "id": a["id"],
+            "atype_id": a["atype_id"],
+            "code": a["atype__code"],
+            "weight": a["atype__weight"],
+            "w": to_cents(a["atype__weight"]),
+        })
+    assess_ids = [a["id"] for lst in assessments_by_tc.values() for a in lst]
+
+    # Notes en centièmes
+    es_ids = [r["id"] for rows in es_by_enrollment.values() for r in rows]
+    scores = {
+        (es_id, a_id): to_cents(value)
+        for es_id, a_id, value in Score.objects
+        .filter(assessment_id__in=assess_ids, enrollment_subject_id__in=es_ids)
+        .values_list("enrollment_subject_id", "assessment_id", "value")
+    }
+
+    return {
+        "classrooms": classrooms,
+        "terms": terms,
+        "enrollments": enrollments,
+        "class_subjects": class_subjects,
+        "cs_by_id": cs_by_id,
+        "es_by_enrollment": es_by_enrollment,
+        "assessments_by_tc": assessments_by_tc,
+        "scores": scores,
+    }
+
+
+def subject_term_ratio(snap, es_row, term_id, renormalise, ca=None):
+    """
+    Note matière exacte d'un EnrollmentSubject pour un trimestre, sous forme
+    de fraction entière (num, den): note en centièmes = num / den.
+    None si la matière n'a aucune note en F5+ (exclue).
+    Si `ca` est une liste, elle est complétée avec les épreuves et leur valeur
+    (Decimal ou None).
+    """
+    scores = snap["scores"]
+    es_id = es_row["id"]
+    acc = w_present = w_full = 0
+    for a in snap["assessments_by_tc"].get((term_id, es_row["class_subject_id"]), ()):
+        w = a["w"]
+        w_full += w
+        v = scores.get((es_id, a["id"]))
+        if ca is not None:
+            ca.append({
+                "assessment_id": a["id"],
+                "code": a["code"],
+                "weight": a["weight"],
+                "value": from_cents(v) if v is not None else None,
+            })
+        if v is not None:
+            acc += v * w
+            w_present += w
+
+    if renormalise:
+        return (acc, w_present) if w_present else None
+    return (acc, w_full) if w_full else (0, 1)
+
+
+def _weighted_total(parts):
+    """
+    parts: [(num, den, coef_c)] -> (W, L) tels que somme(num/den × coef_c) = W / L
+    (centièmes², exact).
+    """
+    L = lcm(*(den for _, den, _ in parts)) if parts else 1
+    return sum(num * coef_c * (L // den) for num, den, coef_c in parts), L
+
+
+def compute_term(snap, term_id):
+    """
+    Résultats trimestriels de chaque élève du snapshot.
+    Retourne {enrollment_id: {
+        "enrollment", "classroom_id",
+        "subjects": [{"enrollment_subject_id", "class_subject", "coef", "ca", "mark", "weighted", "included",
+                      "filled", "expected"}],
+        "coef_sum", "weighted_sum", "average"
+    }}
+    Toutes les valeurs sont des Decimal arrondies à 2 décimales (mark/weighted
+    valent None pour une matière exclue).
+    """
+    cs_by_id = snap["cs_by_id"]
+    out = {}
+    for e in snap["enrollments"]:
+        classroom = snap["classrooms"][e.classroom_id]
+        renormalise = is_renormalised(classroom.level.code)
+
+        subjects = []
+        parts = []
+        coef_sum = 0
+        for r in snap["es_by_enrollment"].get(e.id, ()):
+            coef_c = r["coef_c"]
+            ca = []
+            ratio = subject_term_ratio(snap, r, term_id, renormalise, ca)
+            mark = weighted = None
+            if ratio is not None:
+                num, den = ratio
+                parts.append((num, den, coef_c))
+                coef_sum += coef_c
+                mark = from_cents(div_half_up(num, den))
+                weighted = from_cents(div_half_up(num * coef_c, den * SCALE))
+            subjects.append({
+                "enrollment_subject_id": r["id"],
+                "class_subject": cs_by_id[r["class_subject_id"]],
+                "coef": r["coef"],
+                "ca": ca,
+                "mark": mark,
+                "weighted": weighted,
+                "included": ratio is not None,
+                "filled": sum(1 for a in ca if a["value"] is not None),
+                "expected": len(ca),
+            })
+
+        W, L = _weighted_total(parts)
+        out[e.id] = {
+            "enrollment": e,
+            "classroom_id": e.classroom_id,
+            "subjects": subjects,
+            "coef_sum": from_cents(coef_sum),
+            "weighted_sum": from_cents(div_half_up(W, L * SCALE)),
+            "average": from_cents(div_half_up(W, L * coef_sum) if coef_sum else 0),
+        }
+    return out
+
+
+def competition_ranks(avg_map):
+    """
+    avg_map: {key: moyenne}
+    return: (rank_map, class_avg)
+       - rank_map: {key: rang} avec la règle 1,1,3,4...
+       - class_avg: moyenne des moyennes (Decimal, 2 décimales)
+    """
+    if not avg_map:
+        return {}, q2(D0)
+
+    dec_map = {k: q2(v if isinstance(v, Decimal) else Decimal(str(v))) for k, v in avg_map.items()}
+    freq = defaultdict(int)
+    for v in dec_map.values():
+        freq[v] += 1
+
+    rank_by_val = {}
+    current = 1
+    for val in sorted(freq.keys(), reverse=True):
+        rank_by_val[val] = current
+        current += freq[val]
+
+    rank_map = {k: rank_by_val[v] for k, v in dec_map.items()}
+    class_avg = q2(sum(dec_map.values()) / Decimal(len(dec_map)))
+    return rank_map, class_avg
+
+
+def group_ranks(averages, group_of):
+    """
+    Rangs et moyenne des moyennes groupe par groupe (ex: par classe).
+    averages: {key: moyenne}; group_of: {key: groupe}.
+    Retourne (rank_map {key: rang}, {groupe: moyenne des moyennes}).
+    """
+    by_group = defaultdict(dict)
+    for k, v in averages.items():
+        by_group[group_of[k]][k] = v
+    rank_map, group_avg = {}, {}
+    for g, avg_map in by_group.items():
+        ranks, group_avg[g] = competition_ranks(avg_map)
+        rank_map.update(ranks)
+    return rank_map, group_avg
+
+
+def bulk_backend():
+    """
+    Module de calcul des chemins de masse (compute_term, compute_annual_averages,
+    group_ranks): grading.vectorized si GRADING_BACKEND = "numpy" et numpy
+    est installé, sinon ce module.
+    """
+    if getattr(settings, "GRADING_BACKEND", "numpy") == "numpy":
+        from grading import vectorized
+        if vectorized.available():
+            return vectorized
+    return sys.modules[__name__]
+
+
+def class_term_results(classroom_id: int, term_id: int):
+    """
+    Calcule tous les résultats d'une classe pour un trimestre (nombre de
+    requêtes constant): notes matières, moyennes, rangs et moyenne de classe.
+    """
+    snap = load_snapshot([classroom_id], [term_id])
+    students = compute_term(snap, term_id)
+    rank_map, class_avg = competition_ranks({k: r["average"] for k, r in students.items()})
+    return {
+        "snapshot": snap,
+        "classroom": snap["classrooms"].get(classroom_id),
+        "term": snap["terms"].get(term_id),
+        "students": students,
+        "rank_map": rank_map,
+        "class_avg": class_avg,
+        "count": len(students),
+    }
+
+
+def year_term_ids(classroom_id: int):
+    """Ids des trimestres de l'année de la classe."""
+    return list(Term.objects.filter(year__classes=classroom_id).order_by("index").values_list("id", flat=True))
+
+
+def compute_annual(snap):
+    """
+    Résultats annuels de chaque élève du snapshot (chargé avec tous les
+    trimestres de l'année).
+    Retourne {enrollment_id: {
+        "enrollment", "classroom_id",
+        "subjects": [{"enrollment_subject_id", "class_subject", "coef", "terms", "annual", "weighted"}],
+        "coef_sum", "weighted_sum", "average", "decision"
+    }}
+    "terms" = {index: note arrondie (Decimal) ou None si pas de note en F5+}
+    """
+    cs_by_id = snap["cs_by_id"]
+    terms = [(t.id, t.index, int(ANNUAL_TERM_WEIGHTS.get(t.index, 1)))
+             for t in sorted(snap["terms"].values(), key=lambda t: t.index)]
+    out = {}
+    for e in snap["enrollments"]:
+        classroom = snap["classrooms"][e.classroom_id]
+        renormalise = is_renormalised(classroom.level.code)
+
+        subjects = []
+        parts = []
+        coef_sum = 0
+        for r in snap["es_by_enrollment"].get(e.id, ()):
+            coef_c = r["coef_c"]
+
+            term_marks = {}
+            annual_num = annual_den = 0
+            for term_id, index, w_term in terms:
+                ratio = subject_term_ratio(snap, r, term_id, renormalise)
+                if ratio is None:
+                    term_marks[index] = None
+                    continue
+                mark_c = div_half_up(*ratio)
+                term_marks[index] = from_cents(mark_c)
+                annual_num += mark_c * w_term
+                annual_den += w_term
+
+            if not annual_den:
+                annual_num, annual_den = 0, 1
+            parts.append((annual_num, annual_den, coef_c))
+            coef_sum += coef_c
+            subjects.append({
+                "enrollment_subject_id": r["id"],
+                "class_subject": cs_by_id[r["class_subject_id"]],
+                "coef": r["coef"],
+                "terms": term_marks,
+                "annual": from_cents(div_half_up(annual_num, annual_den)),
+                "weighted": from_cents(div_half_up(annual_num * coef_c, annual_den * SCALE)),
+            })
+
+        W, L = _weighted_total(parts)
+        average = from_cents(div_half_up(W, L * coef_sum) if coef_sum else 0)
+        out[e.id] = {
+            "enrollment": e,
+            "classroom_id": e.classroom_id,
+            "subjects": subjects,
+            "coef_sum": from_cents(coef_sum),
+            "weighted_sum": from_cents(div_half_up(W, L * SCALE)),
+            "average": average,
+            "decision": "Promoted" if average >= ANNUAL_PASS_MARK else "Repeat",
+        }
+    return out
+
+
+def compute_annual_averages(snap):
+    """{enrollment_id: moyenne annuelle} (classements de niveau)."""
+    return {eid: r["average"] for eid, r in compute_annual(snap).items()}
+
+
+def class_annual_results(classroom_id: int):
+    """
+    Calcule les résultats annuels de toute une classe (T1/T2/T3, annuel,
+    moyennes, rangs, décisions) en chargeant les trois trimestres en une passe.
+    """
+    snap = load_snapshot([classroom_id], year_term_ids(classroom_id))
+    students = compute_annual(snap)
+    rank_map, class_avg = competition_ranks({k: r["average"] for k, r in students.items()})
+    return {
+        "snapshot": snap,
+        "classroom": snap["classrooms"].get(classroom_id),
+        "students": students,
+        "rank_map": rank_map,
+        "class_avg": class_avg,
+        "count": len(students),
+    }
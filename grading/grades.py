@@ -0,0 +1,105 @@
+"""
+Table de conversion note -> (lettre, gpa) compilée en mémoire.
+
+Pour chaque GradeScale, un tableau de 101 cases (notes entières 0..100) est
+construit une seule fois par processus (2 requêtes pour toutes les échelles),
+puis chaque conversion est un simple accès indexé.
+Toute modification d'une GradeScale ou d'une GradeBand (signaux, voir
+grading.signals) incrémente GradeScale.version; chaque processus (workers
+web, pools de calcul et de rendu) compare au plus toutes les CHECK_INTERVAL
+secondes sa table aux (id, version) des échelles et la recompile si elles
+ont changé (échelle modifiée, ajoutée ou supprimée).
+"""
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import F
+
+from grading.models import GradeScale, GradeBand
+
+NO_GRADE = (None, None)
+CHECK_INTERVAL = 5  # s entre deux lectures des versions
+
+_lock = threading.Lock()
+_cache = None  # {"version": ((scale_id, version), ...), "tables": {scale_id: tuple}, "by_year": {year_id: scale_id}}
+_checked_at = 0.0
+
+
+def _current_version() -> tuple:
+    return tuple(GradeScale.objects.order_by("id").values_list("id", "version"))
+
+
+def _compile(version: tuple):
+    tables = {}
+    by_year = {}
+    # Meta.ordering (year__name, name) -> la première échelle de l'année l'emporte
+    for scale_id, year_id in GradeScale.objects.values_list("id", "year_id"):
+        tables[scale_id] = [NO_GRADE] * 101
+        by_year.setdefault(year_id, scale_id)
+
+    # ordering (-min_mark): en cas de chevauchement, la bande la plus haute gagne
+    for scale_id, letter, lo, hi, gpa in GradeBand.objects.values_list(
+        "scale_id", "letter", "min_mark", "max_mark", "gpa"
+    ):
+        table = tables[scale_id]
+        for m in range(max(lo, 0), min(hi, 100) + 1):
+            if table[m] is NO_GRADE:
+                table[m] = (letter, gpa)
+
+    return {"version": version, "tables": {k: tuple(v) for k, v in tables.items()}, "by_year": by_year}
+
+
+def _get_cache():
+    global _cache, _checked_at
+    cache = _cache
+    if cache is not None and time.monotonic() - _checked_at < CHECK_INTERVAL:
+        return cache
+    with _lock:
+        # version lue avant la compilation: une modification concurrente sera vue au prochain contrôle
+        version = _current_version()
+        _checked_at = time.monotonic()
+        if _cache is None or _cache["version"] != version:
+            _cache = _compile(version)
+        return _cache
+
+
+def invalidate(sender=None, instance=None, **kwargs):
+    """
+    Vide le cache local et signale la modification aux autres processus
+    (branché sur post_save/post_delete de GradeScale et GradeBand): la version
+    de l'échelle concernée est incrémentée (une échelle supprimée disparaît
+    des versions lues).
+    """
+    global _cache
+    scale_id = instance.pk if isinstance(instance, GradeScale) else getattr(instance, "scale_id", None)
+    if scale_id is not None:
+        GradeScale.objects.filter(pk=scale_id).update(version=F("version") + 1)
+    with _lock:
+        _cache = None
+
+
+def mark_index(mark):
+    """Note (float/Decimal/str) -> entier 0..100 arrondi ROUND_HALF_UP, ou None."""
+    try:
+        m = int(Decimal(str(mark)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    except Exception:
+        return None
+    return m if 0 <= m <= 100 else None
+
+
+def grade_table(year):
+    """Table compilée de la première GradeScale de l'année (id ou instance), ou None."""
+    cache = _get_cache()
+    scale_id = cache["by_year"].get(getattr(year, "pk", year))
+    return cache["tables"].get(scale_id) if scale_id is not None else None
+
+
+def grade(year, mark):
+    """Retourne (lettre, gpa) pour une note, ou (None, None)."""
+    table = grade_table(year)
+    m = mark_index(mark)
+    if table is None or m is None:
+        return NO_GRADE
+    return table[m]
+
@@ -0,0 +1,66 @@
+"""
+File d'attente des calculs de trimestre pour toute l'école, en base (même
+principe que reports.jobs, sans broker externe).
+
+- enqueue(): crée un TermComputeJob QUEUED (appelé par l'API)
+- claim_next(): un worker prend le plus ancien job QUEUED (UPDATE conditionnel)
+- run_job(): grading.parallel.compute_term_all dans le processus du worker
+  (jamais dans une requête web); la progression est mise à jour par classe
+- requeue_stale(): remet en file les jobs RUNNING sans nouvelles
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.jobs import worker_name
+from .models import TermComputeJob
+from .parallel import compute_term_all
+
+
+def enqueue(term_id: int, classroom_ids=None, workers=None, user=None) -> TermComputeJob:
+    return TermComputeJob.objects.create(
+        term_id=term_id, classrooms=list(classroom_ids or []), workers=workers,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_next(worker=None):
+    """Prend le prochain job en file (ou None)."""
+    worker = worker or worker_name()
+    for job_id in TermComputeJob.objects.filter(status=TermComputeJob.Status.QUEUED).order_by("created_at", "id").values_list("id", flat=True)[:10]:
+        claimed = TermComputeJob.objects.filter(id=job_id, status=TermComputeJob.Status.QUEUED).update(
+            status=TermComputeJob.Status.RUNNING, worker=worker, started_at=timezone.now(), updated_at=timezone.now(),
+        )
+        if claimed:
+            return TermComputeJob.objects.select_related("term").get(id=job_id)
+    return None
+
+
+def requeue_stale(minutes=None) -> int:
+    minutes = minutes or getattr(settings, "GRADING_JOB_STALE_MINUTES", 30)
+    limit = timezone.now() - timedelta(minutes=minutes)
+    return TermComputeJob.objects.filter(status=TermComputeJob.Status.RUNNING, updated_at__lt=limit).update(
+        status=TermComputeJob.Status.QUEUED, worker="", done=0, updated_at=timezone.now(),
+    )
+
+
+def run_job(job: TermComputeJob):
+    def progress(done, total, row):
+        TermComputeJob.objects.filter(id=job.id).update(done=done, total=total, updated_at=timezone.now())
+
+    try:
+        summary = compute_term_all(job.term_id, classroom_ids=job.classrooms or None,
+                                   workers=job.workers, progress=progress)
+        job.total = job.done = summary["classrooms"]
+        job.students = summary["students"]
+        job.status = TermComputeJob.Status.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=["total", "done", "students", "status", "finished_at", "updated_at"])
+    except Exception:
+        job.status = TermComputeJob.Status.FAILED
+        job.error = traceback.format_exc()
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+    return job
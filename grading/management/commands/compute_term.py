@@ -0,0 +1,62 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Term
+from grading.parallel import compute_term_all, default_workers
+from grading.results import term_result_rows
+
+
+class Command(BaseCommand):
+    help = "Calcule les résultats d'un trimestre pour toutes les classes de l'année, en parallèle."
+
+    def add_arguments(self, parser):
+        parser.add_argument("term", type=int, help="Term id")
+        parser.add_argument("--classroom", type=int, action="append", dest="classrooms", help="Classroom id (répétable)")
+        parser.add_argument("--workers", type=int, help="Nombre de processus (défaut: GRADING_WORKERS ou nombre de CPU)")
+        parser.add_argument("--chunk-size", type=int, help="Classes par lot (défaut: GRADING_CHUNK_SIZE)")
+        parser.add_argument("--output", help="Export des résultats (.csv ou .json)")
+
+    def handle(self, *args, **opts):
+        term_id = opts["term"]
+        if not Term.objects.filter(id=term_id).exists():
+            raise CommandError(f"Term {term_id} does not exist.")
+        output = opts.get("output")
+        if output and not output.endswith((".csv", ".json")):
+            raise CommandError("--output must end with .csv or .json")
+
+        workers = opts.get("workers") or default_workers()
+        started = time.monotonic()
+
+        def progress(done, total, row):
+            if opts["verbosity"] > 0:
+                self.stdout.write(
+                    f"[{done}/{total}] classroom={row['classroom_id']} "
+                    f"students={row['count']} class_avg={row['class_avg']:.2f}"
+                )
+
+        summary = compute_term_all(
+            term_id, classroom_ids=opts.get("classrooms"), workers=workers,
+            chunk_size=opts.get("chunk_size"), progress=progress,
+        )
+
+        if output:
+            rows = term_result_rows(term_id, opts.get("classrooms"))
+            with open(output, "w", newline="", encoding="utf-8") as fp:
+                if output.endswith(".json"):
+                    json.dump(list(rows), fp, ensure_ascii=False, indent=2)
+                else:
+                    writer = None
+                    for row in rows:
+                        if writer is None:
+                            writer = csv.DictWriter(fp, fieldnames=list(row.keys()))
+                            writer.writeheader()
+                        writer.writerow(row)
+            self.stdout.write(f"Results written to {output}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['classrooms']} classrooms / {summary['students']} students computed "
+            f"in {time.monotonic() - started:.1f}s ({workers} workers)."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from grading.results import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recalcule les résultats trimestriels matérialisés (SubjectTermResult / TermResult)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--year", type=int, help="AcademicYear id")
+        parser.add_argument("--term", type=int, action="append", dest="terms", help="Term id (répétable)")
+        parser.add_argument("--classroom", type=int, action="append", dest="classrooms", help="Classroom id (répétable)")
+
+    def handle(self, *args, **opts):
+        count = 0
+        for classroom_id, term_id in rebuild(
+            classroom_ids=opts.get("classrooms"), term_ids=opts.get("terms"), year_id=opts.get("year")
+        ):
+            count += 1
+            if opts["verbosity"] > 1:
+                self.stdout.write(f"classroom={classroom_id} term={term_id}")
+        self.stdout.write(self.style.SUCCESS(f"{count} classroom/term result sets rebuilt."))
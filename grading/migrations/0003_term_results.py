@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_seed_levels_streams'),
+        ('enrollments', '0001_initial'),
+        ('grading', '0002_seed_default_scale'),
+        ('subjects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectTermResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mark', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('coef', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('included', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_results', to='subjects.classsubject')),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_results', to='core.classroom')),
+                ('enrollment_subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_results', to='enrollments.enrollmentsubject')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_results', to='core.term')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['classroom', 'term'], name='grading_sub_classro_dfdb59_idx')],
+                'unique_together': {('enrollment_subject', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TermResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coef_sum', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('weighted_sum', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('average', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('scores_filled', models.PositiveIntegerField(default=0)),
+                ('scores_expected', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_results', to='core.classroom')),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_results', to='enrollments.enrollment')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='core.term')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['classroom', 'term', 'rank'], name='grading_ter_classro_846e98_idx')],
+                'unique_together': {('enrollment', 'term')},
+            },
+        ),
+    ]
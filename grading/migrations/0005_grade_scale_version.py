@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0004_term_compute_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradescale',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
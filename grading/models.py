@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.db import models
-from core.models import AcademicYear
+from core.models import AcademicYear, Classroom, Term
+from subjects.models import ClassSubject
+from enrollments.models import Enrollment, EnrollmentSubject
 # Create your models here.
 
 class GradeScale(models.Model):
     name = models.CharField(max_length=32)
     year = models.ForeignKey(AcademicYear, on_delete=models.PROTECT, related_name="grade_scales")
+    # incrémentée à chaque modification de l'échelle ou de ses bandes (grading.grades.invalidate)
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = (("name", "year"),)
@@ -13,6 +18,13 @@ class GradeScale(models.Model):
     def __str__(self):
         return f"{self.name} ({self.year.name})"
 
+    def save(self, *args, **kwargs):
+        # la version n'est jamais réécrite par un save (instance lue avant un incrément)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != "version"]
+        super().save(*args, **kwargs)
+
 class GradeBand(models.Model):
     scale = models.ForeignKey(GradeScale, on_delete=models.CASCADE, related_name="bands")
     letter = models.CharField(max_length=2)  # A, B, C, ...
@@ -27,3 +39,72 @@ class GradeBand(models.Model):
     def __str__(self):
         return f"{self.letter}: {self.min_mark}-{self.max_mark}"
 
+
+class SubjectTermResult(models.Model):
+    """Note matière matérialisée (tenue à jour par grading.results)."""
+    enrollment_subject = models.ForeignKey(EnrollmentSubject, on_delete=models.CASCADE, related_name="term_results")
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name="subject_results")
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name="subject_results")
+    class_subject = models.ForeignKey(ClassSubject, on_delete=models.CASCADE, related_name="term_results")
+    mark = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # None = exclue (F5+ sans note)
+    coef = models.DecimalField(max_digits=5, decimal_places=2)
+    included = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (("enrollment_subject", "term"),)
+        indexes = [models.Index(fields=["classroom", "term"])]
+
+    def __str__(self):
+        return f"{self.enrollment_subject} T{self.term.index}: {self.mark}"
+
+class TermResult(models.Model):
+    """Moyenne et rang trimestriels matérialisés (tenus à jour par grading.results)."""
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name="term_results")
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name="results")
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name="term_results")
+    coef_sum = models.DecimalField(max_digits=7, decimal_places=2)
+    weighted_sum = models.DecimalField(max_digits=9, decimal_places=2)
+    average = models.DecimalField(max_digits=5, decimal_places=2)
+    rank = models.PositiveIntegerField(null=True, blank=True)
+    scores_filled = models.PositiveIntegerField(default=0)    # notes saisies
+    scores_expected = models.PositiveIntegerField(default=0)  # notes attendues (épreuves × matières)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (("enrollment", "term"),)
+        indexes = [models.Index(fields=["classroom", "term", "rank"])]
+
+    def __str__(self):
+        return f"{self.enrollment} T{self.term.index}: {self.average} (#{self.rank})"
+
+
+class TermComputeJob(models.Model):
+    """Calcul d'un trimestre pour toute l'école en arrière-plan (file d'attente en base, voir grading.jobs)."""
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED"
+        RUNNING = "RUNNING"
+        DONE = "DONE"
+        FAILED = "FAILED"
+
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name="compute_jobs")
+    classrooms = models.JSONField(default=list, blank=True)  # [] = toutes les classes de l'année
+    workers = models.PositiveSmallIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=8, choices=Status.choices, default=Status.QUEUED)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    students = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=64, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # battement de coeur du worker
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Term {self.term_id} compute job #{self.id} ({self.status})"
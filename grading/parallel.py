@@ -0,0 +1,84 @@
+"""
+Calcul d'un trimestre pour toutes les classes d'une année, réparti sur
+plusieurs processus.
+
+Les classes sont découpées en lots (GRADING_CHUNK_SIZE); chaque processus
+charge le snapshot de son lot en un nombre fixe de requêtes, calcule les
+résultats (grading.engine) puis les écrit dans les tables matérialisées
+(grading.results.refresh_classes_term). Le parent ne fait que répartir les
+lots et remonter la progression.
+Processus "spawn" (comme reports.rendering): pas de fork d'un processus
+multi-thread ni de connexions DB héritées. Depuis l'API, le calcul passe par
+la file grading.jobs (manage.py run_grading_jobs), jamais dans la requête.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.db import connections
+
+
+def _init_worker():
+    # processus "spawn": Django doit être initialisé dans chaque processus fils
+    django.setup()
+
+
+def _run_chunk(classroom_ids, term_id):
+    # import tardif: avec "spawn", ce module est importé avant django.setup()
+    from grading.results import refresh_classes_term
+    return refresh_classes_term(classroom_ids, term_id)
+
+
+def default_workers() -> int:
+    return getattr(settings, "GRADING_WORKERS", 0) or os.cpu_count() or 1
+
+
+def compute_term_all(term_id: int, classroom_ids=None, workers=None, chunk_size=None, progress=None):
+    """
+    Calcule et enregistre les résultats du trimestre pour toutes les classes
+    de son année (ou seulement `classroom_ids`).
+    workers: nombre de processus (1 = dans le processus courant).
+    progress: callback(done, total, row) appelé à chaque classe terminée.
+    Retourne {"term_id", "classrooms", "students", "results": [{"classroom_id", "count", "class_avg"}]}.
+    """
+    from core.models import Classroom, Term
+    from grading.results import refresh_classes_term
+    term = Term.objects.get(id=term_id)
+    qs = Classroom.objects.filter(year_id=term.year_id)
+    if classroom_ids:
+        qs = qs.filter(id__in=classroom_ids)
+    ids = list(qs.order_by("id").values_list("id", flat=True))
+
+    workers = workers or default_workers()
+    chunk_size = max(1, chunk_size or getattr(settings, "GRADING_CHUNK_SIZE", 4))
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    results = []
+
+    def _collect(rows):
+        for row in rows:
+            results.append(row)
+            if progress:
+                progress(len(results), len(ids), row)
+
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            _collect(refresh_classes_term(chunk, term.id))
+    else:
+        # les fils ouvrent leurs propres connexions
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_run_chunk, chunk, term.id) for chunk in chunks]
+            for future in as_completed(futures):
+                _collect(future.result())
+
+    results.sort(key=lambda r: r["classroom_id"])
+    return {
+        "term_id": term.id,
+        "classrooms": len(results),
+        "students": sum(r["count"] for r in results),
+        "results": results,
+    }
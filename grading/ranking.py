@@ -0,0 +1,138 @@
+"""
+Classements inter-classes: toutes les classes parallèles d'un même niveau
+(et éventuellement d'une même filière) d'une année, ex. "3e sur 412 en Form 5".
+
+Trimestre: moyennes lues en une requête dans les résultats matérialisés
+(grading.results), les classes jamais calculées l'étant en un seul snapshot.
+Annuel: toutes les classes du niveau chargées ensemble (load_snapshot) puis
+moyennes annuelles en une passe. Moyennes et rangs passent par le backend de
+masse du moteur (grading.engine.bulk_backend: NumPy si disponible).
+Les classements sont mis en cache (cache Django); la clé contient une
+empreinte des TermResult concernés (nombre, dernière mise à jour), qui
+change à chaque recalcul déclenché par une écriture: pas d'invalidation
+explicite nécessaire. Le classement annuel, calculé sur les notes brutes,
+ajoute les versions des notes des matières des classes (compteurs par
+matière, incrémentés aussi par les suppressions): une note modifiée change
+la clé même avant le recalcul des TermResult.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from assessments.models import counter_values, scores_counter
+from core.models import Classroom, Term
+from enrollments.models import Enrollment
+from grading.engine import bulk_backend, load_snapshot
+from grading.models import TermResult
+from grading.results import refresh_classes_term
+from subjects.models import ClassSubject
+
+CACHE_PREFIX = "grading:level-rank"
+
+
+def level_classroom_ids(year_id: int, level_id: int, stream_id=None):
+    qs = Classroom.objects.filter(year_id=year_id, level_id=level_id)
+    if stream_id:
+        qs = qs.filter(stream_id=stream_id)
+    return list(qs.order_by("id").values_list("id", flat=True))
+
+
+def _fingerprint(classroom_ids, term_ids):
+    agg = (TermResult.objects
+           .filter(classroom_id__in=classroom_ids, term_id__in=term_ids)
+           .aggregate(n=Count("id"), ts=Max("updated_at")))
+    return f"{agg['n']}:{agg['ts'].timestamp() if agg['ts'] else 0}"
+
+
+def _score_fingerprint(classroom_ids):
+    """Versions des notes lues par le calcul annuel (grading.engine.load_snapshot), matière par matière."""
+    cs_ids = ClassSubject.objects.filter(classroom_id__in=classroom_ids).order_by("id").values_list("id", flat=True)
+    versions = counter_values(scores_counter(cs_id) for cs_id in cs_ids)
+    return hashlib.sha1(",".join(f"{name}={v}" for name, v in versions.items()).encode()).hexdigest()[:12]
+
+
+def _cache_key(year_id, level_id, stream_id, term_id, classroom_ids, term_ids):
+    classes = hashlib.sha1(",".join(map(str, classroom_ids)).encode()).hexdigest()[:12]
+    fingerprint = _fingerprint(classroom_ids, term_ids)
+    if not term_id:
+        fingerprint += ":" + _score_fingerprint(classroom_ids)
+    return (f"{CACHE_PREFIX}:{year_id}:{level_id}:{stream_id or '-'}:{term_id or 'annual'}:"
+            f"{classes}:{fingerprint}")
+
+
+def _ranking(averages, classroom_of):
+    rank_map, level_avg = bulk_backend().group_ranks(averages, dict.fromkeys(averages, 0))
+    return {
+        "count": len(averages),
+        "level_avg": float(level_avg.get(0, 0)),
+        "ranks": rank_map,
+        "averages": {k: float(v) for k, v in averages.items()},
+        "classroom_of": classroom_of,
+    }
+
+
+def _term_averages(classroom_ids, term_id):
+    rows = list(TermResult.objects
+                .filter(classroom_id__in=classroom_ids, term_id=term_id, enrollment__active=True)
+                .values_list("enrollment_id", "classroom_id", "average"))
+    stored = {c for _, c, _ in rows}
+    missing = set(Enrollment.objects
+                  .filter(classroom_id__in=classroom_ids, active=True)
+                  .exclude(classroom_id__in=stored)
+                  .values_list("classroom_id", flat=True)
+                  .distinct())
+    if missing:
+        # classes jamais matérialisées pour ce trimestre: un seul snapshot pour toutes
+        refresh_classes_term(sorted(missing), term_id)
+        rows += list(TermResult.objects
+                     .filter(classroom_id__in=missing, term_id=term_id, enrollment__active=True)
+                     .values_list("enrollment_id", "classroom_id", "average"))
+    return {e: avg for e, _, avg in rows}, {e: c for e, c, _ in rows}
+
+
+def _annual_averages(classroom_ids, term_ids):
+    snap = load_snapshot(classroom_ids, term_ids)
+    averages = bulk_backend().compute_annual_averages(snap)
+    return averages, {e.id: e.classroom_id for e in snap["enrollments"]}
+
+
+def level_ranking(year_id: int, level_id: int, term_id=None, stream_id=None):
+    """
+    Classement 'standard competition' de tous les élèves actifs des classes
+    du niveau (et de la filière si stream_id) pour un trimestre, ou pour
+    l'année si term_id est None.
+    Retourne {"count", "level_avg", "ranks": {enrollment_id: rang},
+              "averages": {enrollment_id: moyenne}, "classroom_of": {enrollment_id: classroom_id}}
+    """
+    classroom_ids = level_classroom_ids(year_id, level_id, stream_id)
+    if term_id:
+        term_ids = [term_id]
+    else:
+        term_ids = list(Term.objects.filter(year_id=year_id).order_by("index").values_list("id", flat=True))
+
+    key = _cache_key(year_id, level_id, stream_id, term_id, classroom_ids, term_ids)
+    data = cache.get(key)
+    if data is None:
+        if term_id:
+            averages, classroom_of = _term_averages(classroom_ids, term_id)
+        else:
+            averages, classroom_of = _annual_averages(classroom_ids, term_ids)
+        data = _ranking(averages, classroom_of)
+        # la matérialisation à la volée a pu changer l'empreinte
+        key = _cache_key(year_id, level_id, stream_id, term_id, classroom_ids, term_ids)
+        cache.set(key, data, getattr(settings, "GRADING_RANK_CACHE_TIMEOUT", 600))
+    return data
+
+
+def level_stats_for(classroom, enrollment_id: int, term_id=None, ranking=None):
+    """Bloc "level_stats" d'un bulletin: position de l'élève parmi toutes les classes du niveau."""
+    if ranking is None:
+        ranking = level_ranking(classroom.year_id, classroom.level_id, term_id)
+    return {
+        "rank": ranking["ranks"].get(enrollment_id),
+        "count": ranking["count"],
+        "level": classroom.level.name,
+        "level_avg": ranking["level_avg"],
+    }
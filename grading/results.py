@@ -0,0 +1,279 @@
+"""
+Résultats trimestriels matérialisés (SubjectTermResult / TermResult).
+
+Toute écriture qui touche une entrée du calcul (notes, épreuves, poids des
+atypes, coefficients, paniers, inscriptions) planifie le recalcul des couples
+(classe, trimestre) concernés; le recalcul a lieu une seule fois par couple,
+au commit de la transaction, avec le moteur (grading.engine) puis un upsert
+en bloc. Les rangs dépendant de toute la classe, la classe est l'unité de
+mise à jour.
+Seules les écritures limitées à une classe (note, feuille, inscription;
+GRADING_INLINE_REFRESH_CLASSROOMS) sont recalculées dans la requête; les
+écritures en éventail (poids d'un atype, changement de classe, import de
+masse) sont confiées à la file TermComputeJob (grading.jobs), un job par
+trimestre.
+Les lectures (analytics.class_stats, preview compacte) deviennent de
+simples lectures indexées sur (classroom, term).
+"""
+from django.conf import settings
+from django.db import transaction
+
+from core.models import Classroom, Term
+from core.transactions import transaction_state
+from assessments.models import Assessment
+from enrollments.models import Enrollment
+from grading.engine import bulk_backend, class_term_results, load_snapshot
+from grading.models import SubjectTermResult, TermResult
+from grading import jobs
+
+_PENDING_KEY = "grading.pending_term_results"
+
+
+def refresh_class_term(classroom_id: int, term_id: int):
+    """Recalcule et enregistre les résultats d'une classe pour un trimestre."""
+    ctx = class_term_results(classroom_id, term_id)
+    store_class_term(classroom_id, term_id, ctx["students"], ctx["rank_map"])
+    return ctx
+
+
+def refresh_classes_term(classroom_ids, term_id: int):
+    """
+    Recalcule plusieurs classes d'un même trimestre avec un seul snapshot
+    (utilisé par les calculs de masse, voir grading.parallel), avec le
+    backend de masse du moteur (grading.engine.bulk_backend).
+    Retourne un résumé par classe: [{"classroom_id", "count", "class_avg"}].
+    """
+    backend = bulk_backend()
+    snap = load_snapshot(classroom_ids, [term_id])
+    results = backend.compute_term(snap, term_id)
+    rank_map, class_avgs = backend.group_ranks({k: r["average"] for k, r in results.items()},
+                                               {k: r["classroom_id"] for k, r in results.items()})
+    by_class = {c: {} for c in snap["classrooms"]}
+    for eid, r in results.items():
+        by_class[r["classroom_id"]][eid] = r
+
+    summary = []
+    for classroom_id in sorted(by_class):
+        students = by_class[classroom_id]
+        store_class_term(classroom_id, term_id, students, rank_map)
+        summary.append({"classroom_id": classroom_id, "count": len(students),
+                        "class_avg": float(class_avgs.get(classroom_id, 0))})
+    return summary
+
+
+def store_class_term(classroom_id: int, term_id: int, students, rank_map):
+    """Enregistre (upsert) les résultats moteur d'une classe pour un trimestre."""
+    subject_rows = []
+    term_rows = []
+    for eid, r in students.items():
+        filled = expected = 0
+        for s in r["subjects"]:
+            expected += s["expected"]
+            filled += s["filled"]
+            subject_rows.append(SubjectTermResult(
+                enrollment_subject_id=s["enrollment_subject_id"],
+                term_id=term_id,
+                classroom_id=classroom_id,
+                class_subject_id=s["class_subject"].id,
+                mark=s["mark"],
+                coef=s["coef"],
+                included=s["included"],
+            ))
+        term_rows.append(TermResult(
+            enrollment_id=eid,
+            term_id=term_id,
+            classroom_id=classroom_id,
+            coef_sum=r["coef_sum"],
+            weighted_sum=r["weighted_sum"],
+            average=r["average"],
+            rank=rank_map.get(eid),
+            scores_filled=filled,
+            scores_expected=expected,
+        ))
+
+    with transaction.atomic():
+        # lignes devenues sans objet (inscription inactive, matière désélectionnée)
+        (SubjectTermResult.objects
+         .filter(classroom_id=classroom_id, term_id=term_id)
+         .exclude(enrollment_subject_id__in=[r.enrollment_subject_id for r in subject_rows])
+         .delete())
+        (TermResult.objects
+         .filter(classroom_id=classroom_id, term_id=term_id)
+         .exclude(enrollment_id__in=list(students.keys()))
+         .delete())
+
+        SubjectTermResult.objects.bulk_create(
+            subject_rows, update_conflicts=True,
+            unique_fields=["enrollment_subject", "term"],
+            update_fields=["classroom", "class_subject", "mark", "coef", "included", "updated_at"],
+        )
+        TermResult.objects.bulk_create(
+            term_rows, update_conflicts=True,
+            unique_fields=["enrollment", "term"],
+            update_fields=["classroom", "coef_sum", "weighted_sum", "average", "rank",
+                           "scores_filled", "scores_expected", "updated_at"],
+        )
+
+
+def refresh_pairs(pairs):
+    for classroom_id, term_id in sorted(set(pairs)):
+        refresh_class_term(classroom_id, term_id)
+
+
+def schedule_refresh(pairs=(), assessments=(), classrooms=(), enrollments=(), atypes=(), using=None):
+    """
+    Planifie le recalcul des couples (classroom_id, term_id) au commit.
+    Couples donnés directement, ou via les épreuves / classes (tous les
+    trimestres de l'année) / inscriptions / types d'épreuve touchés: ces
+    identifiants sont résolus en couples au commit, en une requête par sorte
+    pour toute la transaction. Les couples sont dédoublonnés: N écritures dans
+    la même transaction ne provoquent qu'un recalcul par classe/trimestre.
+    Au-delà de GRADING_INLINE_REFRESH_CLASSROOMS classes touchées, le recalcul
+    part dans la file TermComputeJob au lieu d'être fait dans la requête.
+    Une transaction annulée n'en laisse rien. Hors transaction: immédiat.
+    """
+    conn = transaction.get_connection(using)
+    if conn.in_atomic_block:
+        pending = transaction_state(_PENDING_KEY, _new_pending, _flush, using)
+    else:
+        pending = _new_pending()
+    pending["pairs"].update(pairs)
+    pending["assessments"].update(assessments)
+    pending["classrooms"].update(classrooms)
+    pending["enrollments"].update(enrollments)
+    pending["atypes"].update(atypes)
+    if not conn.in_atomic_block:
+        _flush(pending)
+
+
+def _new_pending():
+    return {"pairs": set(), "assessments": set(), "classrooms": set(), "enrollments": set(), "atypes": set()}
+
+
+def _flush(pending):
+    pairs = set(pending["pairs"])
+    if pending["assessments"]:
+        pairs |= pairs_for_assessments(pending["assessments"])
+    classroom_ids = set(pending["classrooms"])
+    if pending["enrollments"]:
+        classroom_ids |= set(Enrollment.objects.filter(id__in=list(pending["enrollments"]))
+                             .values_list("classroom_id", flat=True))
+    if classroom_ids:
+        pairs |= pairs_for_classrooms(classroom_ids)
+    for atype_id in pending["atypes"]:
+        pairs |= pairs_for_atype(atype_id)
+    if len({c for c, _ in pairs}) <= getattr(settings, "GRADING_INLINE_REFRESH_CLASSROOMS", 1):
+        refresh_pairs(pairs)
+    else:
+        enqueue_pairs(pairs)
+
+
+def enqueue_pairs(pairs):
+    """Un TermComputeJob par trimestre pour les classes concernées (voir grading.jobs)."""
+    by_term = {}
+    for classroom_id, term_id in pairs:
+        by_term.setdefault(term_id, set()).add(classroom_id)
+    return [jobs.enqueue(term_id, sorted(classroom_ids)) for term_id, classroom_ids in sorted(by_term.items())]
+
+
+# -------------------------
+#  Couples touchés par une écriture
+# -------------------------
+
+def pairs_for_assessments(assessment_ids):
+    return set(
+        Assessment.objects.filter(id__in=list(assessment_ids))
+        .values_list("class_subject__classroom_id", "term_id")
+    )
+
+
+def pairs_for_classrooms(classroom_ids):
+    """Tous les trimestres de l'année de chaque classe."""
+    year_by_class = dict(Classroom.objects.filter(id__in=list(classroom_ids)).values_list("id", "year_id"))
+    terms_by_year = {}
+    for year_id, term_id in Term.objects.filter(year_id__in=set(year_by_class.values())).values_list("year_id", "id"):
+        terms_by_year.setdefault(year_id, []).append(term_id)
+    return {(c, t) for c, y in year_by_class.items() for t in terms_by_year.get(y, ())}
+
+
+def pairs_for_atype(atype_id: int):
+    return set(
+        Assessment.objects.filter(atype_id=atype_id)
+        .values_list("class_subject__classroom_id", "term_id")
+        .distinct()
+    )
+
+
+def rebuild(classroom_ids=None, term_ids=None, year_id=None):
+    """Recalcule tout (ou un sous-ensemble); utilisé par la commande rebuild_term_results."""
+    terms = Term.objects.all()
+    if year_id:
+        terms = terms.filter(year_id=year_id)
+    if term_ids:
+        terms = terms.filter(id__in=term_ids)
+    pairs = set()
+    for term_id, year in terms.values_list("id", "year_id"):
+        classes = Classroom.objects.filter(year_id=year)
+        if classroom_ids:
+            classes = classes.filter(id__in=classroom_ids)
+        for classroom_id in classes.values_list("id", flat=True):
+            pairs.add((classroom_id, term_id))
+    for pair in sorted(pairs):
+        refresh_class_term(*pair)
+        yield pair
+
+
+# -------------------------
+#  Lectures
+# -------------------------
+
+def stored_class_term(classroom_id: int, term_id: int):
+    """
+    Lignes TermResult d'une classe (triées par nom d'élève). Si la classe n'a
+    jamais été matérialisée pour ce trimestre, elle est calculée à la volée.
+    """
+    qs = (TermResult.objects
+          .filter(classroom_id=classroom_id, term_id=term_id, enrollment__active=True)
+          .select_related("enrollment__student")
+          .order_by("enrollment__student__last_name", "enrollment__student__first_name", "enrollment_id"))
+    rows = list(qs)
+    if not rows and Enrollment.objects.filter(classroom_id=classroom_id, active=True).exists():
+        refresh_class_term(classroom_id, term_id)
+        rows = list(qs.all())
+    return rows
+
+
+def stored_subject_marks(classroom_id: int, term_id: int):
+    """{class_subject_id: [notes (Decimal) prises en compte]} pour une classe/trimestre."""
+    out = {}
+    for cs_id, mark, included in (SubjectTermResult.objects
+                                  .filter(classroom_id=classroom_id, term_id=term_id,
+                                          enrollment_subject__enrollment__active=True)
+                                  .values_list("class_subject_id", "mark", "included")):
+        vals = out.setdefault(cs_id, [])
+        if included:
+            vals.append(mark)
+    return out
+
+
+def term_result_rows(term_id: int, classroom_ids=None):
+    """Lignes à plat (classe, élève, moyenne, rang) des résultats stockés d'un trimestre, pour export."""
+    qs = (TermResult.objects
+          .filter(term_id=term_id, enrollment__active=True)
+          .select_related("classroom", "enrollment__student")
+          .order_by("classroom__name", "rank", "enrollment__student__last_name", "enrollment_id"))
+    if classroom_ids:
+        qs = qs.filter(classroom_id__in=classroom_ids)
+    for r in qs.iterator(chunk_size=2000):
+        student = r.enrollment.student
+        yield {
+            "classroom_id": r.classroom_id,
+            "classroom": r.classroom.name,
+            "enrollment_id": r.enrollment_id,
+            "matricule": student.matricule,
+            "name": f"{student.last_name} {student.first_name}",
+            "coef_sum": float(r.coef_sum),
+            "weighted_sum": float(r.weighted_sum),
+            "average": float(r.average),
+            "rank": r.rank,
+        }
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from rest_framework import serializers
+
+
+class ScoreOverrideSerializer(serializers.Serializer):
+    """
+    Note hypothétique. Cible:
+      - enrollment_subject + assessment
+      - ou enrollment + class_subject + code (ex: "CA2")
+    value=null -> la note est retirée.
+    """
+    enrollment_subject = serializers.IntegerField(required=False)
+    assessment = serializers.IntegerField(required=False)
+    enrollment = serializers.IntegerField(required=False)
+    class_subject = serializers.IntegerField(required=False)
+    code = serializers.CharField(required=False)
+    value = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100, allow_null=True)
+
+    def validate(self, attrs):
+        by_ids = attrs.get("enrollment_subject") and attrs.get("assessment")
+        by_codes = attrs.get("enrollment") and attrs.get("class_subject") and attrs.get("code")
+        if not (by_ids or by_codes):
+            raise serializers.ValidationError(
+                "Provide either 'enrollment_subject' + 'assessment' or 'enrollment' + 'class_subject' + 'code'."
+            )
+        return attrs
+
+
+class WeightOverrideSerializer(serializers.Serializer):
+    atype = serializers.CharField()  # code, ex: "CA1"
+    weight = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100)
+
+
+class CoefficientOverrideSerializer(serializers.Serializer):
+    class_subject = serializers.IntegerField()
+    coefficient = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal("0.01"))
+
+
+class SimulationSerializer(serializers.Serializer):
+    """
+    Simulation "et si ?" (grading.simulation): rien n'est écrit en base.
+    {
+      "classroom": 3, "term": 1, "enrollment": 51,          // enrollment optionnel (détail élève)
+      "scores": [{"enrollment": 51, "class_subject": 7, "code": "CA2", "value": 14}],
+      "weights": [{"atype": "CA2", "weight": 60}],
+      "coefficients": [{"class_subject": 7, "coefficient": 3}]
+    }
+    """
+    classroom = serializers.IntegerField()
+    term = serializers.IntegerField()
+    enrollment = serializers.IntegerField(required=False)
+    scores = ScoreOverrideSerializer(many=True, required=False)
+    weights = WeightOverrideSerializer(many=True, required=False)
+    coefficients = CoefficientOverrideSerializer(many=True, required=False)
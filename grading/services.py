@@ -1,11 +1,10 @@
 from decimal import Decimal, ROUND_HALF_UP
-from collections import defaultdict
 
-from core.models import Term, Level
-from subjects.models import ClassSubject
-from enrollments.models import Enrollment, EnrollmentSubject
-from assessments.models import Assessment, AssessmentType, Score
-from grading.models import GradeScale, GradeBand
+from core.models import Term, Classroom
+from enrollments.models import Enrollment
+from grading import grades
+from grading.engine import load_snapshot, compute_term, class_term_results, is_renormalised
+from grading.results import stored_class_term
 
 D0 = Decimal("0")
 D100 = Decimal("100")
@@ -15,133 +14,46 @@ def _q(x):
 
 def grade_letter(year, mark):
     """Retourne lettre à partir de la première GradeScale de l'année (ou None)."""
-    mark_int = int(Decimal(mark).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
-    scale = GradeScale.objects.filter(year=year).first()
-    if not scale:
-        return None
-    band = GradeBand.objects.filter(scale=scale, min_mark__lte=mark_int, max_mark__gte=mark_int).first()
-    return band.letter if band else None
+    return grades.grade(year, mark)[0]
 
 def is_level_F5_plus(level_code: str) -> bool:
-    return level_code in ("F5","L6","U6")
+    return is_renormalised(level_code)
 
 def compute_student_term_preview(enrollment_id: int, term_id: int):
     """
-    Calcule le récapitulatif trimestriel d'un élève.
-    Règles:
-      - Note matière (term) = moyenne pondérée des CA (weights = AssessmentType.weight)
-      - F1–F4: CA manquant = 0; toutes les matières de la classe sont comptées
-      - F5/L6/U6: on compte seulement les matières avec au moins une note;
-                  pondération renormalisée sur les CA présents
+    Calcule le récapitulatif trimestriel d'un élève (règles: voir grading.engine).
     Retourne un dict structuré pour le JSON de preview.
     """
-    enrollment: Enrollment = Enrollment.objects.select_related(
-        "classroom__year", "classroom__level"
-    ).get(id=enrollment_id)
-    term: Term = Term.objects.select_related("year").get(id=term_id)
-    classroom = enrollment.classroom
-    level_code = classroom.level.code
+    enrollment: Enrollment = Enrollment.objects.only("id", "classroom_id").get(id=enrollment_id)
+    snap = load_snapshot([enrollment.classroom_id], [term_id], enrollment_ids=[enrollment_id])
+    result = compute_term(snap, term_id)[enrollment_id]
+    classroom = snap["classrooms"][enrollment.classroom_id]
+    return _preview_payload(result, classroom, snap["terms"][term_id])
+
+def _preview_payload(result, classroom, term):
+    """Met en forme le résultat moteur d'un élève pour le JSON de preview."""
+    enrollment = result["enrollment"]
     year = classroom.year
 
-    # Tous les atypes actifs (ex CA1, CA2) et leurs poids
-    atypes = list(AssessmentType.objects.filter(is_active=True).order_by("code"))
-    weight_map = {a.id: _q(a.weight) for a in atypes}  # ex {id_CA1: 50, id_CA2: 50}
-
-    # Matières suivies par l'élève (Option A = EnrollmentSubject sélectionnés)
-    es_qs = (EnrollmentSubject.objects
-             .filter(enrollment=enrollment, selected=True)
-             .select_related("class_subject__subject"))
-    es_by_cs = {es.class_subject_id: es for es in es_qs}
-
-    # Toutes les class_subject de la classe (utile pour F1–F4)
-    cs_qs = (ClassSubject.objects
-             .filter(classroom=classroom)
-             .select_related("subject"))
-
-    # Assessments de ce term pour la classe
-    ass_qs = (Assessment.objects
-              .filter(term=term, class_subject__classroom=classroom)
-              .select_related("class_subject__subject","atype"))
-
-    # Scores de l'élève pour ces assessments
-    scores = (Score.objects
-              .filter(enrollment_subject__enrollment=enrollment, assessment__in=ass_qs)
-              .select_related("assessment__atype","enrollment_subject","assessment"))
-
-    # Indexation
-    assessments_by_cs = defaultdict(list)
-    for a in ass_qs:
-        assessments_by_cs[a.class_subject_id].append(a)
-
-    score_map = {}  # (assessment_id) -> value
-    for s in scores:
-        score_map[s.assessment_id] = _q(s.value)
-
     details = []
-    sum_weighted = D0
-    sum_coefs = D0
-
-    for cs in cs_qs:
-        subject = cs.subject
-        es = es_by_cs.get(cs.id)  # None si élève n'a pas pris cette matière (F5+)
-        coef_effective = _q(es.coef_override) if (es and es.coef_override is not None) else _q(cs.coefficient)
-
-        a_list = assessments_by_cs.get(cs.id, [])
-        if not a_list:
-            # pas d'assessment configuré pour cette matière et term -> ignorer
-            continue
-
-        # Récupérer les notes
-        present_weights = D0
-        acc = D0
-        for a in a_list:
-            w = weight_map.get(a.atype_id, D0)
-            v = score_map.get(a.id, None)
-            if v is None:
-                continue
-            present_weights += w
-            acc += (v * w)
-
-        if is_level_F5_plus(level_code):
-            # on compte la matière seulement si au moins une note est présente
-            if present_weights == D0:
-                # aucune note -> ignorer du calcul global
-                continue
-            term_mark = (acc / present_weights)  # renormalisation
-        else:
-            # F1–F4: manquants = 0, dénominateur = somme des poids définis
-            total_w = sum(weight_map.values()) or Decimal("100")
-            term_mark = (acc / (present_weights if present_weights > D0 else D0)) if present_weights > D0 else D0
-            # si des CA manquent, ils apportent 0: rien à ajouter, mais denominator doit être total_w
-            term_mark = (acc / (present_weights if present_weights > D0 else D0)).quantize(Decimal("0.01")) if present_weights > D0 else D0
-            # puis on remet à l'échelle par total_w/present_weights si nécessaire
-            if present_weights and present_weights != total_w:
-                term_mark = (term_mark * (present_weights / total_w)).quantize(Decimal("0.01"))
-            # si aucun CA présent, term_mark reste 0
-
-        term_mark = _q(term_mark)
-        letter = grade_letter(year, term_mark) or ""
-
+    for s in result["subjects"]:
+        subject = s["class_subject"].subject
+        term_mark = s["mark"] if s["included"] else D0
         details.append({
             "subject_id": subject.id,
             "subject_code": subject.code,
             "subject_name": subject.name,
-            "coefficient": float(coef_effective),
+            "coefficient": float(_q(s["coef"])),
             "ca": [
-                {"code": a.atype.code, "weight": float(weight_map.get(a.atype_id, D0)), "value": float(score_map.get(a.id)) if score_map.get(a.id) is not None else None}
-                for a in sorted(a_list, key=lambda x: x.atype.code)
+                {"code": a["code"], "weight": float(_q(a["weight"])), "value": float(a["value"]) if a["value"] is not None else None}
+                for a in s["ca"]
             ],
             "term_mark": float(term_mark),
-            "grade": letter,
-            "included_in_average": True if (not is_level_F5_plus(level_code) or (is_level_F5_plus(level_code) and present_weights > D0)) else False,
+            "grade": (grade_letter(year, term_mark) or "") if s["included"] else "",
+            "included_in_average": s["included"],
         })
 
-        # Agrégats
-        if (not is_level_F5_plus(level_code)) or (is_level_F5_plus(level_code) and present_weights > D0):
-            sum_weighted += (coef_effective * term_mark)
-            sum_coefs += coef_effective
-
-    general_average = float(_q(sum_weighted / sum_coefs)) if sum_coefs > D0 else 0.0
+    general_average = float(result["average"])
     general_grade = grade_letter(year, general_average) or ""
 
     return {
@@ -159,8 +71,8 @@ def compute_student_term_preview(enrollment_id: int, term_id: int):
         },
         "term": {"id": term.id, "index": term.index, "year": term.year.name},
         "subjects": details,   # pour le tableau PDF
-        "sum_coefficients": float(_q(sum_coefs)),
-        "weighted_total": float(_q(sum_weighted)),
+        "sum_coefficients": float(result["coef_sum"]),
+        "weighted_total": float(result["weighted_sum"]),
         "general_average": general_average,
         "general_grade": general_grade,
     }
@@ -168,32 +80,52 @@ def compute_student_term_preview(enrollment_id: int, term_id: int):
 def compute_class_term_preview(classroom_id: int, term_id: int, with_details=False):
     """
     Calcule la moyenne de chaque élève de la classe pour un term.
-    with_details=False -> renvoie lignes compactes (plus rapide pour tableau).
+    with_details=False -> lignes compactes lues dans les résultats matérialisés
+                          (grading.results, lecture indexée).
+    with_details=True  -> toute la classe calculée en une fois (grading.engine).
+    Les lettres viennent de la table compilée (grading.grades): le nombre de
+    requêtes ne dépend pas de l'effectif.
     """
+    if not with_details:
+        return _compact_class_term_preview(classroom_id, term_id)
+
+    ctx = class_term_results(classroom_id, term_id)
+    term = ctx["term"] or Term.objects.select_related("year").get(id=term_id)
+    classroom = ctx["classroom"]
+
+    rows = [_preview_payload(ctx["students"][e.id], classroom, term) for e in ctx["snapshot"]["enrollments"]]
+
+    # Classement par moyenne (desc), rang 'standard competition' (1,1,3)
+    rows_sorted = sorted(rows, key=lambda x: x["general_average"], reverse=True)
+    for r in rows_sorted:
+        r["rank"] = ctx["rank_map"][r["enrollment_id"]]
+
+    return {
+        "classroom_id": classroom_id,
+        "term": {"id": term.id, "index": term.index, "year": term.year.name},
+        "count": len(rows_sorted),
+        "results": rows_sorted,
+    }
+
+def _compact_class_term_preview(classroom_id: int, term_id: int):
     term = Term.objects.select_related("year").get(id=term_id)
-    enrollments = (Enrollment.objects
-                   .select_related("student","classroom__level","classroom__year")
-                   .filter(classroom_id=classroom_id, active=True)
-                   .order_by("student__last_name","student__first_name"))
+    year_id = Classroom.objects.filter(id=classroom_id).values_list("year_id", flat=True).first()
 
     rows = []
-    for e in enrollments:
-        data = compute_student_term_preview(e.id, term.id)
-        if with_details:
-            rows.append(data)
-        else:
-            rows.append({
-                "enrollment_id": data["enrollment_id"],
-                "student": data["student"],
-                "general_average": data["general_average"],
-                "general_grade": data["general_grade"],
-            })
-
-    # Classement simple par moyenne (desc)
+    for r in stored_class_term(classroom_id, term_id):
+        student = r.enrollment.student
+        rows.append({
+            "enrollment_id": r.enrollment_id,
+            "student": {
+                "id": student.id,
+                "matricule": student.matricule,
+                "name": f"{student.last_name} {student.first_name}",
+            },
+            "general_average": float(r.average),
+            "general_grade": grade_letter(year_id, r.average) or "",
+            "rank": r.rank,
+        })
     rows_sorted = sorted(rows, key=lambda x: x["general_average"], reverse=True)
-    # injecter rank
-    for i, r in enumerate(rows_sorted, start=1):
-        r["rank"] = i
 
     return {
         "classroom_id": classroom_id,
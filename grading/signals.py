@@ -0,0 +1,80 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from subjects.models import ClassSubject
+from enrollments.models import Enrollment, EnrollmentSubject
+from assessments.models import AssessmentType, Assessment, Score
+from .models import GradeScale, GradeBand
+from . import grades, results
+
+
+@receiver([post_save, post_delete], sender=GradeScale)
+@receiver([post_save, post_delete], sender=GradeBand)
+def invalidate_grade_tables(sender, instance, **kwargs):
+    grades.invalidate(sender, instance)
+
+
+# -------------------------
+#  Résultats matérialisés (grading.results)
+# -------------------------
+
+@receiver([post_save, post_delete], sender=Score)
+def score_changed(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    results.schedule_refresh(assessments=[instance.assessment_id])
+
+
+@receiver(post_save, sender=Assessment)
+def assessment_saved(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    results.schedule_refresh({(instance.class_subject.classroom_id, instance.term_id)})
+
+
+@receiver(post_delete, sender=Assessment)
+def assessment_deleted(sender, instance, **kwargs):
+    # la classe peut déjà avoir disparu (suppression en cascade)
+    classroom_id = ClassSubject.objects.filter(id=instance.class_subject_id).values_list("classroom_id", flat=True).first()
+    if classroom_id:
+        results.schedule_refresh({(classroom_id, instance.term_id)})
+
+
+@receiver(pre_save, sender=AssessmentType)
+def atype_remember_weight(sender, instance, **kwargs):
+    instance._previous_weight = (
+        AssessmentType.objects.filter(pk=instance.pk).values_list("weight", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=AssessmentType)
+def atype_saved(sender, instance, created, **kwargs):
+    if not created and not kwargs.get("raw") and instance._previous_weight != instance.weight:
+        results.schedule_refresh(atypes=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=EnrollmentSubject)
+def enrollment_subject_changed(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    results.schedule_refresh(enrollments=[instance.enrollment_id])
+
+
+@receiver(pre_save, sender=ClassSubject)
+@receiver(pre_save, sender=Enrollment)
+def remember_classroom(sender, instance, **kwargs):
+    # changement de classe: l'ancienne classe doit aussi être recalculée
+    instance._previous_classroom_id = (
+        sender.objects.filter(pk=instance.pk).values_list("classroom_id", flat=True).first()
+        if instance.pk and not kwargs.get("raw") else None
+    )
+
+
+@receiver(post_save, sender=ClassSubject)
+@receiver([post_save, post_delete], sender=Enrollment)
+def classroom_changed(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    classroom_ids = {instance.classroom_id, getattr(instance, "_previous_classroom_id", None)} - {None}
+    results.schedule_refresh(classrooms=classroom_ids)
@@ -0,0 +1,168 @@
+"""
+Simulation "et si ?" des résultats d'un trimestre, sans rien écrire en base.
+
+Le snapshot de la classe est chargé une fois (grading.engine.load_snapshot,
+nombre de requêtes fixe); les hypothèses (notes, poids des types d'épreuve,
+coefficients) sont appliquées sur une copie en mémoire, puis le moteur
+recalcule notes matières, moyennes et rangs. Les hypothèses qui ne
+correspondent à rien dans la classe sont renvoyées dans "skipped".
+"""
+from grading.engine import competition_ranks, compute_term, load_snapshot, to_cents
+
+
+def apply_overrides(snap, term_id, scores=(), weights=(), coefficients=()):
+    """
+    Copie du snapshot avec les hypothèses appliquées (le snapshot d'origine
+    n'est pas modifié).
+      scores:       [{"enrollment_subject", "assessment", "value"}]
+                    ou [{"enrollment", "class_subject", "code", "value"}]; value=None -> note retirée
+      weights:      [{"atype": code, "weight"}]          (tous les CA de ce type)
+      coefficients: [{"class_subject", "coefficient"}]   (tous les élèves de la matière)
+    Retourne (snapshot simulé, skipped).
+    """
+    sim = dict(snap)
+    skipped = []
+
+    if scores:
+        es_by_id = {}
+        es_by_key = {}
+        for eid, rows in snap["es_by_enrollment"].items():
+            for r in rows:
+                es_by_id[r["id"]] = r
+                es_by_key[(eid, r["class_subject_id"])] = r
+        a_by_id = {}
+        a_by_key = {}
+        for (t_id, cs_id), lst in snap["assessments_by_tc"].items():
+            if t_id != term_id:
+                continue
+            for a in lst:
+                a_by_id[a["id"]] = cs_id
+                a_by_key[(cs_id, a["code"])] = a["id"]
+
+        sim["scores"] = dict(snap["scores"])
+        for o in scores:
+            if o.get("enrollment_subject"):
+                es = es_by_id.get(o["enrollment_subject"])
+                a_id = o.get("assessment")
+                if es is None or a_by_id.get(a_id) != es["class_subject_id"]:
+                    skipped.append({**o, "reason": "Score target not found in this class/term"})
+                    continue
+            else:
+                es = es_by_key.get((o.get("enrollment"), o.get("class_subject")))
+                a_id = a_by_key.get((o.get("class_subject"), o.get("code")))
+                if es is None or a_id is None:
+                    skipped.append({**o, "reason": "Score target not found in this class/term"})
+                    continue
+            key = (es["id"], a_id)
+            if o["value"] is None:
+                sim["scores"].pop(key, None)
+            else:
+                sim["scores"][key] = to_cents(o["value"])
+
+    if weights:
+        by_code = {o["atype"]: o["weight"] for o in weights}
+        seen = set()
+        assessments_by_tc = dict(snap["assessments_by_tc"])
+        for (t_id, cs_id), lst in snap["assessments_by_tc"].items():
+            if t_id != term_id:
+                continue
+            new = []
+            for a in lst:
+                if a["code"] in by_code:
+                    seen.add(a["code"])
+                    a = {**a, "weight": by_code[a["code"]], "w": to_cents(by_code[a["code"]])}
+                new.append(a)
+            assessments_by_tc[(t_id, cs_id)] = new
+        sim["assessments_by_tc"] = assessments_by_tc
+        skipped += [{"atype": code, "reason": "No assessment of this type in this class/term"}
+                    for code in by_code if code not in seen]
+
+    if coefficients:
+        by_cs = {o["class_subject"]: o["coefficient"] for o in coefficients}
+        skipped += [{"class_subject": cs_id, "reason": "Subject not taught in this class"}
+                    for cs_id in by_cs if cs_id not in snap["cs_by_id"]]
+        sim["es_by_enrollment"] = {
+            eid: [
+                {**r, "coef": by_cs[r["class_subject_id"]], "coef_c": to_cents(by_cs[r["class_subject_id"]])}
+                if r["class_subject_id"] in by_cs else r
+                for r in rows
+            ]
+            for eid, rows in snap["es_by_enrollment"].items()
+        }
+
+    return sim, skipped
+
+
+def simulate_class_term(classroom_id: int, term_id: int, scores=(), weights=(), coefficients=(), enrollment_id=None):
+    """
+    Recalcule en mémoire les résultats de la classe avec les hypothèses
+    données, à côté des résultats réels (baseline).
+    enrollment_id: détail par matière de cet élève en plus du classement.
+    """
+    snap = load_snapshot([classroom_id], [term_id])
+    sim, skipped = apply_overrides(snap, term_id, scores, weights, coefficients)
+
+    base = compute_term(snap, term_id)
+    new = compute_term(sim, term_id)
+    base_ranks, base_avg = competition_ranks({k: r["average"] for k, r in base.items()})
+    new_ranks, new_avg = competition_ranks({k: r["average"] for k, r in new.items()})
+
+    rows = []
+    for e in snap["enrollments"]:
+        rows.append({
+            "enrollment_id": e.id,
+            "student": {
+                "id": e.student.id,
+                "matricule": e.student.matricule,
+                "name": f"{e.student.last_name} {e.student.first_name}",
+            },
+            "average": float(new[e.id]["average"]),
+            "rank": new_ranks[e.id],
+            "baseline_average": float(base[e.id]["average"]),
+            "baseline_rank": base_ranks[e.id],
+            "delta": float(new[e.id]["average"] - base[e.id]["average"]),
+        })
+    rows.sort(key=lambda r: (r["rank"], r["student"]["name"]))
+
+    out = {
+        "classroom_id": classroom_id,
+        "term_id": term_id,
+        "count": len(rows),
+        "class_avg": float(new_avg),
+        "baseline_class_avg": float(base_avg),
+        "skipped": skipped,
+        "results": rows,
+    }
+    if enrollment_id is not None:
+        out["student"] = _student_detail(base.get(enrollment_id), new.get(enrollment_id))
+    return out
+
+
+def _student_detail(base, new):
+    if new is None:
+        return None
+    subjects = []
+    for b, s in zip(base["subjects"], new["subjects"]):
+        subject = s["class_subject"].subject
+        subjects.append({
+            "class_subject_id": s["class_subject"].id,
+            "subject_code": subject.code,
+            "subject_name": subject.name,
+            "coefficient": float(s["coef"]),
+            "ca": [
+                {"code": a["code"], "weight": float(a["weight"]),
+                 "value": float(a["value"]) if a["value"] is not None else None}
+                for a in s["ca"]
+            ],
+            "term_mark": float(s["mark"]) if s["included"] else None,
+            "baseline_term_mark": float(b["mark"]) if b["included"] else None,
+            "included_in_average": s["included"],
+        })
+    return {
+        "enrollment_id": new["enrollment"].id,
+        "subjects": subjects,
+        "sum_coefficients": float(new["coef_sum"]),
+        "weighted_total": float(new["weighted_sum"]),
+        "general_average": float(new["average"]),
+        "baseline_general_average": float(base["average"]),
+    }
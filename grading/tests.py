@@ -1,3 +1,516 @@
-from django.test import TestCase
+import random
+from decimal import Decimal, ROUND_HALF_UP
+from types import SimpleNamespace
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from assessments.models import AssessmentType
+from core.tests import fill_scores, make_classroom, set_score
+from grading import engine, jobs, vectorized
+from grading.engine import (
+    ANNUAL_TERM_WEIGHTS, class_term_results, compute_annual, compute_term, div_half_up, from_cents,
+    is_renormalised, load_snapshot, q2, to_cents,
+)
+from grading.models import SubjectTermResult, TermComputeJob, TermResult
+from grading.results import refresh_classes_term
+from grading.services import compute_class_term_preview, compute_student_term_preview
+from reports.services import compute_student_term
+
+D0 = Decimal("0")
+WEIGHTS = [Decimal(w) for w in ("50.00", "50.00", "33.33", "12.50", "40.00", "0.01", "99.99")]
+COEFS = [Decimal(c) for c in ("1.00", "2.00", "3.00", "1.50", "0.75", "4.00")]
+
+
+def make_snapshot(seed, level_code, n_students=12, n_subjects=6, n_terms=3, fill=0.8):
+    """Snapshot synthétique (même structure que engine.load_snapshot, sans base)."""
+    rnd = random.Random(seed)
+    classroom = SimpleNamespace(id=1, level=SimpleNamespace(code=level_code))
+    terms = {t: SimpleNamespace(id=t, index=t) for t in range(1, n_terms + 1)}
+    class_subjects = [SimpleNamespace(id=k, coefficient=rnd.choice(COEFS)) for k in range(1, n_subjects + 1)]
+    cs_by_id = {cs.id: cs for cs in class_subjects}
+
+    assessments_by_tc = {}
+    a_id = 0
+    for t in terms:
+        for cs in class_subjects:
+            lst = []
+            for code in ("CA1", "CA2", "CA3")[:rnd.randint(0, 3)]:
+                a_id += 1
+                weight = rnd.choice(WEIGHTS)
+                lst.append({"id": a_id, "atype_id": code, "code": code, "weight": weight, "w": to_cents(weight)})
+            assessments_by_tc[(t, cs.id)] = lst
+
+    enrollments = []
+    es_by_enrollment = {}
+    scores = {}
+    es_id = 0
+    for i in range(1, n_students + 1):
+        enrollments.append(SimpleNamespace(id=i, classroom_id=1))
+        rows = []
+        for cs in class_subjects:
+            if rnd.random() < 0.15:
+                continue  # matière non choisie
+            es_id += 1
+            override = rnd.choice(COEFS) if rnd.random() < 0.2 else None
+            coef = override or cs.coefficient
+            rows.append({"id": es_id, "enrollment_id": i, "class_subject_id": cs.id,
+                         "coef_override": override, "coef": coef, "coef_c": to_cents(coef)})
+            for (t, cs_id), lst in assessments_by_tc.items():
+                if cs_id != cs.id:
+                    continue
+                for a in lst:
+                    if rnd.random() < fill:
+                        scores[(es_id, a["id"])] = Decimal(rnd.randint(0, 10000)).scaleb(-2)
+        es_by_enrollment[i] = rows
+
+    return {
+        "classrooms": {1: classroom},
+        "terms": terms,
+        "enrollments": enrollments,
+        "class_subjects": class_subjects,
+        "cs_by_id": cs_by_id,
+        "es_by_enrollment": es_by_enrollment,
+        "assessments_by_tc": assessments_by_tc,
+        "scores": scores,
+    }
+
+
+def engine_snapshot(snap):
+    """Le moteur attend des notes en centièmes."""
+    return dict(snap, scores={k: to_cents(v) for k, v in snap["scores"].items()})
+
+
+# -------------------------
+#  Référence Decimal (calcul d'origine)
+# -------------------------
+
+def reference_mark(snap, r, term_id, renormalise):
+    acc = w_present = w_full = D0
+    for a in snap["assessments_by_tc"].get((term_id, r["class_subject_id"]), ()):
+        w = a["weight"]
+        w_full += w
+        v = snap["scores"].get((r["id"], a["id"]))
+        if v is None:
+            continue
+        acc += v * w
+        w_present += w
+    if renormalise:
+        return (acc / w_present) if w_present > D0 else None
+    return (acc / w_full) if w_full > D0 else D0
+
+
+def reference_term(snap, term_id):
+    out = {}
+    renormalise = is_renormalised(snap["classrooms"][1].level.code)
+    for e in snap["enrollments"]:
+        subjects, total, coef_sum = [], D0, D0
+        for r in snap["es_by_enrollment"][e.id]:
+            mark = reference_mark(snap, r, term_id, renormalise)
+            if mark is None:
+                subjects.append((None, None))
+                continue
+            total += mark * r["coef"]
+            coef_sum += r["coef"]
+            subjects.append((q2(mark), q2(mark * r["coef"])))
+        out[e.id] = {
+            "subjects": subjects,
+            "coef_sum": q2(coef_sum),
+            "weighted_sum": q2(total),
+            "average": q2(total / coef_sum) if coef_sum > D0 else q2(D0),
+        }
+    return out
+
+
+def reference_annual(snap):
+    out = {}
+    renormalise = is_renormalised(snap["classrooms"][1].level.code)
+    terms = sorted(snap["terms"].values(), key=lambda t: t.index)
+    for e in snap["enrollments"]:
+        subjects, total, coef_sum = [], D0, D0
+        for r in snap["es_by_enrollment"][e.id]:
+            marks, num, den = {}, D0, D0
+            for t in terms:
+                mark = reference_mark(snap, r, t.id, renormalise)
+                marks[t.index] = q2(mark) if mark is not None else None
+                if mark is None:
+                    continue
+                w_term = Decimal(ANNUAL_TERM_WEIGHTS.get(t.index, 1))
+                num += q2(mark) * w_term
+                den += w_term
+            annual = (num / den) if den > D0 else D0
+            total += annual * r["coef"]
+            coef_sum += r["coef"]
+            subjects.append((marks, q2(annual), q2(annual * r["coef"])))
+        out[e.id] = {
+            "subjects": subjects,
+            "coef_sum": q2(coef_sum),
+            "weighted_sum": q2(total),
+            "average": q2(total / coef_sum) if coef_sum > D0 else q2(D0),
+        }
+    return out
+
+
+class FixedPointTests(SimpleTestCase):
+    def test_div_half_up_matches_decimal_rounding(self):
+        for den in (1, 2, 3, 4, 7, 8, 10, 16, 40, 100, 400, 3333):
+            for num in range(-3 * den, 3 * den + 1):
+                expected = int((Decimal(num) / Decimal(den)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+                self.assertEqual(div_half_up(num, den), expected, (num, den))
+
+    def test_cents_round_trip(self):
+        for n in range(0, 10001, 7):
+            d = from_cents(n)
+            self.assertEqual(d, q2(d))
+            self.assertEqual(str(d), str(q2(Decimal(n) / 100)))
+            self.assertEqual(to_cents(d), n)
+        self.assertEqual(to_cents(Decimal("12.345")), 1235)
+        self.assertEqual(to_cents("2"), 200)
+
+    def test_half_cent_mark_rounds_up(self):
+        snap = make_snapshot(0, "F2", n_students=1, n_subjects=1, n_terms=1, fill=0)
+        r = snap["es_by_enrollment"][1][0]
+        snap["assessments_by_tc"][(1, r["class_subject_id"])] = [
+            {"id": 1, "atype_id": 1, "code": "CA1", "weight": Decimal("50.00"), "w": 5000},
+            {"id": 2, "atype_id": 2, "code": "CA2", "weight": Decimal("50.00"), "w": 5000},
+        ]
+        snap["scores"] = {(r["id"], 1): Decimal("12.34"), (r["id"], 2): Decimal("12.35")}
+        subject = compute_term(engine_snapshot(snap), 1)[1]["subjects"][0]
+        self.assertEqual(subject["mark"], Decimal("12.35"))
+        self.assertEqual(subject["ca"][1]["value"], Decimal("12.35"))
+
+
+class EngineParityTests(SimpleTestCase):
+    """Le moteur entier doit arrondir exactement comme le calcul Decimal d'origine."""
+
+    SEEDS = range(12)
+
+    def assertTermParity(self, snap):
+        eng = engine_snapshot(snap)
+        for term_id in snap["terms"]:
+            expected = reference_term(snap, term_id)
+            got = compute_term(eng, term_id)
+            for eid, ref in expected.items():
+                res = got[eid]
+                self.assertEqual([(s["mark"], s["weighted"]) for s in res["subjects"]], ref["subjects"])
+                self.assertEqual(res["coef_sum"], ref["coef_sum"])
+                self.assertEqual(res["weighted_sum"], ref["weighted_sum"])
+                self.assertEqual(res["average"], ref["average"])
+
+    def test_term_parity_f1_f4(self):
+        for seed in self.SEEDS:
+            self.assertTermParity(make_snapshot(seed, "F3"))
+
+    def test_term_parity_renormalised(self):
+        for seed in self.SEEDS:
+            self.assertTermParity(make_snapshot(seed, "F5", fill=0.5))
+
+    def test_annual_parity(self):
+        for seed in self.SEEDS:
+            for level in ("F1", "U6"):
+                snap = make_snapshot(seed, level, fill=0.6)
+                expected = reference_annual(snap)
+                got = compute_annual(engine_snapshot(snap))
+                for eid, ref in expected.items():
+                    res = got[eid]
+                    self.assertEqual([(s["terms"], s["annual"], s["weighted"]) for s in res["subjects"]],
+                                     ref["subjects"])
+                    self.assertEqual(res["coef_sum"], ref["coef_sum"])
+                    self.assertEqual(res["weighted_sum"], ref["weighted_sum"])
+                    self.assertEqual(res["average"], ref["average"])
+
+
+@skipUnless(vectorized.available(), "numpy n'est pas installé")
+class VectorizedParityTests(SimpleTestCase):
+    """Le backend NumPy doit donner exactement les résultats du moteur Python."""
+
+    SEEDS = range(12)
+
+    def test_term(self):
+        for seed in self.SEEDS:
+            for level, fill in (("F3", 0.8), ("F5", 0.5), ("U6", 0.1)):
+                snap = engine_snapshot(make_snapshot(seed, level, fill=fill))
+                for term_id in snap["terms"]:
+                    expected = compute_term(snap, term_id)
+                    got = vectorized.compute_term(snap, term_id)
+                    for eid, ref in expected.items():
+                        res = got[eid]
+                        self.assertEqual(
+                            [(s["enrollment_subject_id"], s["mark"], s["weighted"], s["included"],
+                              s["filled"], s["expected"]) for s in res["subjects"]],
+                            [(s["enrollment_subject_id"], s["mark"], s["weighted"], s["included"],
+                              s["filled"], s["expected"]) for s in ref["subjects"]], (seed, level))
+                        self.assertEqual((res["coef_sum"], res["weighted_sum"], res["average"]),
+                                         (ref["coef_sum"], ref["weighted_sum"], ref["average"]), (seed, level))
+
+    def test_annual_averages(self):
+        for seed in self.SEEDS:
+            for level in ("F1", "U6"):
+                snap = engine_snapshot(make_snapshot(seed, level, fill=0.6))
+                self.assertEqual(vectorized.compute_annual_averages(snap), engine.compute_annual_averages(snap))
+
+    def test_half_cent_average_rounds_up(self):
+        snap = engine_snapshot(make_snapshot(0, "F5", n_students=1, n_subjects=2, n_terms=1, fill=0))
+        rows = snap["es_by_enrollment"][1]
+        for r, coef in zip(rows, (100, 100)):
+            r["coef_c"] = coef
+            snap["assessments_by_tc"][(1, r["class_subject_id"])] = [
+                {"id": r["id"], "atype_id": 1, "code": "CA1", "weight": Decimal("50.00"), "w": 5000}]
+        # (12.34 + 12.35) / 2 = 12.345 -> 12.35
+        snap["scores"] = {(rows[0]["id"], rows[0]["id"]): 1234, (rows[1]["id"], rows[1]["id"]): 1235}
+        self.assertEqual(vectorized.compute_term(snap, 1)[1]["average"], Decimal("12.35"))
+        self.assertEqual(compute_term(snap, 1)[1]["average"], Decimal("12.35"))
+
+    def test_group_ranks(self):
+        rnd = random.Random(7)
+        averages = {k: Decimal(rnd.choice((1000, 1250, 1250, 1500, 999, 2000))).scaleb(-2) for k in range(60)}
+        groups = {k: k % 4 for k in averages}
+        self.assertEqual(vectorized.group_ranks(averages, groups), engine.group_ranks(averages, groups))
+        self.assertEqual(vectorized.group_ranks({}, {}), ({}, {}))
+
+
+@skipUnless(vectorized.available(), "numpy n'est pas installé")
+class BulkBackendTests(TestCase):
+    """refresh_classes_term enregistre les mêmes résultats avec les deux backends."""
+
+    def stored(self):
+        return (sorted(TermResult.objects.values_list("enrollment_id", "coef_sum", "weighted_sum", "average",
+                                                      "rank", "scores_filled", "scores_expected")),
+                sorted(SubjectTermResult.objects.values_list("enrollment_subject_id", "mark", "included")))
+
+    def test_refresh_classes_term(self):
+        schools = [make_classroom(name=f"F{level}X", level=f"F{level}", students=6) for level in (3, 5)]
+        for n, school in enumerate(schools):
+            fill_scores(school, base=20 + n)
+            set_score(school, 0, "ENG", "CA1", 55)
+        classroom_ids = [school.classroom.id for school in schools]
+        term_id = schools[0].terms[0].id
+
+        with override_settings(GRADING_BACKEND="python"):
+            self.assertIs(engine.bulk_backend(), engine)
+            expected_summary = refresh_classes_term(classroom_ids, term_id)
+        expected = self.stored()
+        TermResult.objects.all().delete()
+        SubjectTermResult.objects.all().delete()
+
+        self.assertIs(engine.bulk_backend(), vectorized)
+        self.assertEqual(refresh_classes_term(classroom_ids, term_id), expected_summary)
+        self.assertEqual(self.stored(), expected)
+
+
+class SnapshotQueryTests(TestCase):
+    """Le nombre de requêtes ne dépend pas de la taille de la classe."""
+
+    def assertQueriesPerClass(self, students, func):
+        school = make_classroom(name=f"F5-{students}", students=students)
+        fill_scores(school)
+        with self.assertNumQueries(7):
+            func(school)
+
+    def test_load_snapshot(self):
+        for students in (1, 25):
+            self.assertQueriesPerClass(students, lambda school: load_snapshot(
+                [school.classroom.id], [t.id for t in school.terms]))
+
+    def test_class_term_results(self):
+        for students in (1, 25):
+            self.assertQueriesPerClass(students, lambda school: class_term_results(
+                school.classroom.id, school.terms[0].id))
+
+
+PARITY_SUBJECTS = (("MATH", "4.00"), ("ENG", "3.00"), ("PHYS", "2.00"))
+PARITY_SCORES = [  # (CA1, CA2) par matière
+    {"MATH": ("14", "16"), "ENG": ("11", "12"), "PHYS": ("9", "13")},
+    {"MATH": ("15", None), "ENG": ("7", "18"), "PHYS": (None, None)},
+    {"MATH": ("8.5", "10.25"), "ENG": (None, "13"), "PHYS": ("20", "19")},
+]
+# Valeurs relevées avec le calcul d'origine (grading.services / reports.services
+# avant le moteur partagé), par élève: notes matières, coef_sum, weighted_sum, moyenne, rang.
+PARITY_EXPECTED = {
+    "F3": [
+        ({"MATH": 15.0, "ENG": 11.5, "PHYS": 11.0}, 9.0, 116.5, 12.94, 1),
+        ({"MATH": 7.5, "ENG": 12.5, "PHYS": 0.0}, 9.0, 67.5, 7.5, 3),
+        # la preview d'origine sommait les pondérés arrondis (96.02), le bulletin non (96.0)
+        ({"MATH": 9.38, "ENG": 6.5, "PHYS": 19.5}, 9.0, 96.0, 10.67, 2),
+    ],
+    "F5": [
+        ({"MATH": 15.0, "ENG": 11.5, "PHYS": 11.0}, 9.0, 116.5, 12.94, 2),
+        # PHYS sans note exclue (comme la preview d'origine; le bulletin comptait 0: 9.0 / 10.83)
+        ({"MATH": 15.0, "ENG": 12.5}, 7.0, 97.5, 13.93, 1),
+        # preview d'origine: 115.52 / 12.84 (pondérés arrondis), bulletin: 115.5 / 12.83
+        ({"MATH": 9.38, "ENG": 13.0, "PHYS": 19.5}, 9.0, 115.5, 12.83, 3),
+    ],
+}
+
+
+class BaselineParityTests(TestCase):
+    """Preview et bulletin passent par le moteur et redonnent les valeurs du calcul d'origine."""
+
+    def make(self, level):
+        school = make_classroom(name=f"{level}P", level=level, subjects=PARITY_SUBJECTS, students=3)
+        for i, marks in enumerate(PARITY_SCORES):
+            for code, values in marks.items():
+                for atype, value in zip(("CA1", "CA2"), values):
+                    if value is not None:
+                        set_score(school, i, code, atype, value)
+        return school
+
+    def assertParity(self, level):
+        school = self.make(level)
+        term_id = school.terms[0].id
+        for e, (marks, coef_sum, weighted_sum, average, rank) in zip(school.enrollments, PARITY_EXPECTED[level]):
+            preview = compute_student_term_preview(e.id, term_id)
+            self.assertEqual({d["subject_code"]: d["term_mark"] for d in preview["subjects"]
+                              if d["included_in_average"]}, marks)
+            self.assertEqual((preview["sum_coefficients"], preview["weighted_total"], preview["general_average"]),
+                             (coef_sum, weighted_sum, average))
+
+            report = compute_student_term(e.id, term_id)
+            self.assertEqual({line["code"]: line["mark"] for line in report["lines"] if line["mark"] != ""}, marks)
+            self.assertEqual(report["totals"], {"coef_sum": coef_sum, "weighted_sum": weighted_sum, "average": average})
+            self.assertEqual(report["class_stats"]["rank"], rank)
+
+    def test_f1_f4(self):
+        self.assertParity("F3")
+
+    def test_renormalised(self):
+        self.assertParity("F5")
+
+
+def count_queries(func):
+    func()  # tables compilées, résultats matérialisés
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+    return len(ctx.captured_queries)
+
+
+class ClassPreviewQueryTests(TestCase):
+    def assertInvariant(self, **kwargs):
+        counts = []
+        for students in (1, 25):
+            school = make_classroom(name=f"F5-{students}", students=students)
+            fill_scores(school)
+            counts.append(count_queries(lambda: compute_class_term_preview(
+                school.classroom.id, school.terms[0].id, **kwargs)))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_compact_preview(self):
+        self.assertInvariant()
+
+    def test_detailed_preview(self):
+        self.assertInvariant(with_details=True)
+
+
+@override_settings(GRADING_WORKERS=1)
+class TermResultRefreshTests(TransactionTestCase):
+    """Recalcul des résultats matérialisés par les signaux (au commit: pas de TestCase)."""
+    serialized_rollback = True
+
+    def setUp(self):
+        self.school = make_classroom(students=2)
+
+    def result(self, student, term=1):
+        return TermResult.objects.get(enrollment=self.school.enrollments[student], term=self.school.terms[term - 1])
+
+    def queued(self):
+        return sorted((j.term.index, j.classrooms) for j in TermComputeJob.objects.select_related("term"))
+
+    def test_score_write_refreshes_class_inline(self):
+        set_score(self.school, 0, "MATH", "CA1", 12)
+        self.assertEqual((self.result(0).average, self.result(0).rank), (Decimal("12.00"), 1))
+        set_score(self.school, 1, "MATH", "CA1", 16)
+        # le rang de l'élève 0 change aussi: toute la classe est recalculée
+        self.assertEqual((self.result(0).rank, self.result(1).rank), (2, 1))
+        self.assertEqual(self.queued(), [])
+
+    def test_score_delete_refreshes(self):
+        set_score(self.school, 0, "MATH", "CA1", 12)
+        score = set_score(self.school, 1, "MATH", "CA1", 16)
+        score.delete()
+        self.assertEqual(self.result(1).average, Decimal("0.00"))
+        self.assertEqual(self.result(0).rank, 1)
+
+    def test_assessment_writes_refresh(self):
+        set_score(self.school, 0, "MATH", "CA1", 10)
+        set_score(self.school, 0, "MATH", "CA2", 20)
+        self.assertEqual(self.result(0).average, Decimal("15.00"))
+        self.school.assessments[(1, "MATH", "CA2")].delete()
+        self.assertEqual(self.result(0).average, Decimal("10.00"))
+        self.assertEqual(self.result(0).scores_expected, 3)
+
+    def test_atype_weight_change_is_queued(self):
+        other = make_classroom(name="F5B", students=1)
+        set_score(self.school, 0, "MATH", "CA1", 10)
+        set_score(self.school, 0, "MATH", "CA2", 20)
+        atype = AssessmentType.objects.get(code="CA1")
+        atype.weight = 25
+        atype.save()
+        both = sorted([self.school.classroom.id, other.classroom.id])
+        self.assertEqual(self.queued(), [(1, both), (2, both), (3, both)])
+        self.assertEqual(self.result(0).average, Decimal("15.00"))  # pas recalculé dans la requête
+
+        while (job := jobs.claim_next("test")) is not None:
+            self.assertEqual(jobs.run_job(job).status, TermComputeJob.Status.DONE)
+        self.assertEqual(self.result(0).average, Decimal("16.67"))  # (25×10 + 50×20) / 75
+
+    def test_classroom_move_is_queued(self):
+        other = make_classroom(name="F5B", students=1)
+        set_score(self.school, 0, "MATH", "CA1", 12)
+        enrollment = self.school.enrollments[0]
+        enrollment.classroom = other.classroom
+        enrollment.save()
+        both = sorted([self.school.classroom.id, other.classroom.id])
+        self.assertEqual(self.queued(), [(1, both), (2, both), (3, both)])
+
+    @override_settings(GRADING_INLINE_REFRESH_CLASSROOMS=2)
+    def test_inline_limit_is_configurable(self):
+        other = make_classroom(name="F5B", students=1)
+        enrollment = self.school.enrollments[0]
+        enrollment.classroom = other.classroom
+        enrollment.save()
+        self.assertEqual(self.queued(), [])
+        self.assertEqual(TermResult.objects.filter(enrollment=enrollment).count(), 3)
+
+
+@override_settings(GRADING_WORKERS=1)
+class TermComputeJobTests(TestCase):
+    def setUp(self):
+        self.school = make_classroom(students=2)
+        fill_scores(self.school)
+        self.term = self.school.terms[0]
+
+    def test_claim_in_order_once(self):
+        first = jobs.enqueue(self.term.id)
+        second = jobs.enqueue(self.term.id, [self.school.classroom.id])
+        claimed = jobs.claim_next("w1")
+        self.assertEqual((claimed.id, claimed.status, claimed.worker), (first.id, TermComputeJob.Status.RUNNING, "w1"))
+        self.assertEqual(jobs.claim_next("w2").id, second.id)
+        self.assertIsNone(jobs.claim_next("w3"))
+
+    def test_run_job_stores_results(self):
+        jobs.enqueue(self.term.id)
+        job = jobs.run_job(jobs.claim_next("w1"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.done, job.students), (TermComputeJob.Status.DONE, 1, 1, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(TermResult.objects.filter(term=self.term).count(), 2)
+
+    def test_failure_is_recorded(self):
+        jobs.enqueue(self.term.id)
+        with mock.patch.object(jobs, "compute_term_all", side_effect=RuntimeError("boom")):
+            job = jobs.run_job(jobs.claim_next("w1"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, TermComputeJob.Status.FAILED)
+        self.assertIn("RuntimeError: boom", job.error)
+
+    def test_requeue_stale(self):
+        jobs.enqueue(self.term.id)
+        job = jobs.claim_next("w1")
+        self.assertEqual(jobs.requeue_stale(minutes=5), 0)
+        TermComputeJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(jobs.requeue_stale(minutes=5), 1)
+        self.assertEqual(jobs.claim_next("w2").id, job.id)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import TermResultsView, LevelRankingView, SimulationView
+
+urlpatterns = [
+    path("grading/terms/<int:term_id>/results/", TermResultsView.as_view()),
+    path("grading/rankings/level/", LevelRankingView.as_view()),
+    path("grading/simulate/", SimulationView.as_view()),
+]
@@ -0,0 +1,240 @@
+"""
+Backend NumPy du moteur (grading.engine) pour les calculs de masse: classes
+recalculées ensemble (grading.results.refresh_classes_term, donc
+grading.parallel.compute_term_all) et classements de niveau
+(grading.ranking.level_ranking).
+
+Le snapshot est converti en tableaux, une ligne par EnrollmentSubject:
+  - V[ligne, j]  note en centièmes de la j-ième épreuve de la matière (int64),
+                 P masque de présence, A masque "épreuve prévue"
+  - W[ligne, j]  poids en centièmes, coef[ligne] coefficient en centièmes
+puis notes matières (fractions entières num/den, arrondi ROUND_HALF_UP en
+entiers), renormalisation F5+, moyennes et rangs sont calculés par
+opérations sur tableaux. Seule la somme des pondérés d'un élève passe en
+flottant; les cas à moins de HALF_EPS d'une demi-unité sont recalculés
+exactement (comme grading.engine), d'où des résultats identiques au centime.
+
+Mêmes fonctions que le moteur Python: compute_term (sans le détail "ca"
+des épreuves), compute_annual_averages, group_ranks. Choix du backend:
+grading.engine.bulk_backend().
+"""
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # dépendance optionnelle: le moteur Python est utilisé
+    np = None
+
+from grading.engine import (
+    ANNUAL_TERM_WEIGHTS, SCALE, _weighted_total, div_half_up, from_cents, is_renormalised, to_cents,
+)
+
+HALF_EPS = 1e-6
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _half_up(num, den):
+    """div_half_up élément par élément (num >= 0, den > 0, entiers)."""
+    return (2 * num + den) // (2 * den)
+
+
+def build_rows(snap):
+    """Lignes EnrollmentSubject du snapshot (ordre du moteur) et leurs attributs."""
+    es_rows, row_e, renorm = [], [], []
+    for i, e in enumerate(snap["enrollments"]):
+        renormalise = is_renormalised(snap["classrooms"][e.classroom_id].level.code)
+        for r in snap["es_by_enrollment"].get(e.id, ()):
+            es_rows.append(r)
+            row_e.append(i)
+            renorm.append(renormalise)
+    return {
+        "es_rows": es_rows,
+        "row_e": np.array(row_e, dtype=np.int64),
+        "R": np.array(renorm, dtype=bool),
+        "coef": np.array([r["coef_c"] for r in es_rows], dtype=np.int64),
+        "row_of_es": {r["id"]: n for n, r in enumerate(es_rows)},
+    }
+
+
+def term_matrices(snap, rows, term_id):
+    """Matrices V/P/A/W des épreuves du trimestre `term_id` (une colonne par épreuve de la matière)."""
+    es_rows = rows["es_rows"]
+    tc = snap["assessments_by_tc"]
+    width = max((len(tc.get((term_id, r["class_subject_id"]), ())) for r in es_rows), default=0)
+    n = len(es_rows)
+    V = np.zeros((n, width), dtype=np.int64)
+    P = np.zeros((n, width), dtype=bool)
+    A = np.zeros((n, width), dtype=bool)
+    W = np.zeros((n, width), dtype=np.int64)
+
+    col_of_a = {}
+    for (t_id, cs_id), lst in tc.items():
+        if t_id == term_id:
+            for j, a in enumerate(lst):
+                col_of_a[a["id"]] = j
+    rows_by_cs = defaultdict(list)
+    for k, r in enumerate(es_rows):
+        rows_by_cs[r["class_subject_id"]].append(k)
+    for cs_id, ks in rows_by_cs.items():
+        lst = tc.get((term_id, cs_id), ())
+        if lst:
+            A[ks, :len(lst)] = True
+            W[ks, :len(lst)] = [a["w"] for a in lst]
+
+    row_of_es = rows["row_of_es"]
+    for (es_id, a_id), v in snap["scores"].items():
+        j = col_of_a.get(a_id)
+        k = row_of_es.get(es_id)
+        if j is not None and k is not None:
+            V[k, j] = v
+            P[k, j] = True
+    return V, P, A, W
+
+
+def subject_ratios(rows, V, P, W):
+    """
+    Équivalent vectorisé de grading.engine.subject_term_ratio: (num, den,
+    included) par ligne; note en centièmes = num / den.
+    """
+    num = (V * W * P).sum(axis=1)
+    w_present = (W * P).sum(axis=1)
+    w_full = W.sum(axis=1)
+    R = rows["R"]
+    included = ~R | (w_present > 0)
+    den = np.where(R, w_present, w_full)
+    # F1–F4 sans épreuve prévue: (0, 1); F5+ sans note: exclue (den arbitraire)
+    den = np.where(den > 0, den, 1)
+    return np.where(included, num, 0), den, included
+
+
+def _totals(snap, rows, num, den, coef):
+    """
+    (coef_sum, weighted_sum, average) en centièmes par élève, à partir des
+    fractions num/den et des coefficients des lignes prises en compte (coef = 0 sinon).
+    """
+    n_e = len(snap["enrollments"])
+    row_e = rows["row_e"]
+    coef_sum = np.zeros(n_e, dtype=np.int64)
+    np.add.at(coef_sum, row_e, coef)
+    weighted = np.zeros(n_e, dtype=np.float64)  # centièmes²
+    np.add.at(weighted, row_e, num / den * coef)
+
+    weighted_sum = np.floor(weighted / SCALE + 0.5).astype(np.int64)
+    safe = np.where(coef_sum > 0, coef_sum, 1)
+    average = np.where(coef_sum > 0, np.floor(weighted / safe + 0.5), 0).astype(np.int64)
+
+    near = (np.abs(weighted / SCALE % 1 - 0.5) < HALF_EPS) | (np.abs(weighted / safe % 1 - 0.5) < HALF_EPS)
+    if near.any():
+        # près d'une demi-unité: somme exacte en fractions entières (grading.engine)
+        parts = defaultdict(list)
+        for k in np.nonzero(near[row_e] & (coef > 0))[0]:
+            parts[row_e[k]].append((int(num[k]), int(den[k]), int(coef[k])))
+        for i in np.nonzero(near)[0]:
+            Wt, L = _weighted_total(parts.get(i, []))
+            weighted_sum[i] = div_half_up(Wt, L * SCALE)
+            average[i] = div_half_up(Wt, L * int(coef_sum[i])) if coef_sum[i] else 0
+    return coef_sum, weighted_sum, average
+
+
+def _term_ratios(snap, rows, term_id):
+    V, P, A, W = term_matrices(snap, rows, term_id)
+    return subject_ratios(rows, V, P, W) + (P & A, A)
+
+
+def compute_term(snap, term_id):
+    """
+    Même résultat que grading.engine.compute_term, sans la liste "ca" des
+    matières (seulement "filled"/"expected"): c'est ce qu'enregistre
+    grading.results.store_class_term.
+    """
+    rows = build_rows(snap)
+    num, den, included, present, planned = _term_ratios(snap, rows, term_id)
+    coef = np.where(included, rows["coef"], 0)
+    mark = _half_up(num, den)
+    weighted = _half_up(num * coef, den * SCALE)
+    filled = present.sum(axis=1)
+    expected = planned.sum(axis=1)
+    coef_sum, weighted_sum, average = _totals(snap, rows, num, den, coef)
+
+    cs_by_id = snap["cs_by_id"]
+    subjects = defaultdict(list)
+    for k, r in enumerate(rows["es_rows"]):
+        inc = bool(included[k])
+        subjects[int(rows["row_e"][k])].append({
+            "enrollment_subject_id": r["id"],
+            "class_subject": cs_by_id[r["class_subject_id"]],
+            "coef": r["coef"],
+            "mark": from_cents(int(mark[k])) if inc else None,
+            "weighted": from_cents(int(weighted[k])) if inc else None,
+            "included": inc,
+            "filled": int(filled[k]),
+            "expected": int(expected[k]),
+        })
+
+    return {
+        e.id: {
+            "enrollment": e,
+            "classroom_id": e.classroom_id,
+            "subjects": subjects[i],
+            "coef_sum": from_cents(int(coef_sum[i])),
+            "weighted_sum": from_cents(int(weighted_sum[i])),
+            "average": from_cents(int(average[i])),
+        }
+        for i, e in enumerate(snap["enrollments"])
+    }
+
+
+def compute_annual_averages(snap):
+    """Même résultat que grading.engine.compute_annual_averages: {enrollment_id: moyenne annuelle}."""
+    rows = build_rows(snap)
+    annual_num = np.zeros(len(rows["es_rows"]), dtype=np.int64)
+    annual_den = np.zeros(len(rows["es_rows"]), dtype=np.int64)
+    for t in snap["terms"].values():
+        w_term = int(ANNUAL_TERM_WEIGHTS.get(t.index, 1))
+        num, den, included, _, _ = _term_ratios(snap, rows, t.id)
+        # note trimestrielle arrondie, trimestre ignoré si la matière est exclue (F5+)
+        annual_num += np.where(included, _half_up(num, den) * w_term, 0)
+        annual_den += np.where(included, w_term, 0)
+    # matière sans aucun trimestre: 0 (comptée dans la moyenne annuelle)
+    annual_den = np.where(annual_den > 0, annual_den, 1)
+    _, _, average = _totals(snap, rows, annual_num, annual_den, rows["coef"])
+    return {e.id: from_cents(int(average[i])) for i, e in enumerate(snap["enrollments"])}
+
+
+def competition_ranks_by_group(values, groups):
+    """
+    Rangs 'standard competition' (1,1,3) par groupe, par tri.
+    values: moyennes en centièmes (entiers); groups: identifiant de groupe (ex: classe).
+    """
+    values = np.asarray(values, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    n = len(values)
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((-values, groups))
+    v, g = values[order], groups[order]
+    pos = np.arange(n)
+    group_start = np.r_[True, g[1:] != g[:-1]]
+    run_start = group_start | np.r_[True, v[1:] != v[:-1]]
+    first_of_group = np.maximum.accumulate(np.where(group_start, pos, 0))
+    first_of_run = np.maximum.accumulate(np.where(run_start, pos, 0))
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = first_of_run - first_of_group + 1
+    return ranks
+
+
+def group_ranks(averages, group_of):
+    """Même résultat que grading.engine.group_ranks: (rank_map, {groupe: moyenne des moyennes})."""
+    keys = list(averages)
+    values = np.array([to_cents(averages[k]) for k in keys], dtype=np.int64)
+    groups = np.array([group_of[k] for k in keys], dtype=np.int64)
+    ranks = competition_ranks_by_group(values, groups)
+    ids, inverse, counts = np.unique(groups, return_inverse=True, return_counts=True)
+    sums = np.zeros(len(ids), dtype=np.int64)
+    np.add.at(sums, inverse, values)
+    means = _half_up(sums, counts)
+    return ({k: int(r) for k, r in zip(keys, ranks)},
+            {int(g): from_cents(int(m)) for g, m in zip(ids, means)})
@@ -1,3 +1,176 @@
-from django.shortcuts import render
+from django.db.models import Count, Max, Q
+from rest_framework import permissions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from core.models import Classroom, Level, Term
+from enrollments.models import Enrollment
+from grading.jobs import enqueue
+from grading.models import TermComputeJob, TermResult
+from grading.ranking import level_ranking
+from grading.serializers import SimulationSerializer
+from grading.simulation import simulate_class_term
+
+
+class IsResultsManager(permissions.BasePermission):
+    """Lecture: tout utilisateur authentifié; calcul: REGISTRAR/PRINCIPAL/ADMIN."""
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated): return False
+        return getattr(user, "role", None) in ("REGISTRAR","ADMIN","PRINCIPAL") or request.method in permissions.SAFE_METHODS
+
+
+def _job_status(job):
+    return {
+        "id": job.id,
+        "status": job.status,
+        "classrooms": job.classrooms,
+        "total": job.total,
+        "done": job.done,
+        "students": job.students,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "error": job.error.strip().splitlines()[-1] if job.error else "",
+    }
+
+
+class TermResultsView(APIView):
+    """
+    GET  -> avancement: résultats enregistrés / inscriptions actives, par classe,
+            et dernier job de calcul
+    POST -> met en file le calcul de toutes les classes de l'année du trimestre
+            (202; traité par manage.py run_grading_jobs, processus parallèles)
+            body optionnel: {"classrooms": [ids], "workers": n}
+    """
+    permission_classes = [IsResultsManager]
+
+    def get(self, request, term_id: int):
+        term = Term.objects.filter(id=term_id).first()
+        if term is None:
+            return Response({"detail": "term not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        classes = (Classroom.objects
+                   .filter(year_id=term.year_id)
+                   .annotate(active=Count("enrollments", filter=Q(enrollments__active=True)))
+                   .values("id", "name", "active"))
+        stored = {
+            r["classroom_id"]: r for r in
+            TermResult.objects.filter(term_id=term.id, enrollment__active=True)
+            .values("classroom_id").annotate(n=Count("id"), updated_at=Max("updated_at"))
+        }
+        rows = []
+        for c in classes:
+            s = stored.get(c["id"], {})
+            rows.append({
+                "classroom_id": c["id"],
+                "classroom": c["name"],
+                "expected": c["active"],
+                "computed": s.get("n", 0),
+                "updated_at": s.get("updated_at"),
+            })
+        done = sum(1 for r in rows if r["expected"] and r["computed"] >= r["expected"])
+        job = TermComputeJob.objects.filter(term_id=term.id).first()
+        return Response({
+            "term": {"id": term.id, "index": term.index},
+            "classrooms": len(rows),
+            "done": done,
+            "job": _job_status(job) if job else None,
+            "results": rows,
+        })
+
+    def post(self, request, term_id: int):
+        if not Term.objects.filter(id=term_id).exists():
+            return Response({"detail": "term not found"}, status=status.HTTP_404_NOT_FOUND)
+        classroom_ids = request.data.get("classrooms") or None
+        workers = request.data.get("workers")
+        try:
+            classroom_ids = [int(c) for c in classroom_ids] if classroom_ids else None
+            workers = int(workers) if workers else None
+        except (TypeError, ValueError):
+            return Response({"detail": "classrooms must be a list of ids and workers an integer"}, status=400)
+
+        job = enqueue(term_id, classroom_ids, workers, user=request.user)
+        return Response(_job_status(job), status=status.HTTP_202_ACCEPTED)
+
+
+class LevelRankingView(APIView):
+    """
+    Classement de toutes les classes parallèles d'un niveau.
+    GET ?year=<id>&level=<id>[&stream=<id>][&term=<id>]  (sans term: classement annuel)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        year_id = request.query_params.get("year")
+        level_id = request.query_params.get("level")
+        if not year_id or not level_id:
+            return Response({"detail": "year and level are required"}, status=status.HTTP_400_BAD_REQUEST)
+        stream_id = request.query_params.get("stream") or None
+        term_id = request.query_params.get("term") or None
+        try:
+            year_id, level_id = int(year_id), int(level_id)
+            stream_id = int(stream_id) if stream_id else None
+            term_id = int(term_id) if term_id else None
+        except ValueError:
+            return Response({"detail": "year, level, stream and term must be ids"}, status=400)
+
+        level = Level.objects.filter(id=level_id).first()
+        if level is None:
+            return Response({"detail": "level not found"}, status=status.HTTP_404_NOT_FOUND)
+        term = None
+        if term_id:
+            term = Term.objects.filter(id=term_id, year_id=year_id).first()
+            if term is None:
+                return Response({"detail": "term not found for this year"}, status=status.HTTP_404_NOT_FOUND)
+
+        ranking = level_ranking(year_id, level_id, term_id, stream_id)
+
+        enrollments = {
+            e.id: e for e in Enrollment.objects
+            .filter(id__in=ranking["ranks"].keys())
+            .select_related("student", "classroom")
+        }
+        rows = []
+        for eid, rank in sorted(ranking["ranks"].items(), key=lambda kv: (kv[1], kv[0])):
+            e = enrollments[eid]
+            rows.append({
+                "rank": rank,
+                "enrollment_id": eid,
+                "matricule": e.student.matricule,
+                "student_name": f"{e.student.last_name} {e.student.first_name}",
+                "classroom": {"id": e.classroom_id, "name": e.classroom.name},
+                "average": ranking["averages"][eid],
+            })
+
+        return Response({
+            "year_id": year_id,
+            "level": {"id": level.id, "code": level.code, "name": level.name},
+            "stream_id": stream_id,
+            "term": {"id": term.id, "index": term.index} if term else None,
+            "count": ranking["count"],
+            "level_avg": ranking["level_avg"],
+            "results": rows,
+        })
+
+
+class SimulationView(APIView):
+    """Simulation "et si ?" des résultats d'un trimestre (calcul en mémoire, aucune écriture)."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        ser = SimulationSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+        if not Classroom.objects.filter(id=data["classroom"], year__terms=data["term"]).exists():
+            return Response({"detail": "classroom/term not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        result = simulate_class_term(
+            data["classroom"], data["term"],
+            scores=data.get("scores", ()),
+            weights=data.get("weights", ()),
+            coefficients=data.get("coefficients", ()),
+            enrollment_id=data.get("enrollment"),
+        )
+        return Response(result)
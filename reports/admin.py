@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ReportToken, AnnualReportToken
+from .models import ReportToken, AnnualReportToken, ReportJob
 # Register your models here.
 
 @admin.register(ReportToken)
@@ -12,4 +12,10 @@ class ReportTokenAdmin(admin.ModelAdmin):
 class AnnualReportTokenAdmin(admin.ModelAdmin):
     list_display = ("uid","enrollment","year_label","created_at","valid")
     list_filter  = ("valid",)
-    search_fields = ("enrollment__student__matricule","enrollment__student__last_name","enrollment__student__first_name")
\ No newline at end of file
+    search_fields = ("enrollment__student__matricule","enrollment__student__last_name","enrollment__student__first_name")
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("id","kind","classroom","term","status","done","total","created_by","created_at","finished_at")
+    list_filter  = ("status","kind")
+    readonly_fields = ("error",)
@@ -0,0 +1,111 @@
+"""
+Préparation et rendu des bulletins d'une classe, partagés par les vues
+(téléchargement direct en flux) et les jobs en arrière-plan (reports.jobs).
+
+Les tokens sont construits en mémoire (uid uuid4 généré d'avance, URL de
+vérification connue avant le rendu) puis enregistrés avec leur sha1 en un
+seul bulk_create à la fin du lot, au lieu d'un INSERT + un UPDATE par élève.
+"""
+import uuid
+
+from django.db import transaction
+from django.urls import reverse
+
+from enrollments.models import Enrollment
+from . import qr
+from .models import ReportToken, AnnualReportToken
+from .rendering import render_many
+from .services import compute_class_term, compute_class_annual, render_combined_pdf, sha1_bytes
+
+
+def term_batch(classroom_id: int, term_id: int, absolute_url):
+    """
+    Payloads + tokens des bulletins trimestriels de la classe (élèves actifs).
+    absolute_url: callable(path) -> URL absolue (pour le QR de vérification).
+    Retourne [(payload, token, verify_url)]; les tokens ne sont pas encore
+    enregistrés (voir save_tokens).
+    """
+    enrollments = list(Enrollment.objects.filter(classroom_id=classroom_id, active=True).select_related("student"))
+    if not enrollments:
+        return []
+    # contexte de classe calculé une fois pour tous les élèves
+    payloads = compute_class_term(classroom_id, term_id)["payloads"]
+    items = []
+    for e in enrollments:
+        payload = payloads[e.id]
+        token = ReportToken(uid=uuid.uuid4(), enrollment=e, term_id=term_id, payload=payload)
+        items.append((payload, token, absolute_url(reverse("report-verify", args=[str(token.uid)]))))
+    return items
+
+
+def annual_batch(classroom_id: int, absolute_url):
+    """Comme term_batch, pour les bulletins annuels (une seule passe pour la classe)."""
+    enrollments = list(Enrollment.objects.filter(classroom_id=classroom_id, active=True).select_related("student"))
+    if not enrollments:
+        return []
+    payloads = compute_class_annual(classroom_id)["payloads"]
+    items = []
+    for e in enrollments:
+        p = payloads[e.id]
+        token = AnnualReportToken(uid=uuid.uuid4(), enrollment=e, year_label=p["classroom"]["year"], payload=p)
+        items.append((p, token, absolute_url(reverse("report-verify-annual", args=[str(token.uid)]))))
+    return items
+
+
+def save_tokens(tokens):
+    """Enregistre les tokens d'un lot (avec leur pdf_sha1) en une requête."""
+    tokens = list(tokens)
+    if tokens:
+        with transaction.atomic():
+            type(tokens[0]).objects.bulk_create(tokens, batch_size=500)
+
+
+def report_filename(kind: str, payload: dict) -> str:
+    if kind == "annual":
+        return f"{payload['student']['matricule']}_{payload['classroom']['name']}_ANNUAL.pdf"
+    return f"{payload['student']['matricule']}_{payload['classroom']['name']}_T{payload['term']['index']}.pdf"
+
+
+def combined_filename(kind: str, payload: dict) -> str:
+    if kind == "annual":
+        return f"{payload['classroom']['name']}_ANNUAL.pdf"
+    return f"{payload['classroom']['name']}_T{payload['term']['index']}.pdf"
+
+
+def combined_pdf(kind: str, items, backend=None) -> bytes:
+    """
+    Tous les bulletins de `items` dans un seul PDF rendu en une passe (une page
+    par élève, chacune avec le QR de son propre token). Chaque token reçoit le
+    sha1 du document imprimé.
+    """
+    qr.pregenerate(verify_url for _, _, verify_url in items)
+    pdf = render_combined_pdf(kind, [(payload, verify_url) for payload, _, verify_url in items], backend)
+    digest = sha1_bytes(pdf)
+    for _, token, _ in items:
+        token.pdf_sha1 = digest
+    save_tokens(token for _, token, _ in items)
+    return pdf
+
+
+def batch_entries(kind: str, items, progress=None, backend=None, workers=None, pool=None):
+    """
+    Rend les PDF (pool de rendu) et itère sur (nom de fichier, pdf) dans l'ordre,
+    en notant le sha1 de chaque PDF sur son token. Les tokens des PDF produits
+    sont enregistrés en une fois à la fin, y compris si le lot est interrompu
+    (client déconnecté, erreur de rendu).
+    progress: callback(done, total) après chaque PDF.
+    backend: backend de rendu (None = REPORTS_RENDER_BACKEND).
+    workers: processus de rendu (None = REPORTS_RENDER_WORKERS).
+    pool: pool de rendu privé (commandes, reports.rendering.new_pool).
+    """
+    jobs = [(payload, verify_url) for payload, _, verify_url in items]
+    rendered = []
+    try:
+        for i, ((payload, token, _), pdf) in enumerate(zip(items, render_many(kind, jobs, backend, workers, pool)), start=1):
+            token.pdf_sha1 = sha1_bytes(pdf)
+            rendered.append(token)
+            if progress:
+                progress(i, len(items))
+            yield report_filename(kind, payload), pdf
+    finally:
+        save_tokens(rendered)
@@ -0,0 +1,90 @@
+"""
+File d'attente des jobs de bulletins, en base (aucun broker externe).
+
+- enqueue(): crée un ReportJob QUEUED (appelé par l'API)
+- claim_next(): un worker prend le plus ancien job QUEUED; la prise est un
+  UPDATE conditionnel (status=QUEUED), donc sûre entre plusieurs workers
+- run_job(): payloads + tokens, rendu (pool), archive ZIP écrite en flux
+  dans un fichier temporaire puis enregistrée dans le stockage (MEDIA_ROOT);
+  la progression (done/total) est mise à jour à chaque PDF
+- requeue_stale(): remet en file les jobs RUNNING dont le worker ne donne plus
+  de nouvelles (updated_at trop ancien)
+"""
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from core.jobs import worker_name
+from .batch import term_batch, annual_batch, batch_entries
+from .models import ReportJob
+from .zipstream import stream_zip
+
+
+def enqueue(kind: str, classroom_id: int, term_id=None, base_url="", user=None) -> ReportJob:
+    return ReportJob.objects.create(
+        kind=kind, classroom_id=classroom_id, term_id=term_id, base_url=base_url,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_next(worker=None):
+    """Prend le prochain job en file (ou None)."""
+    worker = worker or worker_name()
+    for job_id in ReportJob.objects.filter(status=ReportJob.Status.QUEUED).order_by("created_at", "id").values_list("id", flat=True)[:10]:
+        claimed = ReportJob.objects.filter(id=job_id, status=ReportJob.Status.QUEUED).update(
+            status=ReportJob.Status.RUNNING, worker=worker, started_at=timezone.now(), updated_at=timezone.now(),
+        )
+        if claimed:
+            return ReportJob.objects.select_related("classroom", "term").get(id=job_id)
+    return None
+
+
+def requeue_stale(minutes=None) -> int:
+    minutes = minutes or getattr(settings, "REPORTS_JOB_STALE_MINUTES", 30)
+    limit = timezone.now() - timedelta(minutes=minutes)
+    return ReportJob.objects.filter(status=ReportJob.Status.RUNNING, updated_at__lt=limit).update(
+        status=ReportJob.Status.QUEUED, worker="", done=0, updated_at=timezone.now(),
+    )
+
+
+def archive_name(job: ReportJob) -> str:
+    if job.kind == ReportJob.Kind.ANNUAL:
+        return f"class_{job.classroom_id}_ANNUAL.zip"
+    return f"class_{job.classroom_id}_T{job.term_id}.zip"
+
+
+def run_job(job: ReportJob):
+    def absolute_url(path):
+        return job.base_url.rstrip("/") + path
+
+    def progress(done, total):
+        ReportJob.objects.filter(id=job.id).update(done=done, updated_at=timezone.now())
+
+    try:
+        if job.kind == ReportJob.Kind.ANNUAL:
+            kind, items = "annual", annual_batch(job.classroom_id, absolute_url)
+        else:
+            kind, items = "term", term_batch(job.classroom_id, job.term_id, absolute_url)
+        job.total = len(items)
+        job.save(update_fields=["total", "updated_at"])
+
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in stream_zip(batch_entries(kind, items, progress=progress)):
+                tmp.write(chunk)
+            tmp.seek(0)
+            job.archive.save(f"{job.id}/{archive_name(job)}", File(tmp), save=False)
+
+        job.done = job.total
+        job.status = ReportJob.Status.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=["archive", "done", "status", "finished_at", "updated_at"])
+    except Exception:
+        job.status = ReportJob.Status.FAILED
+        job.error = traceback.format_exc()
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+    return job
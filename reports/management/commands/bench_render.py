@@ -0,0 +1,55 @@
+import re
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Classroom, Term
+from reports.services import RENDER_BACKENDS, compute_class_annual, compute_class_term, render_report_pdf
+
+PAGE_RE = re.compile(rb"/Type\s*/Page\b")
+
+
+class Command(BaseCommand):
+    help = "Compare les backends de rendu PDF (pages/s) sur les bulletins d'une classe, sans rien écrire en base."
+
+    def add_arguments(self, parser):
+        parser.add_argument("classroom", type=int, help="Classroom id")
+        parser.add_argument("--term", type=int, help="Term id (bulletins trimestriels); sans --term: annuels")
+        parser.add_argument("--backend", action="append", dest="backends", choices=sorted(RENDER_BACKENDS),
+                            help="Backend à mesurer (répétable; défaut: tous)")
+        parser.add_argument("--repeat", type=int, default=1, help="Nombre de passes par backend (défaut: 1)")
+
+    def handle(self, *args, **opts):
+        classroom_id, term_id = opts["classroom"], opts.get("term")
+        if not Classroom.objects.filter(id=classroom_id).exists():
+            raise CommandError(f"Classroom {classroom_id} does not exist.")
+        if term_id and not Term.objects.filter(id=term_id).exists():
+            raise CommandError(f"Term {term_id} does not exist.")
+
+        # payloads calculés une fois: seul le rendu est mesuré
+        if term_id:
+            kind, ctx = "term", compute_class_term(classroom_id, term_id)
+        else:
+            kind, ctx = "annual", compute_class_annual(classroom_id)
+        payloads = list(ctx["payloads"].values())
+        if not payloads:
+            raise CommandError("No active enrollments in this classroom.")
+        jobs = [(p, f"http://testserver/reports/verify/{uuid.uuid4()}/") for p in payloads]
+
+        self.stdout.write(f"{len(jobs)} {kind} report(s), {opts['repeat']} pass(es) per backend")
+        for backend in opts.get("backends") or sorted(RENDER_BACKENDS):
+            render_report_pdf(kind, *jobs[0], backend=backend)  # imports / polices hors mesure
+            pages = size = 0
+            started = time.perf_counter()
+            for _ in range(opts["repeat"]):
+                for payload, verify_url in jobs:
+                    pdf = render_report_pdf(kind, payload, verify_url, backend=backend)
+                    pages += len(PAGE_RE.findall(pdf))
+                    size += len(pdf)
+            elapsed = time.perf_counter() - started
+            n = len(jobs) * opts["repeat"]
+            self.stdout.write(
+                f"{backend:>10}: {pages / elapsed:7.1f} pages/s  {1000 * elapsed / n:7.1f} ms/report  "
+                f"{size / n / 1024:6.1f} KiB/report  ({pages} pages in {elapsed:.2f}s)"
+            )
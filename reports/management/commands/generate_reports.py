@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from contextlib import closing, nullcontext
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import get_valid_filename
+
+from core.models import AcademicYear, Classroom, Term
+from reports.batch import annual_batch, batch_entries, term_batch
+from reports.rendering import new_pool, render_workers
+from reports.services import RENDER_BACKENDS
+
+MANIFEST = "manifest.jsonl"
+CHUNK = 32  # bulletins par paquet (tokens enregistrés puis manifest mis à jour)
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les bulletins (trimestriels ou annuels) de tous les élèves actifs d'une année, "
+        "dans <output>/<niveau>/<classe>/, avec reprise après interruption (manifest.jsonl)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("year", type=int, help="AcademicYear id")
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument("--term", type=int, help="Term id (bulletins trimestriels)")
+        group.add_argument("--annual", action="store_true", help="Bulletins annuels")
+        parser.add_argument("--level", action="append", dest="levels", help="Code de niveau, ex. F5 (répétable)")
+        parser.add_argument("--output", required=True, help="Dossier de sortie")
+        parser.add_argument("--base-url", required=True, help="URL du site pour les QR de vérification, ex. https://ecole.example")
+        parser.add_argument("--workers", type=int, help="Processus de rendu (défaut: REPORTS_RENDER_WORKERS ou nombre de CPU)")
+        parser.add_argument("--backend", choices=sorted(RENDER_BACKENDS), help="Backend de rendu (défaut: REPORTS_RENDER_BACKEND)")
+        parser.add_argument("--force", action="store_true", help="Ignore le manifest et régénère tout")
+
+    def handle(self, *args, **opts):
+        year = AcademicYear.objects.filter(id=opts["year"]).first()
+        if year is None:
+            raise CommandError(f"AcademicYear {opts['year']} does not exist.")
+        term_id = opts.get("term")
+        if term_id and not Term.objects.filter(id=term_id, year=year).exists():
+            raise CommandError(f"Term {term_id} does not belong to {year.name}.")
+        kind = "term" if term_id else "annual"
+
+        classrooms = Classroom.objects.filter(year=year).select_related("level").order_by("level__code", "name", "id")
+        if opts.get("levels"):
+            classrooms = classrooms.filter(level__code__in=[code.upper() for code in opts["levels"]])
+        classrooms = list(classrooms)
+        if not classrooms:
+            raise CommandError("No classrooms match.")
+
+        root = Path(opts["output"])
+        root.mkdir(parents=True, exist_ok=True)
+        done = set() if opts["force"] else self._completed(root, kind, term_id)
+        workers = opts.get("workers") or render_workers()
+        base_url = opts["base_url"].rstrip("/")
+
+        def absolute_url(path):
+            return base_url + path
+
+        stats = {"students": 0, "rendered": 0, "skipped": 0, "compute": 0.0, "render": 0.0, "bytes": 0}
+        slowest = (0.0, None)
+        started = time.monotonic()
+        # pool de rendu propre à la commande (taille --workers), fermé à la fin
+        with open(root / MANIFEST, "a", encoding="utf-8") as manifest, \
+                (new_pool(workers) if workers > 1 else nullcontext()) as pool:
+            for n, classroom in enumerate(classrooms, start=1):
+                t0 = time.monotonic()
+                if kind == "term":
+                    items = term_batch(classroom.id, term_id, absolute_url)
+                else:
+                    items = annual_batch(classroom.id, absolute_url)
+                stats["students"] += len(items)
+                pending = [it for it in items if it[1].enrollment_id not in done]
+                stats["skipped"] += len(items) - len(pending)
+                t1 = time.monotonic()
+                stats["compute"] += t1 - t0
+
+                folder = root / get_valid_filename(classroom.level.code) / get_valid_filename(classroom.name)
+                folder.mkdir(parents=True, exist_ok=True)
+                # par paquets: les tokens d'un paquet sont enregistrés (bulk_create) avant
+                # que ses élèves n'entrent dans le manifest; un paquet interrompu est refait
+                for i in range(0, len(pending), CHUNK):
+                    chunk = pending[i:i + CHUNK]
+                    rows = []
+                    # le générateur est épuisé (ou fermé) avant d'écrire le manifest: son
+                    # finally enregistre les tokens et une erreur d'enregistrement remonte ici
+                    with closing(batch_entries(kind, chunk, backend=opts.get("backend"), workers=workers, pool=pool)) as entries:
+                        for j, (fname, pdf) in enumerate(entries):
+                            token = chunk[j][1]
+                            path = folder / get_valid_filename(fname)
+                            tmp = path.with_suffix(".tmp")
+                            tmp.write_bytes(pdf)
+                            os.replace(tmp, path)
+                            rows.append({
+                                "kind": kind,
+                                "term_id": term_id,
+                                "enrollment_id": token.enrollment_id,
+                                "classroom_id": classroom.id,
+                                "file": str(path.relative_to(root)),
+                                "sha1": token.pdf_sha1,
+                                "token": str(token.uid),
+                            })
+                            stats["bytes"] += len(pdf)
+                    manifest.writelines(json.dumps(row) + "\n" for row in rows)
+                    manifest.flush()
+                    stats["rendered"] += len(rows)
+                elapsed = time.monotonic() - t1
+                stats["render"] += elapsed
+                if pending and elapsed > slowest[0]:
+                    slowest = (elapsed, classroom.name)
+
+                if opts["verbosity"] > 0:
+                    self.stdout.write(
+                        f"[{n}/{len(classrooms)}] {classroom.level.code} {classroom.name}: "
+                        f"{len(pending)} rendered, {len(items) - len(pending)} already done "
+                        f"({t1 - t0:.1f}s compute, {elapsed:.1f}s render)"
+                    )
+
+        total = time.monotonic() - started
+        rendered = stats["rendered"]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(classrooms)} classrooms / {stats['students']} students: {rendered} rendered, "
+            f"{stats['skipped']} skipped (manifest) in {total:.1f}s ({workers} workers)."
+        ))
+        if rendered:
+            self.stdout.write(
+                f"compute {stats['compute']:.1f}s, render+write {stats['render']:.1f}s, "
+                f"{rendered / stats['render']:.1f} reports/s, {1000 * stats['render'] / rendered:.0f} ms/report, "
+                f"{stats['bytes'] / 1048576:.1f} MB written; slowest class: {slowest[1]} ({slowest[0]:.1f}s)"
+            )
+
+    def _completed(self, root, kind, term_id):
+        """Inscriptions déjà générées (manifest) dont le fichier existe encore."""
+        done = set()
+        path = root / MANIFEST
+        if not path.exists():
+            return done
+        with open(path, encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # ligne tronquée par une interruption
+                if row.get("kind") == kind and row.get("term_id") == term_id and (root / row["file"]).exists():
+                    done.add(row["enrollment_id"])
+        return done
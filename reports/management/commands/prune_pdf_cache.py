@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from reports.pdfcache import cache_dir, evict
+
+
+class Command(BaseCommand):
+    help = "Évince le cache disque des PDF de bulletins (âge et taille max)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-mb", type=int, help="Taille max (défaut: REPORTS_PDF_CACHE_MAX_MB)")
+        parser.add_argument("--max-age-days", type=int, help="Âge max (défaut: REPORTS_PDF_CACHE_MAX_AGE_DAYS)")
+
+    def handle(self, *args, **opts):
+        max_bytes = opts["max_mb"] * 1024 * 1024 if opts.get("max_mb") is not None else None
+        stats = evict(max_bytes=max_bytes, max_age_days=opts.get("max_age_days"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{cache_dir()}: {stats['removed']} removed, {stats['kept']} kept ({stats['bytes'] / 1048576:.1f} MB)."
+        ))
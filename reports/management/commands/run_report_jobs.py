@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import worker_name
+from reports.jobs import claim_next, requeue_stale, run_job
+from reports.models import ReportJob
+
+
+class Command(BaseCommand):
+    help = "Worker des jobs de bulletins (ReportJob): traite la file en base."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Traite les jobs en attente puis s'arrête")
+        parser.add_argument("--sleep", type=float, help="Attente entre deux scrutations (défaut: REPORTS_JOB_POLL_SECONDS)")
+
+    def handle(self, *args, **opts):
+        sleep = opts.get("sleep") or getattr(settings, "REPORTS_JOB_POLL_SECONDS", 2)
+        worker = worker_name()
+        self.stdout.write(f"Report worker {worker} started.")
+        while True:
+            requeued = requeue_stale()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"{requeued} stale job(s) requeued."))
+
+            job = claim_next(worker)
+            if job is None:
+                if opts["once"]:
+                    break
+                time.sleep(sleep)
+                continue
+
+            self.stdout.write(f"Job {job.id}: {job.kind} classroom={job.classroom_id} term={job.term_id}")
+            started = time.monotonic()
+            job = run_job(job)
+            if job.status == ReportJob.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Job {job.id} done: {job.total} reports in {time.monotonic() - started:.1f}s -> {job.archive.name}"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Job {job.id} failed:\n{job.error}"))
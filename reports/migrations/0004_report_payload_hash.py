@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_report_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annualreporttoken',
+            name='payload_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='reporttoken',
+            name='payload_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
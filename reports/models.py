@@ -1,7 +1,7 @@
 import uuid
 from django.db import models
 from django.conf import settings
-from core.models import Term
+from core.models import Classroom, Term
 from enrollments.models import Enrollment
 
 # Create your models here.
@@ -14,6 +14,7 @@ class ReportToken(models.Model):
     # Snapshot JSON (facultatif mais utile pour l’archivage)
     payload = models.JSONField(default=dict, blank=True)
     pdf_sha1 = models.CharField(max_length=64, blank=True)
+    payload_hash = models.CharField(max_length=64, blank=True, db_index=True)  # clé du cache PDF (reports.pdfcache)
 
     def __str__(self):
         s = self.enrollment.student
@@ -27,7 +28,43 @@ class AnnualReportToken(models.Model):
     valid = models.BooleanField(default=True)
     payload = models.JSONField(default=dict, blank=True)  # snapshot
     pdf_sha1 = models.CharField(max_length=64, blank=True)
+    payload_hash = models.CharField(max_length=64, blank=True, db_index=True)  # clé du cache PDF (reports.pdfcache)
 
     def __str__(self):
         s = self.enrollment.student
-        return f"{self.uid} - {s.matricule} - {self.year_label}"
\ No newline at end of file
+        return f"{self.uid} - {s.matricule} - {self.year_label}"
+
+class ReportJob(models.Model):
+    """Génération de bulletins en arrière-plan (file d'attente en base, voir reports.jobs)."""
+    class Kind(models.TextChoices):
+        TERM = "TERM"
+        ANNUAL = "ANNUAL"
+
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED"
+        RUNNING = "RUNNING"
+        DONE = "DONE"
+        FAILED = "FAILED"
+
+    kind = models.CharField(max_length=8, choices=Kind.choices)
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name="report_jobs")
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, null=True, blank=True)  # None pour ANNUAL
+    status = models.CharField(max_length=8, choices=Status.choices, default=Status.QUEUED)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    archive = models.FileField(upload_to="report_jobs/", blank=True)
+    base_url = models.CharField(max_length=200)  # pour les URL de vérification (QR) hors requête
+    worker = models.CharField(max_length=64, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # battement de coeur du worker
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Job {self.id} - {self.kind} {self.classroom} [{self.status} {self.done}/{self.total}]"
@@ -0,0 +1,147 @@
+"""
+Cache disque des PDF de bulletins, adressé par le contenu.
+
+Clé = sha256(type de bulletin + backend de rendu + version du gabarit +
+hôte des URL de vérification + payload JSON canonique). Le token (ReportToken /
+AnnualReportToken) porte la clé dans `payload_hash`: si un token valide
+existe pour la même clé et que le fichier en cache correspond à son
+`pdf_sha1`, le PDF est servi depuis le disque (le QR pointe vers ce même
+token); sinon le PDF est rendu, enregistré et le token mis à jour.
+
+Éviction par âge et par taille totale (REPORTS_PDF_CACHE_MAX_AGE_DAYS,
+REPORTS_PDF_CACHE_MAX_MB), au plus une fois toutes les 10 minutes par
+processus et via manage.py prune_pdf_cache.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+from django.urls import reverse
+
+from .services import render_backend, render_report_pdf, sha1_bytes
+
+TEMPLATES = {"term": "reports/report_card.html", "annual": "reports/report_card_annual.html"}
+VERIFY_ROUTES = {"term": "report-verify", "annual": "report-verify-annual"}
+EVICT_INTERVAL = 600  # secondes
+
+_last_evict = 0.0
+
+
+def cache_dir() -> Path:
+    return Path(getattr(settings, "REPORTS_PDF_CACHE_DIR", None) or Path(settings.MEDIA_ROOT) / "pdf_cache")
+
+
+@lru_cache(maxsize=None)
+def template_version(kind: str, backend: str = "pisa") -> str:
+    """Empreinte du gabarit (HTML pour pisa, module de dessin pour reportlab):
+    toute modification de la mise en page change les clés."""
+    if backend == "reportlab":
+        from . import pdfdraw
+        source = Path(pdfdraw.__file__).read_text(encoding="utf-8")
+    else:
+        source = get_template(TEMPLATES[kind]).template.source
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+def payload_hash(kind: str, payload: dict, base_url: str = "", backend=None) -> str:
+    backend = render_backend(backend)
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    h = hashlib.sha256()
+    for part in (kind, backend, template_version(kind, backend), base_url, canonical):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _path(key: str) -> Path:
+    return cache_dir() / key[:2] / f"{key}.pdf"
+
+
+def read(key: str):
+    path = _path(key)
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    os.utime(path)  # éviction LRU: mtime = dernier accès
+    return data
+
+
+def write(key: str, pdf: bytes):
+    path = _path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as fp:
+        fp.write(pdf)
+    os.replace(tmp, path)  # atomique: jamais de fichier partiel servi
+    maybe_evict()
+
+
+def evict(max_bytes=None, max_age_days=None):
+    """Supprime les PDF trop anciens puis les moins récemment servis au-delà de la taille max."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, "REPORTS_PDF_CACHE_MAX_MB", 500) * 1024 * 1024
+    if max_age_days is None:
+        max_age_days = getattr(settings, "REPORTS_PDF_CACHE_MAX_AGE_DAYS", 30)
+    limit = time.time() - max_age_days * 86400
+
+    files = []
+    for path in cache_dir().glob("*/*.pdf"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+
+    removed = 0
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in sorted(files):
+        if mtime >= limit and total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return {"removed": removed, "kept": len(files) - removed, "bytes": total}
+
+
+def maybe_evict():
+    global _last_evict
+    now = time.monotonic()
+    if now - _last_evict >= EVICT_INTERVAL:
+        _last_evict = now
+        evict()
+
+
+def get_or_render(kind: str, payload: dict, tokens, new_token, absolute_url, backend=None):
+    """
+    kind: "term" ou "annual"; tokens: queryset des tokens de l'élève (même trimestre/année);
+    new_token: callable(payload_hash) -> token créé; absolute_url: callable(path) -> URL absolue;
+    backend: backend de rendu (None = REPORTS_RENDER_BACKEND).
+    Retourne (token, pdf, hit).
+    """
+    key = payload_hash(kind, payload, absolute_url("/"), backend)
+    token = (tokens.filter(payload_hash=key, valid=True)
+             .exclude(pdf_sha1="")
+             .order_by("-created_at")
+             .first())
+    if token is not None:
+        pdf = read(key)
+        if pdf is not None and sha1_bytes(pdf) == token.pdf_sha1:
+            return token, pdf, True
+    # fichier absent ou différent: nouveau token. Le sha1 d'un token n'est jamais
+    # réécrit, les copies déjà remises restent vérifiables (un nouveau rendu n'est
+    # pas identique à l'octet près: dates du PDF).
+    token = new_token(key)
+
+    verify_url = absolute_url(reverse(VERIFY_ROUTES[kind], args=[str(token.uid)]))
+    pdf = render_report_pdf(kind, payload, verify_url, backend)
+    token.pdf_sha1 = sha1_bytes(pdf)
+    token.save(update_fields=["pdf_sha1"])
+    write(key, pdf)
+    return token, pdf, False
@@ -0,0 +1,254 @@
+"""
+Backend de rendu "reportlab": dessine les bulletins directement sur un
+canvas reportlab à partir du payload, sans gabarit HTML ni analyse CSS.
+
+Même mise en page que templates/reports/report_card*.html (A4, marges 18mm,
+Times): en-tête, identité, rangs, QR vectoriel, tableau des matières,
+assiduité/remarques, signatures. Le tableau continue sur une nouvelle page
+(en-tête de colonnes répété) si la liste des matières dépasse la page.
+Plusieurs bulletins peuvent être dessinés dans un même document (un par page).
+"""
+import io
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from . import qr
+
+FONT = "Times-Roman"
+BOLD = "Times-Bold"
+MARGIN = 18 * mm
+PAGE_W, PAGE_H = A4
+CONTENT_W = PAGE_W - 2 * MARGIN
+ROW_H = 16
+QR_SIZE = 100 * 0.75  # 100px du gabarit HTML, en points
+GREY = (0.33, 0.33, 0.33)
+HEAD_BG = (0.945, 0.945, 0.945)
+
+# (titre, clé de ligne, largeur en points; None = largeur restante)
+TERM_COLUMNS = [
+    ("Code", "code", 48), ("Subject", "name", None), ("Coef", "coef", 36),
+    ("CA1", "ca1", 42), ("CA2", "ca2", 42), ("Term Mark", "mark", 58),
+    ("Grade", "grade", 40), ("Weighted", "weighted", 54),
+]
+ANNUAL_COLUMNS = [
+    ("Code", "code", 48), ("Subject", "name", None), ("Coef", "coef", 34),
+    ("T1", "t1", 38), ("T2", "t2", 38), ("T3", "t3", 38), ("Annual", "annual", 44),
+    ("Grade", "grade", 38), ("Weighted", "weighted", 52),
+]
+
+
+def _txt(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _fit(text: str, font: str, size: float, width: float) -> str:
+    """Tronque le texte (…) pour qu'il tienne dans la cellule."""
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + "…", font, size) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def _widths(columns):
+    fixed = sum(w for _, _, w in columns if w)
+    return [w or CONTENT_W - fixed for _, _, w in columns]
+
+
+class _Page:
+    """Curseur vertical sur le canvas, avec saut de page."""
+
+    def __init__(self, c):
+        self.c = c
+        self.y = PAGE_H - MARGIN
+
+    def text(self, x, s, font=FONT, size=12, color=None, align="left"):
+        c = self.c
+        c.setFont(font, size)
+        if color:
+            c.setFillColorRGB(*color)
+        if align == "center":
+            c.drawCentredString(x, self.y, s)
+        elif align == "right":
+            c.drawRightString(x, self.y, s)
+        else:
+            c.drawString(x, self.y, s)
+        if color:
+            c.setFillColorRGB(0, 0, 0)
+
+    def labelled(self, parts, size=12):
+        """Ligne "<b>Label:</b> valeur — <b>Label:</b> valeur"."""
+        x = MARGIN
+        for label, value in parts:
+            if label:
+                self.text(x, label, BOLD, size)
+                x += stringWidth(label, BOLD, size)
+            self.text(x, value, FONT, size)
+            x += stringWidth(value, FONT, size)
+        self.y -= size + 4
+
+    def ensure(self, height):
+        if self.y - height < MARGIN:
+            self.c.showPage()
+            self.y = PAGE_H - MARGIN
+            return True
+        return False
+
+
+def _header(page, p, title):
+    page.y -= 14
+    page.text(PAGE_W / 2, p["school"]["name"], BOLD, 16, align="center")
+    page.y -= 13
+    meta = p["school"]["address"]
+    if p["school"]["phone"]:
+        meta += f" • {p['school']['phone']}"
+    page.text(PAGE_W / 2, meta, FONT, 10, GREY, align="center")
+    page.y -= 20
+    page.text(PAGE_W / 2, title, BOLD, 15, align="center")
+    page.y -= 24
+
+
+def _identity(page, p, annual=False):
+    s, cl, cs = p["student"], p["classroom"], p["class_stats"]
+    page.labelled([("Student: ", f"{s['name']} ({s['matricule']}) — {s['sex']}")])
+    page.labelled([("Class: ", f"{cl['name']} — "), ("Level: ", cl["level"])])
+    page.labelled([("Position: ", f"{_txt(cs['rank'])} / {cs['count']} — "), ("Class Avg: ", _txt(cs["class_avg"]))])
+    ls = p.get("level_stats") or {}
+    if ls.get("rank"):
+        page.labelled([("Level Position: ", f"{ls['rank']} / {ls['count']} ({ls['level']}) — "),
+                       ("Level Avg: ", _txt(ls["level_avg"]))])
+    if annual:
+        page.labelled([("Decision: ", _txt(p.get("decision")))])
+
+
+def _qr(c, verify_url, top):
+    """QR vectoriel (matrice mémoïsée, aucune image PNG), en haut à droite, avec l'URL dessous."""
+    matrix = qr.matrix(verify_url)
+    module = QR_SIZE / len(matrix)
+    x = PAGE_W - MARGIN - QR_SIZE
+    path = c.beginPath()
+    for i, row in enumerate(matrix):
+        y = top - (i + 1) * module
+        j = 0
+        while j < len(row):
+            if not row[j]:
+                j += 1
+                continue
+            start = j  # modules noirs consécutifs: un seul rectangle
+            while j < len(row) and row[j]:
+                j += 1
+            path.rect(x + start * module, y, (j - start) * module, module)
+    c.drawPath(path, stroke=0, fill=1)
+    c.setFont(FONT, 7)
+    c.setFillColorRGB(*GREY)
+    c.drawCentredString(x + QR_SIZE / 2, top - QR_SIZE - 8, _fit(f"Verify: {verify_url}", FONT, 7, 2 * QR_SIZE))
+    c.setFillColorRGB(0, 0, 0)
+    return top - QR_SIZE - 14
+
+
+def _row(page, cells, widths, font=FONT, fill=None, aligns=None, size=10):
+    c = page.c
+    x = MARGIN
+    bottom = page.y - ROW_H
+    for i, (text, w) in enumerate(zip(cells, widths)):
+        if fill:
+            c.setFillColorRGB(*fill)
+            c.rect(x, bottom, w, ROW_H, stroke=0, fill=1)
+            c.setFillColorRGB(0, 0, 0)
+        c.rect(x, bottom, w, ROW_H, stroke=1, fill=0)
+        if text:
+            text = _fit(text, font, size, w - 8)
+            align = aligns[i] if aligns else ("left" if i < 2 else "center")
+            c.setFont(font, size)
+            if align == "center":
+                c.drawCentredString(x + w / 2, bottom + 5, text)
+            elif align == "right":
+                c.drawRightString(x + w - 4, bottom + 5, text)
+            else:
+                c.drawString(x + 4, bottom + 5, text)
+        x += w
+    page.y = bottom
+
+
+def _merged(widths, spans):
+    """Largeurs des cellules fusionnées (colspan) du pied de tableau."""
+    out, i = [], 0
+    for span in spans:
+        out.append(sum(widths[i:i + span]))
+        i += span
+    return out
+
+
+def _table(page, p, columns, average_label):
+    widths = _widths(columns)
+    titles = [t for t, _, _ in columns]
+    page.c.setLineWidth(0.75)
+    _row(page, titles, widths, BOLD, HEAD_BG)
+    for line in p["lines"]:
+        if page.ensure(ROW_H):
+            _row(page, titles, widths, BOLD, HEAD_BG)
+        _row(page, [_txt(line[key]) for _, key, _ in columns], widths)
+
+    page.ensure(2 * ROW_H)
+    n = len(columns)
+    t = p["totals"]
+    # Totals | coef_sum | (vide) | weighted_sum  /  Average | average
+    _row(page, ["Totals", _txt(t["coef_sum"]), "", _txt(t["weighted_sum"])],
+         _merged(widths, [2, 1, n - 4, 1]), BOLD, HEAD_BG, ["right", "center", "center", "center"])
+    _row(page, [average_label, _txt(t["average"])],
+         _merged(widths, [n - 1, 1]), BOLD, HEAD_BG, ["right", "center"])
+
+
+def _footer(page, p):
+    page.y -= 22
+    page.ensure(4 * 16 + 50)
+    a, r = p["attendance"], p["remarks"]
+    page.labelled([("Attendance: ", f"Absences: {_txt(a['absences'])} • Lates: {_txt(a['lates'])}")])
+    page.labelled([("Remarks (Teacher): ", _txt(r["teacher"]))])
+    page.labelled([("Remarks (Principal): ", _txt(r["principal"]))])
+
+    page.y -= 30
+    c = page.c
+    half = (CONTENT_W - 24) / 2
+    for i, label in enumerate(("Class Teacher Signature / Date", "Principal Signature / Date")):
+        x = MARGIN + i * (half + 24)
+        c.line(x, page.y, x + half, page.y)
+        c.setFont(FONT, 12)
+        c.drawCentredString(x + half / 2, page.y - 14, label)
+
+
+def draw_report(c, kind: str, payload: dict, verify_url: str):
+    """Dessine un bulletin (kind: "term" ou "annual") sur le canvas, à partir de la page courante."""
+    page = _Page(c)
+    if kind == "annual":
+        _header(page, payload, f"Annual Report Card ({payload['classroom']['year']})")
+        bottom = _qr(c, verify_url, page.y + 12)
+        _identity(page, payload, annual=True)
+        columns, average_label = ANNUAL_COLUMNS, "Annual Average"
+    else:
+        _header(page, payload, f"Report Card — Term {payload['term']['index']} ({payload['classroom']['year']})")
+        bottom = _qr(c, verify_url, page.y + 12)
+        _identity(page, payload)
+        columns, average_label = TERM_COLUMNS, "Average"
+    page.y = min(page.y, bottom) - 6
+    _table(page, payload, columns, average_label)
+    _footer(page, payload)
+
+
+def render_pdf(kind: str, reports) -> bytes:
+    """reports: [(payload, verify_url)] -> un document, chaque bulletin sur sa propre page."""
+    out = io.BytesIO()
+    c = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+    first = reports[0][0]
+    if len(reports) == 1:
+        c.setTitle(f"{first['student']['matricule']} {first['classroom']['name']}")
+    else:
+        c.setTitle(first["classroom"]["name"])
+    for payload, verify_url in reports:
+        draw_report(c, kind, payload, verify_url)
+        c.showPage()
+    c.save()
+    return out.getvalue()
@@ -0,0 +1,87 @@
+"""
+QR codes de vérification des bulletins.
+
+La matrice est calculée une fois par URL et gardée en cache (LRU par
+processus): qrcode choisit le masque de pénalité minimale (8 essais), coût
+payé une seule fois par URL, et la zone blanche garde la largeur standard
+(4 modules) pour les lecteurs.
+À partir de la matrice:
+  - png_b64(): PNG 1 bit minimal (sans PIL) pour le gabarit HTML (pisa);
+  - matrix(): dessin vectoriel direct (reports.pdfdraw).
+pregenerate() calcule les matrices d'un lot à l'avance; prime() les installe
+dans le cache d'un processus de rendu (reports.rendering).
+"""
+import base64
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import qrcode
+
+BORDER = 4        # zone blanche autour du code, en modules (minimum de la norme)
+BOX = 3           # pixels par module dans le PNG
+MAX_CACHE = 4096  # matrices gardées par processus
+
+_matrices = OrderedDict()
+_lock = threading.Lock()  # cache partagé par les threads du processus web
+
+
+def _remember(text, m):
+    with _lock:
+        _matrices[text] = m
+        _matrices.move_to_end(text)
+        if len(_matrices) > MAX_CACHE:
+            _matrices.popitem(last=False)  # la moins récemment utilisée
+
+
+def matrix(text: str):
+    """Matrice du QR (tuple de lignes de booléens, bordure comprise; True = module noir)."""
+    with _lock:
+        m = _matrices.get(text)
+        if m is not None:
+            _matrices.move_to_end(text)
+            return m
+    # calcul hors verrou: deux threads peuvent calculer la même URL, le résultat est identique
+    qr = qrcode.QRCode(border=BORDER)
+    qr.add_data(text)
+    m = tuple(tuple(row) for row in qr.get_matrix())
+    _remember(text, m)
+    return m
+
+
+def pregenerate(texts):
+    """Matrices d'un lot d'URL de vérification, calculées avant le rendu: {url: matrice}."""
+    return {text: matrix(text) for text in texts}
+
+
+def prime(matrices):
+    """Installe des matrices déjà calculées (par pregenerate, dans un autre processus)."""
+    for text, m in matrices.items():
+        _remember(text, m)
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+@lru_cache(maxsize=256)
+def png(text: str, box: int = BOX) -> bytes:
+    """PNG niveaux de gris 1 bit, `box` pixels par module (quelques centaines d'octets)."""
+    m = matrix(text)
+    size = len(m) * box
+    raw = bytearray()
+    for row in m:
+        bits = "".join(("0" if dark else "1") * box for dark in row)
+        bits += "0" * (-len(bits) % 8)
+        line = b"\0" + int(bits, 2).to_bytes(len(bits) // 8, "big")  # filtre 0 + pixels
+        raw += line * box
+    return (b"\x89PNG\r\n\x1a\n"
+            + _chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0))
+            + _chunk(b"IDAT", zlib.compress(bytes(raw), 9))
+            + _chunk(b"IEND", b""))
+
+
+def png_b64(text: str) -> str:
+    return base64.b64encode(png(text)).decode("ascii")
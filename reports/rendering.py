@@ -0,0 +1,129 @@
+"""
+Rendu PDF des bulletins dans un pool de processus réutilisé entre les requêtes.
+
+Les payloads (calculés dans le processus web), les URL de vérification et
+les matrices QR du lot (reports.qr.pregenerate) sont envoyés aux processus
+du pool, qui génèrent HTML + PDF (pisa est coûteux en CPU); les PDF
+reviennent dans l'ordre des demandes. Au plus WINDOW × workers rendus sont
+en cours ou en attente de lecture: un consommateur lent (flux ZIP, disque)
+ne fait pas s'accumuler les PDF en mémoire.
+REPORTS_RENDER_WORKERS: nombre de processus (0 = nombre de CPU, 1 = rendu
+dans le processus courant, sans pool).
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+
+WINDOW = 2  # rendus soumis d'avance, par processus
+
+_lock = threading.Lock()
+_pool = None
+
+
+def render_workers() -> int:
+    return getattr(settings, "REPORTS_RENDER_WORKERS", 0) or os.cpu_count() or 1
+
+
+def _init_worker():
+    django.setup()
+
+
+def _render(job):
+    # import tardif: avec "spawn", ce module est importé avant django.setup()
+    from reports import qr
+    from reports.services import render_report_pdf
+    kind, payload, verify_url, backend, matrix = job
+    qr.prime({verify_url: matrix})
+    return render_report_pdf(kind, payload, verify_url, backend)
+
+
+def new_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool de rendu de `workers` processus. "spawn": pas de fork d'un processus
+    web multi-thread ni de connexions DB héritées."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def get_pool():
+    """Pool partagé du processus, créé au premier usage. Sa taille est fixe
+    (REPORTS_RENDER_WORKERS): une commande qui veut une autre taille crée son
+    propre pool (new_pool) et le passe à render_many."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = new_pool(render_workers())
+        return _pool
+
+
+def _discard_pool(pool):
+    """Retire un pool cassé, seulement s'il est toujours le pool partagé (un autre
+    thread a pu le remplacer entre-temps)."""
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def render_many(kind: str, jobs, backend=None, workers=None, pool=None):
+    """
+    kind: "term" ou "annual"; jobs: [(payload, verify_url)];
+    backend: backend de rendu (reports.services.RENDER_BACKENDS), None = réglage;
+    workers: processus de rendu, None = REPORTS_RENDER_WORKERS (1 = dans le
+    processus courant); pool: pool privé de `workers` processus (commandes,
+    new_pool), None = pool partagé.
+    Génère les PDF (bytes) dans l'ordre de `jobs`, au fur et à mesure.
+    """
+    from reports import qr
+    workers = workers or render_workers()
+    matrices = qr.pregenerate(verify_url for _, verify_url in jobs)
+    jobs = [(kind, payload, verify_url, backend, matrices[verify_url]) for payload, verify_url in jobs]
+    if pool is None and (workers <= 1 or len(jobs) <= 1):
+        for job in jobs:
+            yield _render(job)
+        return
+    shared = pool is None
+    pool = pool or get_pool()
+    todo = iter(jobs)
+    pending = deque()
+    try:
+        for job in todo:
+            pending.append(pool.submit(_render, job))
+            if len(pending) >= WINDOW * workers:
+                break
+        while pending:
+            pdf = pending.popleft().result()
+            job = next(todo, None)
+            if job is not None:
+                pending.append(pool.submit(_render, job))
+            yield pdf
+    except BrokenProcessPool:
+        # un processus du pool est mort: le pool partagé est recréé pour les requêtes suivantes
+        if shared:
+            _discard_pool(pool)
+        raise
+    finally:
+        # lot abandonné (client déconnecté, erreur): rendus pas encore commencés annulés
+        for future in pending:
+            future.cancel()
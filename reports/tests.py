@@ -1,3 +1,191 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.tests import fill_scores, make_classroom, set_score
+from reports import jobs, pdfcache
+from reports.models import ReportJob, ReportToken
+from reports.services import compute_class_annual, compute_student_term
+from reports.zipstream import stream_zip
+
+F5_SUBJECTS = (("MATH", "4.00"), ("ENG", "3.00"), ("PHYS", "3.00"))
+
+
+class StudentTermReportTests(TestCase):
+    """Bulletin trimestriel calculé par le moteur partagé (grading.engine)."""
+
+    def setUp(self):
+        self.school = make_classroom(students=2, subjects=F5_SUBJECTS)
+        set_score(self.school, 0, "MATH", "CA1", "12.10")
+        set_score(self.school, 0, "MATH", "CA2", "12.15")
+        set_score(self.school, 0, "ENG", "CA1", 15)
+        set_score(self.school, 1, "MATH", "CA1", 10)
+
+    def report(self, student):
+        return compute_student_term(self.school.enrollments[student].id, self.school.terms[0].id)
+
+    def lines(self, student):
+        return {line["code"]: line for line in self.report(student)["lines"]}
+
+    def test_f5_unscored_subject_is_excluded(self):
+        # PHYS sans note: hors moyenne (l'ancien calcul comptait 0 sur coef 3: 93.5 / 10 = 9.35)
+        self.assertEqual(self.report(0)["totals"], {"coef_sum": 7.0, "weighted_sum": 93.5, "average": 13.36})
+        lines = self.lines(0)
+        self.assertEqual((lines["PHYS"]["mark"], lines["PHYS"]["weighted"], lines["PHYS"]["grade"]), ("", "", ""))
+        # ENG: CA2 absent, pondération renormalisée sur CA1
+        self.assertEqual((lines["ENG"]["ca2"], lines["ENG"]["mark"]), ("", 15.0))
+
+    def test_marks_round_half_up(self):
+        # (12.10 + 12.15) / 2 = 12.125 -> 12.13 (round() de l'ancien calcul donnait 12.12)
+        # pondéré calculé sur la note exacte: 4 × 12.125
+        math = self.lines(0)["MATH"]
+        self.assertEqual((math["ca1"], math["ca2"], math["mark"], math["weighted"]), (12.1, 12.15, 12.13, 48.5))
+
+    def test_class_rank_and_average(self):
+        self.assertEqual(self.report(0)["class_stats"], {"rank": 1, "count": 2, "class_avg": 11.68})
+        second = self.report(1)
+        self.assertEqual(second["totals"], {"coef_sum": 4.0, "weighted_sum": 40.0, "average": 10.0})
+        self.assertEqual(second["class_stats"]["rank"], 2)
+
+
+class ClassAnnualTests(TestCase):
+    def test_queries_do_not_grow_with_class_size(self):
+        counts = []
+        for students in (1, 25):
+            school = make_classroom(name=f"F5-{students}", students=students)
+            for term in (1, 2, 3):
+                fill_scores(school, term=term, base=30 + 10 * term)
+            compute_class_annual(school.classroom.id)  # classement du niveau mis en cache
+            with CaptureQueriesContext(connection) as ctx:
+                result = compute_class_annual(school.classroom.id)
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(len(result["payloads"]), students)
+            self.assertEqual(sorted(result["rank_map"].values())[0], 1)
+        self.assertEqual(counts[0], counts[1])
+
+
+class StreamZipTests(SimpleTestCase):
+    def test_archive_is_readable(self):
+        files = {"a.pdf": b"%PDF-1.4 first", "dir/b.pdf": os.urandom(200_000), "empty.pdf": b""}
+        data = b"".join(stream_zip(iter(files.items())))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(files))
+            self.assertEqual({name: zf.read(name) for name in zf.namelist()}, files)
+
+    def test_entries_are_flushed_as_they_are_written(self):
+        produced = []
+
+        def entries():
+            for n in range(3):
+                produced.append(n)
+                yield f"{n}.pdf", bytes([n]) * 1000
+
+        chunks = stream_zip(entries())
+        first = next(chunks)
+        self.assertEqual(produced, [0])  # le premier fichier part avant que le suivant soit produit
+        with zipfile.ZipFile(io.BytesIO(first + b"".join(chunks))) as zf:
+            self.assertEqual(zf.namelist(), ["0.pdf", "1.pdf", "2.pdf"])
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.school = make_classroom(students=2)
+        fill_scores(self.school)
+        self.term = self.school.terms[0]
+
+    def test_claim_in_order_once(self):
+        first = jobs.enqueue("TERM", self.school.classroom.id, self.term.id, "http://x")
+        claimed = jobs.claim_next("w1")
+        self.assertEqual((claimed.id, claimed.status, claimed.worker), (first.id, ReportJob.Status.RUNNING, "w1"))
+        self.assertIsNone(jobs.claim_next("w2"))
+
+    def test_run_job_writes_archive_and_tokens(self):
+        jobs.enqueue("TERM", self.school.classroom.id, self.term.id, "http://x")
+        with override_settings(MEDIA_ROOT=self.media, REPORTS_RENDER_BACKEND="reportlab", REPORTS_RENDER_WORKERS=1):
+            job = jobs.run_job(jobs.claim_next("w1"))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.total, job.done), (ReportJob.Status.DONE, 2, 2), job.error)
+            with job.archive.open("rb") as fp, zipfile.ZipFile(fp) as zf:
+                pdfs = {name: zf.read(name) for name in zf.namelist()}
+        self.assertEqual(sorted(pdfs), ["F5A-000_F5A_T1.pdf", "F5A-001_F5A_T1.pdf"])
+        self.assertTrue(all(pdf.startswith(b"%PDF") for pdf in pdfs.values()))
+        self.assertEqual(sorted(ReportToken.objects.filter(term=self.term).values_list("pdf_sha1", flat=True)),
+                         sorted(hashlib.sha1(pdf).hexdigest() for pdf in pdfs.values()))
+
+    def test_failure_is_recorded(self):
+        jobs.enqueue("TERM", self.school.classroom.id, self.term.id, "http://x")
+        with mock.patch.object(jobs, "term_batch", side_effect=RuntimeError("boom")):
+            job = jobs.run_job(jobs.claim_next("w1"))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.Status.FAILED)
+        self.assertIn("RuntimeError: boom", job.error)
+
+
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        cache_settings = override_settings(REPORTS_PDF_CACHE_DIR=self.dir, REPORTS_RENDER_BACKEND="reportlab")
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        self.school = make_classroom(students=1)
+        set_score(self.school, 0, "MATH", "CA1", 12)
+        self.enrollment, self.term = self.school.enrollments[0], self.school.terms[0]
+
+    def get(self, payload=None):
+        payload = payload or compute_student_term(self.enrollment.id, self.term.id)
+        return pdfcache.get_or_render(
+            "term", payload,
+            tokens=ReportToken.objects.filter(enrollment=self.enrollment, term=self.term),
+            new_token=lambda key: ReportToken.objects.create(enrollment=self.enrollment, term=self.term,
+                                                             payload=payload, payload_hash=key),
+            absolute_url=lambda path: "http://x" + path,
+        )
+
+    def test_hit_after_miss(self):
+        token, pdf, hit = self.get()
+        self.assertFalse(hit)
+        again, cached, hit = self.get()
+        self.assertTrue(hit)
+        self.assertEqual((again.uid, cached), (token.uid, pdf))
+        self.assertEqual(token.pdf_sha1, hashlib.sha1(pdf).hexdigest())
+
+    def test_missing_file_mints_new_token(self):
+        token, _, _ = self.get()
+        pdfcache._path(token.payload_hash).unlink()
+        fresh, pdf, hit = self.get()
+        self.assertFalse(hit)
+        self.assertNotEqual(fresh.uid, token.uid)
+        token.refresh_from_db()
+        self.assertNotEqual(token.pdf_sha1, "")  # l'ancien sha1 reste vérifiable
+        self.assertEqual(fresh.pdf_sha1, hashlib.sha1(pdf).hexdigest())
+
+    def test_changed_payload_misses(self):
+        token, _, _ = self.get()
+        set_score(self.school, 0, "MATH", "CA2", 18)
+        fresh, _, hit = self.get()
+        self.assertFalse(hit)
+        self.assertNotEqual(fresh.payload_hash, token.payload_hash)
+
+    def test_evict_by_age_then_size(self):
+        now = time.time()
+        for n, age_days in enumerate((40, 3, 2, 1)):
+            key = f"{n:02d}" + "0" * 62
+            pdfcache.write(key, b"x" * 1000)
+            os.utime(pdfcache._path(key), (now - age_days * 86400,) * 2)
+        self.assertEqual(pdfcache.evict(max_bytes=10_000, max_age_days=30), {"removed": 1, "kept": 3, "bytes": 3000})
+        self.assertEqual(pdfcache.evict(max_bytes=2000, max_age_days=30), {"removed": 1, "kept": 2, "bytes": 2000})
+        # les plus récemment servis restent
+        self.assertEqual(sorted(p.name[:2] for p in pdfcache.cache_dir().glob("*/*.pdf")), ["02", "03"])
@@ -1,7 +1,8 @@
 from django.urls import path
 from .views import (
     StudentTermPreviewView, ClassTermPreviewView, StudentPDFView, ClassPDFBatchView, ReportVerifyPage,
-    StudentAnnualPDFView, ClassAnnualPDFBatchView, AnnualReportVerifyPage
+    StudentAnnualPDFView, ClassAnnualPDFBatchView, AnnualReportVerifyPage,
+    ReportJobListView, ReportJobDetailView, ReportJobDownloadView,
 )
 
 urlpatterns = [
@@ -13,4 +14,7 @@ urlpatterns = [
     path("api/reports/pdf/annual/student/", StudentAnnualPDFView.as_view(), name="report-pdf-student-annual"),
     path("api/reports/pdf/annual/class/", ClassAnnualPDFBatchView.as_view(), name="report-pdf-class-annual"),
     path("reports/verify-annual/<uuid:uid>/", AnnualReportVerifyPage.as_view(), name="report-verify-annual"),
+    path("api/reports/jobs/", ReportJobListView.as_view(), name="report-jobs"),
+    path("api/reports/jobs/<int:pk>/", ReportJobDetailView.as_view(), name="report-job"),
+    path("api/reports/jobs/<int:pk>/download/", ReportJobDownloadView.as_view(), name="report-job-download"),
 ]
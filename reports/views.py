@@ -1,5 +1,4 @@
-import io, zipfile
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse, FileResponse
 from django.urls import reverse
 from django.views.generic import TemplateView
 from django.template.loader import render_to_string
@@ -9,16 +8,17 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 
-from core.models import Term
+from core.models import Term, Classroom
 from enrollments.models import Enrollment
 from subjects.models import ClassSubject
-from .models import ReportToken, AnnualReportToken
-from .services import (
-    compute_student_term, build_pdf_html, render_pdf_from_html, sha1_bytes, 
-    compute_student_annual, build_standard_competition_ranks,
-    build_pdf_html_annual
-)
+from .models import ReportToken, AnnualReportToken, ReportJob
+from .services import compute_student_term, compute_student_annual, compute_class_annual, render_backend
 from grading.services import compute_student_term_preview, compute_class_term_preview
+from grading.ranking import level_stats_for
+from .batch import term_batch, annual_batch, batch_entries, combined_filename, combined_pdf
+from .jobs import enqueue
+from . import pdfcache
+from .zipstream import stream_zip
 
 class StudentTermPreviewView(APIView):
     permission_classes = [IsAuthenticated]
@@ -49,23 +49,30 @@ class StudentPDFView(APIView):
         term_id = request.GET.get("term")
         if not enrollment_id or not term_id:
             return Response({"detail":"enrollment and term are required"}, status=400)
+        try:
+            backend = render_backend(request.GET.get("backend"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
         payload = compute_student_term(int(enrollment_id), int(term_id))
-        # token
-        token = ReportToken.objects.create(
-            enrollment_id=enrollment_id,
-            term_id=term_id,
-            payload=payload
+        # token + PDF: réutilisés depuis le cache disque si le payload n'a pas changé
+        token, pdf, hit = pdfcache.get_or_render(
+            "term", payload,
+            tokens=ReportToken.objects.filter(enrollment_id=enrollment_id, term_id=term_id),
+            new_token=lambda key: ReportToken.objects.create(
+                enrollment_id=enrollment_id,
+                term_id=term_id,
+                payload=payload,
+                payload_hash=key,
+            ),
+            absolute_url=request.build_absolute_uri,
+            backend=backend,
         )
-        verify_url = request.build_absolute_uri(reverse("report-verify", args=[str(token.uid)]))
-        html = build_pdf_html(payload, verify_url)
-        pdf = render_pdf_from_html(html)
-        token.pdf_sha1 = sha1_bytes(pdf)
-        token.save(update_fields=["pdf_sha1"])
 
         filename = f"{payload['student']['matricule']}_{payload['classroom']['name']}_T{payload['term']['index']}.pdf"
         resp = HttpResponse(pdf, content_type="application/pdf")
         resp["Content-Disposition"] = f'inline; filename="{filename}"'
+        resp["X-Report-Cache"] = "HIT" if hit else "MISS"
         return resp
 
 class ClassPDFBatchView(APIView):
@@ -76,28 +83,34 @@ class ClassPDFBatchView(APIView):
         term_id = request.GET.get("term")
         if not classroom_id or not term_id:
             return Response({"detail":"classroom and term are required"}, status=400)
+        mode = request.GET.get("mode", "zip")
+        if mode not in ("zip", "combined"):
+            return Response({"detail": "mode must be zip or combined"}, status=400)
+        try:
+            backend = render_backend(request.GET.get("backend"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
-        enrollments = Enrollment.objects.filter(classroom_id=classroom_id, active=True).select_related("student","classroom__year")
-        if not enrollments.exists():
+        # 1) payloads + tokens (processus web), 2) QR/HTML/PDF dans le pool de rendu
+        items = term_batch(int(classroom_id), int(term_id), request.build_absolute_uri)
+        if not items:
             return Response({"detail":"No enrollments"}, status=404)
 
-        memzip = io.BytesIO()
-        with zipfile.ZipFile(memzip, "w", zipfile.ZIP_DEFLATED) as zf:
-            for e in enrollments:
-                payload = compute_student_term(e.id, int(term_id))
-                token = ReportToken.objects.create(enrollment=e, term_id=term_id, payload=payload)
-                verify_url = request.build_absolute_uri(reverse("report-verify", args=[str(token.uid)]))
-                html = build_pdf_html(payload, verify_url)
-                pdf = render_pdf_from_html(html)
-                token.pdf_sha1 = sha1_bytes(pdf); token.save(update_fields=["pdf_sha1"])
-                fname = f"{payload['student']['matricule']}_{payload['classroom']['name']}_T{payload['term']['index']}.pdf"
-                zf.writestr(fname, pdf)
-
-        memzip.seek(0)
-        resp = HttpResponse(memzip.getvalue(), content_type="application/zip")
+        if mode == "combined":
+            # un seul PDF pour l'impression (une page par élève), rendu en une passe
+            return _combined_response("term", items, backend)
+
+        # 3) chaque PDF est ajouté à l'archive et envoyé dès qu'il est rendu
+        resp = StreamingHttpResponse(stream_zip(batch_entries("term", items, backend=backend)), content_type="application/zip")
         resp["Content-Disposition"] = f'attachment; filename="class_{classroom_id}_T{term_id}.zip"'
         return resp
 
+def _combined_response(kind, items, backend):
+    pdf = combined_pdf(kind, items, backend)
+    resp = HttpResponse(pdf, content_type="application/pdf")
+    resp["Content-Disposition"] = f'attachment; filename="{combined_filename(kind, items[0][0])}"'
+    return resp
+
 class ReportVerifyPage(TemplateView):
     template_name = "reports/verify.html"
     permission_classes = [AllowAny]  # ignoré par CBV classique, mais page publique
@@ -128,42 +141,39 @@ class StudentAnnualPDFView(APIView):
         enrollment_id = request.GET.get("enrollment")
         if not enrollment_id:
             return Response({"detail":"enrollment is required"}, status=400)
-
-        # 1) payload élève
-        payload = compute_student_annual(int(enrollment_id))
-
-        # 2) rangs (pas de récursion)
-        classroom_id = payload["classroom"]["id"]
-        enrollments = Enrollment.objects.filter(classroom_id=classroom_id, active=True)
-        avg_map = {}
-        cache = {}
-        for e in enrollments:
-            p = compute_student_annual(e.id) if e.id != int(enrollment_id) else payload
-            cache[e.id] = p
-            avg_map[e.id] = p["totals"]["average"]
-        rank_map, class_avg = build_standard_competition_ranks(avg_map)
-        payload["class_stats"] = {
-            "rank": rank_map.get(int(enrollment_id)),
-            "count": len(avg_map),
-            "class_avg": class_avg
-        }
-
-        # 3) token + QR
-        token = AnnualReportToken.objects.create(
-            enrollment_id=enrollment_id,
-            year_label=payload["classroom"]["year"],
-            payload=payload
+        try:
+            backend = render_backend(request.GET.get("backend"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+
+        # 1) payload élève + rangs: toute la classe calculée en une passe
+        enrollment = Enrollment.objects.only("id", "classroom_id").get(id=enrollment_id)
+        ctx = compute_class_annual(enrollment.classroom_id)
+        payload = ctx["payloads"].get(enrollment.id)
+        if payload is None:
+            # inscription inactive: hors classement
+            payload = compute_student_annual(enrollment.id)
+            payload["class_stats"] = {"rank": None, "count": ctx["count"], "class_avg": ctx["class_avg"]}
+            payload["level_stats"] = level_stats_for(enrollment.classroom, enrollment.id)
+
+        # 2) token + QR (cache disque si le payload n'a pas changé)
+        token, pdf, hit = pdfcache.get_or_render(
+            "annual", payload,
+            tokens=AnnualReportToken.objects.filter(enrollment_id=enrollment_id, year_label=payload["classroom"]["year"]),
+            new_token=lambda key: AnnualReportToken.objects.create(
+                enrollment_id=enrollment_id,
+                year_label=payload["classroom"]["year"],
+                payload=payload,
+                payload_hash=key,
+            ),
+            absolute_url=request.build_absolute_uri,
+            backend=backend,
         )
-        verify_url = request.build_absolute_uri(reverse("report-verify-annual", args=[str(token.uid)]))
-
-        html = build_pdf_html_annual(payload, verify_url)
-        pdf = render_pdf_from_html(html)
-        token.pdf_sha1 = sha1_bytes(pdf)
-        token.save(update_fields=["pdf_sha1"])
 
         filename = f"{payload['student']['matricule']}_{payload['classroom']['name']}_ANNUAL.pdf"
         resp = HttpResponse(pdf, content_type="application/pdf")
         resp["Content-Disposition"] = f'inline; filename="{filename}"'
+        resp["X-Report-Cache"] = "HIT" if hit else "MISS"
         return resp
 
 class ClassAnnualPDFBatchView(APIView):
@@ -173,42 +183,23 @@ class ClassAnnualPDFBatchView(APIView):
         classroom_id = request.GET.get("classroom")
         if not classroom_id:
             return Response({"detail":"classroom is required"}, status=400)
+        mode = request.GET.get("mode", "zip")
+        if mode not in ("zip", "combined"):
+            return Response({"detail": "mode must be zip or combined"}, status=400)
+        try:
+            backend = render_backend(request.GET.get("backend"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
 
-        enrollments = list(Enrollment.objects.filter(classroom_id=classroom_id, active=True).select_related("student","classroom__year"))
-        if not enrollments:
+        # payloads + rangs (une seule passe pour la classe)
+        items = annual_batch(int(classroom_id), request.build_absolute_uri)
+        if not items:
             return Response({"detail":"No enrollments"}, status=404)
 
-        # payloads + avg_map
-        payloads, avg_map = {}, {}
-        for e in enrollments:
-            p = compute_student_annual(e.id)
-            payloads[e.id] = p
-            avg_map[e.id] = p["totals"]["average"]
-        rank_map, class_avg = build_standard_competition_ranks(avg_map)
-
-        memzip = io.BytesIO()
-        with zipfile.ZipFile(memzip, "w", zipfile.ZIP_DEFLATED) as zf:
-            for e in enrollments:
-                p = payloads[e.id]
-                p["class_stats"] = {
-                    "rank": rank_map.get(e.id),
-                    "count": len(avg_map),
-                    "class_avg": class_avg
-                }
-                token = AnnualReportToken.objects.create(
-                    enrollment=e,
-                    year_label=p["classroom"]["year"],
-                    payload=p
-                )
-                verify_url = request.build_absolute_uri(reverse("report-verify-annual", args=[str(token.uid)]))
-                html = build_pdf_html_annual(p, verify_url)
-                pdf = render_pdf_from_html(html)
-                token.pdf_sha1 = sha1_bytes(pdf); token.save(update_fields=["pdf_sha1"])
-                fname = f"{p['student']['matricule']}_{p['classroom']['name']}_ANNUAL.pdf"
-                zf.writestr(fname, pdf)
-
-        memzip.seek(0)
-        resp = HttpResponse(memzip.getvalue(), content_type="application/zip")
+        if mode == "combined":
+            return _combined_response("annual", items, backend)
+
+        resp = StreamingHttpResponse(stream_zip(batch_entries("annual", items, backend=backend)), content_type="application/zip")
         resp["Content-Disposition"] = f'attachment; filename="class_{classroom_id}_ANNUAL.zip"'
         return resp
 
@@ -239,3 +230,76 @@ class AnnualReportVerifyPage(TemplateView):
 
 
 
+
+class ReportJobListView(APIView):
+    """
+    POST -> met en file la génération des bulletins d'une classe
+            {"kind": "TERM", "classroom": 3, "term": 1} ou {"kind": "ANNUAL", "classroom": 3}
+            le worker (manage.py run_report_jobs) produit l'archive ZIP
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        kind = (request.data.get("kind") or ReportJob.Kind.TERM).upper()
+        classroom_id = request.data.get("classroom")
+        term_id = request.data.get("term")
+        if kind not in ReportJob.Kind.values:
+            return Response({"detail": "kind must be TERM or ANNUAL"}, status=400)
+        if not classroom_id or (kind == ReportJob.Kind.TERM and not term_id):
+            return Response({"detail": "classroom (and term for TERM reports) are required"}, status=400)
+        try:
+            classroom_id = int(classroom_id)
+            term_id = int(term_id) if kind == ReportJob.Kind.TERM else None
+        except (TypeError, ValueError):
+            return Response({"detail": "classroom and term must be ids"}, status=400)
+        if not Classroom.objects.filter(id=classroom_id).exists():
+            return Response({"detail": "classroom not found"}, status=404)
+        if term_id and not Term.objects.filter(id=term_id).exists():
+            return Response({"detail": "term not found"}, status=404)
+
+        job = enqueue(kind, classroom_id, term_id, base_url=request.build_absolute_uri("/"), user=request.user)
+        return Response(_job_status(job, request), status=status.HTTP_202_ACCEPTED)
+
+
+class ReportJobDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk: int):
+        job = ReportJob.objects.filter(id=pk).first()
+        if job is None:
+            raise Http404("Unknown job")
+        return Response(_job_status(job, request))
+
+
+class ReportJobDownloadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk: int):
+        job = ReportJob.objects.filter(id=pk).first()
+        if job is None:
+            raise Http404("Unknown job")
+        if job.status != ReportJob.Status.DONE or not job.archive:
+            return Response({"detail": f"job is {job.status}"}, status=409)
+        return FileResponse(job.archive.open("rb"), as_attachment=True,
+                            filename=job.archive.name.rsplit("/", 1)[-1], content_type="application/zip")
+
+
+def _job_status(job, request):
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "classroom": job.classroom_id,
+        "term": job.term_id,
+        "status": job.status,
+        "total": job.total,
+        "done": job.done,
+        "progress": f"{job.done}/{job.total} rendered" if job.total else "",
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "download_url": None,
+        "error": job.error.strip().splitlines()[-1] if job.error else "",
+    }
+    if job.status == ReportJob.Status.DONE:
+        data["download_url"] = request.build_absolute_uri(reverse("report-job-download", args=[job.id]))
+    return data
@@ -0,0 +1,36 @@
+"""
+Écriture d'une archive ZIP en flux, pour StreamingHttpResponse.
+
+zipfile sait écrire dans un flux non positionnable (data descriptors après
+chaque entrée): chaque entrée est vidée vers le client dès qu'elle est
+écrite, la mémoire reste bornée à un fichier à la fois.
+"""
+import zipfile
+
+
+class _Sink:
+    """Flux en écriture seule (sans tell/seek) dont on récupère les octets écrits."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """entries: itérable de (nom, bytes) -> itère sur les morceaux de l'archive."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            yield from sink.drain()
+    yield from sink.drain()  # répertoire central
@@ -124,6 +124,32 @@ SIMPLE_JWT = {
 
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS", default=[])
 
+# Calcul d'un trimestre pour toute l'école (grading.parallel): 0 = nombre de CPU
+GRADING_WORKERS = env.int("GRADING_WORKERS", default=0)
+GRADING_CHUNK_SIZE = env.int("GRADING_CHUNK_SIZE", default=4)  # classes par lot
+# Moteur des calculs de masse (grading.engine.bulk_backend): "numpy" (si installé) ou "python"
+GRADING_BACKEND = env("GRADING_BACKEND", default="numpy")
+GRADING_RANK_CACHE_TIMEOUT = env.int("GRADING_RANK_CACHE_TIMEOUT", default=600)  # classements par niveau (s)
+# Résultats matérialisés: au-delà de N classes touchées par une écriture, recalcul confié à la file
+GRADING_INLINE_REFRESH_CLASSROOMS = env.int("GRADING_INLINE_REFRESH_CLASSROOMS", default=1)
+# Worker des calculs de trimestre lancés par l'API (manage.py run_grading_jobs)
+GRADING_JOB_POLL_SECONDS = env.int("GRADING_JOB_POLL_SECONDS", default=2)
+GRADING_JOB_STALE_MINUTES = env.int("GRADING_JOB_STALE_MINUTES", default=30)  # job RUNNING sans nouvelle -> remis en file
+
+# Rendu PDF des bulletins: "pisa" (gabarit HTML + xhtml2pdf) ou "reportlab" (dessin direct)
+REPORTS_RENDER_BACKEND = env("REPORTS_RENDER_BACKEND", default="pisa")
+# Rendu PDF des bulletins par lot (reports.rendering): 0 = nombre de CPU, 1 = sans pool
+REPORTS_RENDER_WORKERS = env.int("REPORTS_RENDER_WORKERS", default=0)
+# Worker des jobs de bulletins (manage.py run_report_jobs)
+REPORTS_JOB_POLL_SECONDS = env.int("REPORTS_JOB_POLL_SECONDS", default=2)
+REPORTS_JOB_STALE_MINUTES = env.int("REPORTS_JOB_STALE_MINUTES", default=30)  # job RUNNING sans nouvelle -> remis en file
+# Cache disque des PDF (reports.pdfcache); par défaut MEDIA_ROOT/pdf_cache
+REPORTS_PDF_CACHE_DIR = env("REPORTS_PDF_CACHE_DIR", default="")
+REPORTS_PDF_CACHE_MAX_MB = env.int("REPORTS_PDF_CACHE_MAX_MB", default=500)
+REPORTS_PDF_CACHE_MAX_AGE_DAYS = env.int("REPORTS_PDF_CACHE_MAX_AGE_DAYS", default=30)
+# Synchro différentielle des notes: rétention des traces de suppression (assessments.sync)
+SCORE_TOMBSTONE_RETENTION_DAYS = env.int("SCORE_TOMBSTONE_RETENTION_DAYS", default=30)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -141,6 +167,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Fichiers générés (archives des jobs de bulletins, reports.jobs)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = env("MEDIA_ROOT", default=str(BASE_DIR / "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
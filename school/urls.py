@@ -38,5 +38,6 @@ urlpatterns = [
     path("api/", include("subjects.urls")),
     path("api/", include("portals.urls")),
     path("api/", include("analytics.urls")),
+    path("api/", include("grading.urls")),
     path("", include("reports.urls")),
 ]